@@ -8,6 +8,8 @@ load_dotenv()
 
 # --- Налаштування API та Секретів ---
 SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY")
+# Інша адреса SerpAPI (проксі або фейковий сервер навантажувального тестування, див. loadtest/)
+SERPAPI_BASE_URL = os.getenv("SERPAPI_BASE_URL")
 APP_SECRET_KEY = os.getenv("APP_SECRET_KEY")
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -24,8 +26,173 @@ templates = Jinja2Templates(directory="templates")
 # --- Налаштування Кешу ---
 PDF_CACHE_DIR = Path("pdf_cache")
 
-# --- Оцінки розмірів ---
+# --- Оцінки розмірів (поки для типу немає статистики, див. services/size_estimator.py) ---
 ESTIMATED_PDF_MB = 2.0
 ESTIMATED_SPOTIFY_MB = 5.0
 ESTIMATED_VIDEO_MB = 150.0
-ESTIMATED_AUDIO_MB = 5.0
\ No newline at end of file
+ESTIMATED_AUDIO_MB = 5.0
+
+# --- Налаштування HTTP-проб ---
+PROBE_POOL_SIZE = int(os.getenv("PROBE_POOL_SIZE", "20"))
+
+# --- Класифікація URL ---
+# Уточнювати тип неоднозначних посилань через HEAD-запит (Content-Type)
+SNIFF_CONTENT_TYPE = os.getenv("SNIFF_CONTENT_TYPE", "false").lower() == "true"
+SNIFF_TIMEOUT_SECONDS = float(os.getenv("SNIFF_TIMEOUT_SECONDS", "3"))
+URL_CLASSIFIER_CACHE_SIZE = int(os.getenv("URL_CLASSIFIER_CACHE_SIZE", "10000"))
+
+# --- Буфер запису історії (write-behind) ---
+HISTORY_FLUSH_BATCH_SIZE = int(os.getenv("HISTORY_FLUSH_BATCH_SIZE", "200"))
+HISTORY_FLUSH_INTERVAL_SECONDS = float(os.getenv("HISTORY_FLUSH_INTERVAL_SECONDS", "2"))
+# Спул кожного воркера - окремий файл: history_spool.<WorkerID>.jsonl
+HISTORY_SPOOL_PATH = Path(os.getenv("HISTORY_SPOOL_PATH", "history_spool.jsonl"))
+# Події, які не вдалося записати (некоректні дані або переповнена черга)
+HISTORY_DEAD_LETTER_PATH = Path(os.getenv("HISTORY_DEAD_LETTER_PATH", "history_dead_letter.jsonl"))
+HISTORY_MAX_PENDING = int(os.getenv("HISTORY_MAX_PENDING", "10000"))
+
+# --- Посторінкова історія ---
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+
+# --- Кеш користувачів сесії ---
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+
+# --- Хешування паролів (bcrypt) ---
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+# Потоки для bcrypt та максимальна кількість запитів, що чекають у черзі
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECONDS", "2"))
+
+# --- Сторінка закладок ---
+BOOKMARKS_PAGE_SIZE = int(os.getenv("BOOKMARKS_PAGE_SIZE", "50"))
+
+# --- Паралельне визначення розмірів ---
+SIZE_PROBE_CONCURRENCY = int(os.getenv("SIZE_PROBE_CONCURRENCY", "8"))
+
+# --- Завантаження медіа (yt-dlp) ---
+MEDIA_STORE_DIR = Path(os.getenv("MEDIA_STORE_DIR", "media_store"))
+MEDIA_DOWNLOAD_CONCURRENCY = int(os.getenv("MEDIA_DOWNLOAD_CONCURRENCY", "2"))
+# Прогресивні формати (відео+аудіо в одному файлі) не потребують ffmpeg для злиття
+MEDIA_VIDEO_FORMAT = os.getenv("MEDIA_VIDEO_FORMAT", "best[vcodec!=none][acodec!=none]/best")
+MEDIA_AUDIO_FORMAT = os.getenv("MEDIA_AUDIO_FORMAT", "bestaudio/best")
+# Максимальний розмір файлу для /media/download та елемента плану завантаження (більші не завантажуються)
+MEDIA_MAX_FILESIZE_BYTES = int(os.getenv("MEDIA_MAX_FILESIZE_BYTES", str(2 * 1024 * 1024 * 1024)))
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", str(1024 * 1024)))
+
+# --- Планувальник завантажень оптимального набору ---
+DOWNLOAD_PLAN_CONCURRENCY = int(os.getenv("DOWNLOAD_PLAN_CONCURRENCY", "3"))
+# Спільний ліміт швидкості всіх завантажень планувальника (байт/с, 0 - без ліміту)
+DOWNLOAD_BANDWIDTH_LIMIT_BPS = int(os.getenv("DOWNLOAD_BANDWIDTH_LIMIT_BPS", "0"))
+# Припущена швидкість для оцінки часу завантаження, якщо ліміт не задано
+DOWNLOAD_ASSUMED_BPS = int(os.getenv("DOWNLOAD_ASSUMED_BPS", str(2 * 1024 * 1024)))
+DOWNLOAD_PLAN_TTL_SECONDS = float(os.getenv("DOWNLOAD_PLAN_TTL_SECONDS", "3600"))
+# Найбільший об'єм пам'яті (бюджет) одного плану, MB
+DOWNLOAD_PLAN_MAX_BUDGET_MB = float(os.getenv("DOWNLOAD_PLAN_MAX_BUDGET_MB", "20480"))
+
+# --- Сховище файлів за вмістом (SHA-256) ---
+BLOB_STORE_DIR = Path(os.getenv("BLOB_STORE_DIR", "blob_store"))
+# Файли без запису в БД молодші за цей час не видаляються збирачем сміття (ще записуються)
+BLOB_GC_GRACE_SECONDS = float(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+
+# --- Оцінка розміру за накопиченою статистикою ---
+# Скільки виміряних розмірів потрібно, щоб довіряти статистиці домену/типу
+SIZE_ESTIMATOR_MIN_SAMPLES = int(os.getenv("SIZE_ESTIMATOR_MIN_SAMPLES", "3"))
+
+# --- Негативний кеш та запобіжник (circuit breaker) для проб ---
+# URL, проба якого не вдалася, не пробується повторно TTL секунд (TTL подвоюється з кожною невдачею)
+PROBE_NEGATIVE_TTL_SECONDS = float(os.getenv("PROBE_NEGATIVE_TTL_SECONDS", "60"))
+PROBE_NEGATIVE_MAX_TTL_SECONDS = float(os.getenv("PROBE_NEGATIVE_MAX_TTL_SECONDS", "3600"))
+PROBE_NEGATIVE_CACHE_SIZE = int(os.getenv("PROBE_NEGATIVE_CACHE_SIZE", "10000"))
+# Після стількох невдач поспіль хост "розмикається": проби одразу переходять до оцінки
+PROBE_BREAKER_THRESHOLD = int(os.getenv("PROBE_BREAKER_THRESHOLD", "3"))
+PROBE_BREAKER_COOLDOWN_SECONDS = float(os.getenv("PROBE_BREAKER_COOLDOWN_SECONDS", "30"))
+PROBE_BREAKER_MAX_COOLDOWN_SECONDS = float(os.getenv("PROBE_BREAKER_MAX_COOLDOWN_SECONDS", "600"))
+# Пробна спроба (half-open) без результату довше за цей час вважається невдалою
+PROBE_BREAKER_TRIAL_TIMEOUT_SECONDS = float(os.getenv("PROBE_BREAKER_TRIAL_TIMEOUT_SECONDS", "120"))
+
+# --- Ланцюжок проб розміру документів (HEAD -> GET Range -> підрахунок потоку) ---
+# Скільки байтів можна прочитати, щоб порахувати розмір невеликого файлу без Content-Length (0 - вимкнено)
+SIZE_PROBE_STREAM_MAX_BYTES = int(os.getenv("SIZE_PROBE_STREAM_MAX_BYTES", str(5 * 1024 * 1024)))
+SIZE_PROBE_TIMEOUT_SECONDS = float(os.getenv("SIZE_PROBE_TIMEOUT_SECONDS", "5"))
+
+# --- Логування (JSON, через чергу: запис у stdout виконує окремий потік) ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Рівні окремих модулів, напр. "services.content_utils=DEBUG,routers=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# json - для збору логів, text - для читання в консолі
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Записи понад цю кількість в черзі відкидаються (лічильник dropped), а не блокують запит
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Часті повідомлення (extra=SAMPLED) пишуться лише кожне N-не
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+
+# --- Метрики Prometheus (/metrics) ---
+# Кілька воркерів (uvicorn --workers N): задайте PROMETHEUS_MULTIPROC_DIR - порожній каталог,
+# який очищується перед кожним стартом сервера. Тоді кожен воркер пише метрики у власні файли,
+# а /metrics будь-якого воркера віддає суму по всіх. Без неї кожен воркер віддає лише свої метрики.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+# Як часто воркер оновлює глибину своїх черг у спільних файлах (лише з PROMETHEUS_MULTIPROC_DIR)
+METRICS_REFRESH_SECONDS = float(os.getenv("METRICS_REFRESH_SECONDS", "5"))
+# Доступ до /metrics: лише з цих адрес ("*" - з будь-якої). За reverse proxy адреса клієнта
+# береться з X-Forwarded-For лише при uvicorn --proxy-headers
+METRICS_ALLOWED_IPS = {ip.strip() for ip in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if ip.strip()}
+# Якщо задано - /metrics вимагає заголовок "Authorization: Bearer <токен>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# --- Старт застосунку ---
+# Запуск браузера: startup (старт чекає на браузер), background (паралельно з обробкою запитів),
+# lazy (при першому рендерингу PDF)
+BROWSER_LAUNCH_MODE = os.getenv("BROWSER_LAUNCH_MODE", "background").lower()
+# Пропускати create_all, якщо збережена версія схеми (хеш моделей) збігається з поточною
+SCHEMA_VERSION_CHECK = os.getenv("SCHEMA_VERSION_CHECK", "true").lower() == "true"
+
+# --- Координація воркерів (uvicorn --workers N на одному хості) ---
+# Спільний реєстр (SQLite-файл): хто що рендерить/завантажує, спільні ліміти
+WORKER_COORDINATION = os.getenv("WORKER_COORDINATION", "true").lower() == "true"
+WORKER_REGISTRY_PATH = os.getenv("WORKER_REGISTRY_PATH", "worker_registry.db")
+WORKER_HEARTBEAT_SECONDS = float(os.getenv("WORKER_HEARTBEAT_SECONDS", "5"))
+WORKER_LEASE_POLL_SECONDS = float(os.getenv("WORKER_LEASE_POLL_SECONDS", "0.25"))
+# Одночасні рендеринги PDF на хості (сумарно для всіх воркерів)
+RENDER_CONCURRENCY = int(os.getenv("RENDER_CONCURRENCY", "4"))
+RENDER_LEASE_SECONDS = float(os.getenv("RENDER_LEASE_SECONDS", "120"))
+MEDIA_DOWNLOAD_LEASE_SECONDS = float(os.getenv("MEDIA_DOWNLOAD_LEASE_SECONDS", "3600"))
+# Спільний сервіс рендерингу (render_service.py): один Chromium на хост замість браузера в кожному воркері
+RENDER_SERVICE_URL = os.getenv("RENDER_SERVICE_URL")
+RENDER_SERVICE_TIMEOUT_SECONDS = float(os.getenv("RENDER_SERVICE_TIMEOUT_SECONDS", "60"))
+
+# --- Стиснення та кешування відповідей ---
+# Менші відповіді не стискаються: виграш з'їдають заголовки gzip/br
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# brotli (pip install brotli) - необов'язковий: без нього відповіді стискаються лише gzip
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+STATIC_DIR = Path("static")
+# Статика з версією в URL (?v=хеш вмісту, див. static_url у шаблонах) кешується браузером як незмінна
+STATIC_MAX_AGE_SECONDS = int(os.getenv("STATIC_MAX_AGE_SECONDS", str(365 * 86400)))
+
+# --- Контроль допуску для важких ендпоінтів (у межах воркера) ---
+# Пули: render (/convert), probe (/fetch-sizes), solve (оптимізація). У кожному CONCURRENCY запитів
+# виконуються, ще MAX_QUEUE чекають не довше ADMISSION_QUEUE_TIMEOUT_SECONDS, решта - одразу 503
+ADMISSION_RENDER_CONCURRENCY = int(os.getenv("ADMISSION_RENDER_CONCURRENCY", "4"))
+ADMISSION_RENDER_MAX_QUEUE = int(os.getenv("ADMISSION_RENDER_MAX_QUEUE", "16"))
+ADMISSION_PROBE_CONCURRENCY = int(os.getenv("ADMISSION_PROBE_CONCURRENCY", "8"))
+ADMISSION_PROBE_MAX_QUEUE = int(os.getenv("ADMISSION_PROBE_MAX_QUEUE", "32"))
+ADMISSION_SOLVE_CONCURRENCY = int(os.getenv("ADMISSION_SOLVE_CONCURRENCY", "2"))
+ADMISSION_SOLVE_MAX_QUEUE = int(os.getenv("ADMISSION_SOLVE_MAX_QUEUE", "8"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+# Retry-After, поки немає статистики часу обробки (далі - оцінка за середнім часом)
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "5"))
+
+# --- Експорт та імпорт історії й закладок ---
+# Рядків, що читаються з серверного курсора за раз (та пишуться одним шматком відповіді)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+# Рядків імпорту в одній пачці upsert (одна транзакція)
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+# --- Оптимізація (алгоритм рюкзака) ---
+# Максимум елементів в одному запиті оптимізації
+OPTIMIZE_MAX_ITEMS = int(os.getenv("OPTIMIZE_MAX_ITEMS", "500"))
+# Бюджет методу гілок та меж: після нього повертається найкращий знайдений набір (не гірший за жадібний)
+KNAPSACK_MAX_NODES = int(os.getenv("KNAPSACK_MAX_NODES", "200000"))
+KNAPSACK_TIME_LIMIT_SECONDS = float(os.getenv("KNAPSACK_TIME_LIMIT_SECONDS", "2"))
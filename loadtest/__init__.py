@@ -0,0 +1,16 @@
+"""
+Навантажувальне тестування без зовнішніх сервісів.
+
+Застосунок запускається в тому ж процесі (uvicorn у фоновому потоці) з SQLite,
+а SerpAPI, сайти з документами, YouTube (yt-dlp) та сторінки для Playwright
+замінюються локальними фейками (loadtest/fakes.py). Віртуальні користувачі
+проходять сценарії з loadtest/journeys.py, звіт - loadtest/report.py.
+
+Потрібні залежності з requirements-dev.txt та Chromium для Playwright
+(python -m playwright install chromium) - без браузера прогін не починається (код 2).
+
+Запуск (з кореня проекту):
+    python -m loadtest --users 20 --duration 60
+    python -m loadtest --users 20 --duration 60 --json results.json
+    python -m loadtest --baseline results.json    # код 1 при регресії p95 / помилок
+"""
@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description="Навантажувальне тестування з локальними фейками.")
+    parser.add_argument("--users", type=int, default=10, help="кількість віртуальних користувачів")
+    parser.add_argument("--duration", type=float, default=30, help="тривалість, с")
+    parser.add_argument("--origin-latency-ms", type=float, default=50, help="затримка фейкового сайту, мс")
+    parser.add_argument("--origin-jitter-ms", type=float, default=20, help="розкид затримки сайту, мс")
+    parser.add_argument("--serp-latency-ms", type=float, default=300, help="затримка фейкового SerpAPI, мс")
+    parser.add_argument("--ytdlp-latency-ms", type=float, default=500, help="затримка extract_info, мс")
+    parser.add_argument("--page-kb", type=int, default=50, help="розмір сторінок корпусу, КБ")
+    parser.add_argument("--workdir", type=Path, help="папка для БД SQLite та сховищ (за замовчуванням - тимчасова)")
+    parser.add_argument("--json", type=Path, help="зберегти результати в JSON (база для --baseline)")
+    parser.add_argument("--baseline", type=Path, help="порівняти з попереднім прогоном")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="допустиме погіршення p95 (частка)")
+    return parser.parse_args()
+
+
+def _configure_environment(workdir: Path, serp_url: str, cert_path: Path | None):
+    """
+    Змінні оточення застосунку - до першого імпорту config.py:
+    SQLite у робочій папці, сховища там же, SerpAPI - фейковий сервер.
+    """
+    if cert_path is not None:
+        # requests довіряє сертифікату фейкового сайту (https-адреси з канонізації URL)
+        os.environ["REQUESTS_CA_BUNDLE"] = str(cert_path)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite+aiosqlite:///{workdir / 'loadtest.db'}",
+        "APP_SECRET_KEY": os.environ.get("APP_SECRET_KEY", "loadtest"),
+        "SERPAPI_API_KEY": "loadtest",
+        "SERPAPI_BASE_URL": serp_url,
+        "BLOB_STORE_DIR": str(workdir / "blob_store"),
+        "MEDIA_STORE_DIR": str(workdir / "media_store"),
+        "HISTORY_SPOOL_PATH": str(workdir / "history_spool.jsonl"),
+        "WORKER_REGISTRY_PATH": str(workdir / "worker_registry.db"),
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Браузер запускається при старті, щоб його відсутність виявилась до початку прогону
+    os.environ["BROWSER_LAUNCH_MODE"] = "startup"
+
+
+def _start_app():
+    """uvicorn у фоновому потоці цього процесу (щоб діяла заміна yt-dlp). Повертає (сервер, потік, URL)."""
+    import socket
+    import uvicorn
+    from main import app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Застосунок не запустився.")
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def _check_browser(base_url: str) -> str | None:
+    """Помилка, якщо рендеринг PDF недоступний (інакше кожен /convert був би лише редіректом з помилкою)."""
+    import requests
+
+    browser = requests.get(base_url + "/api/ready", timeout=30).json().get("browser")
+    if browser in ("ready", "remote"):
+        return None
+    return (f"Браузер Playwright недоступний (стан: {browser}). "
+            "Встановіть його: python -m playwright install chromium")
+
+
+def main() -> int:
+    args = _parse_args()
+
+    from loadtest.fakes import (
+        FakeOriginHandler, FakeSerpApiHandler, install_ytdlp_stub, make_self_signed_cert,
+        start_server, server_url
+    )
+
+    workdir_context = tempfile.TemporaryDirectory(prefix="loadtest-") if args.workdir is None else None
+    workdir = args.workdir or Path(workdir_context.name)
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    tls = make_self_signed_cert(workdir)
+    if tls is None:
+        print("openssl недоступний: фейковий сайт працює лише по HTTP, https-адреси закладок не пробуватимуться.")
+    origin = start_server(
+        FakeOriginHandler, tls=tls, latency=args.origin_latency_ms / 1000,
+        jitter=args.origin_jitter_ms / 1000, page_kb=args.page_kb
+    )
+    origin_url = server_url(origin)
+    serp = start_server(FakeSerpApiHandler, latency=args.serp_latency_ms / 1000, origin_url=origin_url)
+    _configure_environment(workdir, server_url(serp), tls[0] if tls else None)
+    install_ytdlp_stub(latency=args.ytdlp_latency_ms / 1000)
+
+    from loadtest.journeys import VirtualUser, run_user
+    from loadtest.report import Recorder, format_summary, compare_with_baseline
+
+    server, thread, base_url = _start_app()
+    browser_error = _check_browser(base_url)
+    if browser_error:
+        print(f"ПОМИЛКА: {browser_error}", file=sys.stderr)
+        server.should_exit = True
+        thread.join(timeout=30)
+        origin.shutdown()
+        serp.shutdown()
+        if workdir_context is not None:
+            workdir_context.cleanup()
+        return 2
+    print(f"Застосунок: {base_url}, фейки: SerpAPI {server_url(serp)}, сайт {origin_url}, дані: {workdir}")
+    print(f"{args.users} користувачів, {args.duration} с...")
+
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:8]
+    deadline = time.perf_counter() + args.duration
+    users = [VirtualUser(i, run_id, base_url, origin_url, recorder) for i in range(args.users)]
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        for future in [pool.submit(run_user, user, deadline) for user in users]:
+            future.result()
+    recorder.finish()
+
+    server.should_exit = True
+    thread.join(timeout=30)
+    origin.shutdown()
+    serp.shutdown()
+
+    summary = recorder.summary()
+    print(format_summary(summary))
+    if args.json:
+        args.json.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Результати збережено: {args.json}")
+
+    exit_code = 0
+    if args.baseline:
+        regressions = compare_with_baseline(summary, args.baseline, args.max_regression)
+        for regression in regressions:
+            print(f"РЕГРЕСІЯ: {regression}")
+        exit_code = 1 if regressions else 0
+
+    if workdir_context is not None:
+        workdir_context.cleanup()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+import re
+import ssl
+import json
+import time
+import random
+import socket
+import hashlib
+import threading
+import subprocess
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# Скільки результатів повертає фейковий пошук та їх склад
+SEARCH_RESULT_COUNT = 10
+
+_FILE_RE = re.compile(r"^/files/(\d+)-(\d+)k(-nolen)?\.(pdf|docx|pptx)$")
+_PAGE_RE = re.compile(r"^/pages/(\d+)\.html$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_CHUNK = 64 * 1024
+
+_WORDS = (
+    "алгоритм дані модель система мережа аналіз метод задача оптимізація пам'ять "
+    "рюкзак вага розмір завантаження сторінка документ відео аудіо пошук результат"
+).split()
+
+
+def _seed(value: str) -> int:
+    return int(hashlib.md5(value.encode()).hexdigest()[:8], 16)
+
+
+def fake_search_results(query: str, origin_url: str, count: int = SEARCH_RESULT_COUNT) -> list[dict]:
+    """
+    Детерміновані результати пошуку для запиту: сторінки та документи з фейкового
+    сайту, відео YouTube (їх обробляє FakeYoutubeDL). Частина документів не
+    повідомляє Content-Length, щоб пройти весь ланцюжок проб розміру.
+    Сценарії користувачів використовують цю ж функцію, щоб знати, що в сесії.
+    """
+    rng = random.Random(_seed(query))
+    results = []
+    for position in range(count):
+        n = rng.randint(1, 100000)
+        kind = position % 5
+        if kind in (0, 1):
+            link = f"{origin_url}/pages/{n}.html"
+            title = f"Сторінка {n}"
+        elif kind == 2:
+            link = f"{origin_url}/files/{n}-{rng.randint(50, 5000)}k.pdf"
+            title = f"[PDF] Документ {n}"
+        elif kind == 3:
+            suffix = "-nolen" if rng.random() < 0.5 else ""
+            ext = rng.choice(("docx", "pptx"))
+            link = f"{origin_url}/files/{n}-{rng.randint(20, 2000)}k{suffix}.{ext}"
+            title = f"Документ {n}"
+        else:
+            link = f"https://www.youtube.com/watch?v=lt{n:09d}"
+            title = f"Відео {n}"
+        results.append({
+            "position": position + 1,
+            "title": title,
+            "link": link,
+            "snippet": " ".join(rng.choice(_WORDS) for _ in range(20)),
+        })
+    return results
+
+
+def _page_html(n: int, size_kb: int) -> bytes:
+    """Сторінка корпусу для Playwright: заголовок та абзаци тексту приблизно size_kb КБ."""
+    rng = random.Random(n)
+    paragraphs = []
+    total = 0
+    while total < size_kb * 1024:
+        text = " ".join(rng.choice(_WORDS) for _ in range(80))
+        paragraphs.append(f"<p>{text}</p>")
+        total += len(text.encode())
+    body = "\n".join(paragraphs)
+    return (
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>Сторінка {n}</title></head>"
+        f"<body><h1>Сторінка {n}</h1>{body}</body></html>"
+    ).encode()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _delay(self):
+        """Затримка відповіді: latency ± jitter (налаштування сервера)."""
+        latency = self.server.latency
+        if latency > 0:
+            time.sleep(max(latency + random.uniform(-1, 1) * self.server.jitter, 0))
+
+    def _send_bytes(self, status: int, content_type: str, body: bytes, head_only: bool = False):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+
+class FakeSerpApiHandler(_QuietHandler):
+    """GET /search?q=... у форматі відповіді SerpAPI (organic_results)."""
+
+    def do_GET(self):
+        self._delay()
+        parts = urlsplit(self.path)
+        if parts.path != "/search":
+            self._send_bytes(404, "application/json", b'{"error": "not found"}')
+            return
+        query = parse_qs(parts.query).get("q", [""])[0]
+        payload = {
+            "search_metadata": {"status": "Success"},
+            "search_parameters": {"q": query, "engine": "google"},
+            "organic_results": fake_search_results(query, self.server.origin_url),
+        }
+        self._send_bytes(200, "application/json", json.dumps(payload, ensure_ascii=False).encode())
+
+
+class FakeOriginHandler(_QuietHandler):
+    """
+    Сайт з документами та сторінками:
+      /files/<n>-<KB>k[-nolen].<ext> - файл заданого розміру (HEAD, Range; -nolen - без Content-Length)
+      /pages/<n>.html - сторінка корпусу для Playwright
+    """
+
+    def do_HEAD(self):
+        self._handle(head_only=True)
+
+    def do_GET(self):
+        self._handle(head_only=False)
+
+    def _handle(self, head_only: bool):
+        self._delay()
+        path = urlsplit(self.path).path
+
+        match = _PAGE_RE.match(path)
+        if match:
+            body = _page_html(int(match.group(1)), self.server.page_kb)
+            self._send_bytes(200, "text/html; charset=utf-8", body, head_only)
+            return
+
+        match = _FILE_RE.match(path)
+        if not match:
+            self._send_bytes(404, "text/plain", b"not found", head_only)
+            return
+
+        size = int(match.group(2)) * 1024
+        content_type = {
+            "pdf": "application/pdf",
+            "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            "pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+        }[match.group(4)]
+
+        if match.group(3):
+            # Без Content-Length і без підтримки Range: розмір можна дізнатись лише прочитавши потік
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            if not head_only:
+                self._write_body(size)
+            return
+
+        start, end = 0, size - 1
+        range_match = _RANGE_RE.match(self.headers.get("Range", ""))
+        if range_match and range_match.group(1):
+            start = int(range_match.group(1))
+            end = min(int(range_match.group(2) or end), size - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not head_only:
+            self._write_body(end - start + 1)
+
+    def _write_body(self, length: int):
+        chunk = b"\0" * _CHUNK
+        try:
+            while length > 0:
+                part = chunk[:min(_CHUNK, length)]
+                self.wfile.write(part)
+                length -= len(part)
+        except (BrokenPipeError, ConnectionResetError):
+            # Проби розміру закривають з'єднання, щойно отримали заголовки
+            pass
+
+
+class _DualProtocolServer(ThreadingHTTPServer):
+    """
+    HTTP і HTTPS на одному порту: застосунок зберігає канонічні URL з https
+    (services/url_canonicalizer.py), тож сайт має відповідати за обома схемами.
+    TLS розпізнається за першим байтом (ClientHello), рукостискання - у потоці обробника.
+    """
+    ssl_context: ssl.SSLContext | None = None
+
+    def get_request(self):
+        sock, address = super().get_request()
+        if self.ssl_context is not None:
+            try:
+                first_byte = sock.recv(1, socket.MSG_PEEK)
+            except OSError:
+                first_byte = b""
+            if first_byte == b"\x16":
+                sock = self.ssl_context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False)
+        return sock, address
+
+
+def make_self_signed_cert(directory: Path) -> tuple[Path, Path] | None:
+    """
+    Самопідписаний сертифікат для 127.0.0.1 (через openssl).
+    None - якщо openssl недоступний (тоді сайт працює лише по HTTP).
+    """
+    cert_path, key_path = directory / "origin-cert.pem", directory / "origin-key.pem"
+    try:
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-keyout", str(key_path), "-out", str(cert_path),
+             "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"],
+            check=True, capture_output=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return cert_path, key_path
+
+
+def start_server(handler_class, tls: tuple[Path, Path] | None = None, **settings) -> ThreadingHTTPServer:
+    """
+    Запускає фейковий сервер на вільному порту 127.0.0.1 у фоновому потоці.
+    tls - (сертифікат, ключ): порт додатково приймає HTTPS.
+    settings стають атрибутами сервера (latency, jitter, page_kb, origin_url).
+    """
+    server = _DualProtocolServer(("127.0.0.1", 0), handler_class)
+    if tls is not None:
+        server.ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server.ssl_context.load_cert_chain(*tls)
+    server.daemon_threads = True
+    server.latency = 0.0
+    server.jitter = 0.0
+    for key, value in settings.items():
+        setattr(server, key, value)
+    threading.Thread(target=server.serve_forever, name=handler_class.__name__, daemon=True).start()
+    return server
+
+
+def server_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+class FakeYoutubeDL:
+    """
+    Заміна yt_dlp.YoutubeDL: метадані відео генеруються з URL (тривалість, формати
+    з розмірами), завантаження створює файл розміром до max_download_bytes.
+    Налаштування - атрибути класу (latency, max_download_bytes).
+    """
+    latency = 0.0
+    max_download_bytes = 1024 * 1024
+
+    def __init__(self, params: dict | None = None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url: str, download: bool = False) -> dict:
+        if self.latency > 0:
+            time.sleep(self.latency)
+        rng = random.Random(_seed(url))
+        video_id = url.rsplit("=", 1)[-1]
+        duration = rng.randint(60, 3600)
+        video_tbr, audio_tbr = rng.choice((800, 1500, 2500, 4500)), 128
+        info = {
+            "id": video_id,
+            "title": f"Відео {video_id}",
+            "duration": duration,
+            "ext": "mp4",
+            "tbr": video_tbr + audio_tbr,
+            "formats": [
+                {"format_id": "v", "vcodec": "avc1", "acodec": "none", "height": 720,
+                 "filesize": int(duration * video_tbr * 1024 / 8)},
+                {"format_id": "a", "vcodec": "none", "acodec": "mp4a", "abr": audio_tbr,
+                 "filesize": int(duration * audio_tbr * 1024 / 8)},
+            ],
+        }
+        if download:
+            size = min(sum(f["filesize"] for f in info["formats"]), self.max_download_bytes)
+            max_filesize = self.params.get("max_filesize")
+            if not max_filesize or size <= max_filesize:
+                path = Path(self.prepare_filename(info))
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "wb") as file:
+                    file.truncate(size)
+        return info
+
+    def prepare_filename(self, info: dict) -> str:
+        template = self.params.get("outtmpl", "%(id)s.%(ext)s")
+        return template.replace("%(ext)s", info["ext"]).replace("%(id)s", info["id"])
+
+
+def install_ytdlp_stub(latency: float = 0.0):
+    """Підміняє yt_dlp.YoutubeDL у цьому процесі (модулі застосунку звертаються до yt_dlp.YoutubeDL при виклику)."""
+    import yt_dlp
+
+    FakeYoutubeDL.latency = latency
+    yt_dlp.YoutubeDL = FakeYoutubeDL
@@ -0,0 +1,160 @@
+import re
+import html
+import random
+import time
+
+import requests
+
+from loadtest.fakes import fake_search_results
+from loadtest.report import Recorder
+from services.url_classifier import classify_url
+
+_QUERIES = (
+    "задача про рюкзак", "динамічне програмування", "алгоритми на графах", "машинне навчання",
+    "лекції з баз даних", "python asyncio", "оптимізація запитів sql", "теорія ймовірностей",
+)
+
+_FOLDER_RE = re.compile(r'id="header-(\d+)"')
+_OPTIMIZE_FORM_RE = re.compile(r'<form[^>]*action="/optimize"[^>]*>(.*?)</form>', re.DOTALL)
+_INPUT_RE = re.compile(r'<input[^>]*name="([^"]+)"[^>]*value="([^"]*)"')
+
+
+class VirtualUser:
+    """
+    Віртуальний користувач: власна HTTP-сесія (cookie сесії застосунку),
+    кожен запит заміряється під іменем endpoint'а (шаблон маршруту, а не фактичний URL).
+    """
+
+    def __init__(self, index: int, run_id: str, base_url: str, origin_url: str, recorder: Recorder):
+        self.index = index
+        self.email = f"loadtest-{run_id}-{index}@example.com"
+        self.base_url = base_url
+        self.origin_url = origin_url
+        self.recorder = recorder
+        self.rng = random.Random(f"{run_id}-{index}")
+        self.http = requests.Session()
+        self.folder_id: int | None = None
+
+    def call(self, endpoint: str, method: str, path: str, expect_status: int | None = None,
+             expect_type: str | None = None, **kwargs) -> requests.Response | None:
+        """
+        Один запит без переходу за редіректами (303 - нормальна відповідь форм).
+        expect_status/expect_type - очікувані код і Content-Type: для ендпоінтів, що про помилку
+        повідомляють редіректом (як /convert - 303 на /), інша відповідь рахується помилкою.
+        """
+        started_at = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, allow_redirects=False, timeout=120, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(endpoint, time.perf_counter() - started_at, ok=False)
+            return None
+        ok = response.status_code < 400
+        if expect_status is not None and response.status_code != expect_status:
+            ok = False
+        if expect_type is not None and not response.headers.get("content-type", "").startswith(expect_type):
+            ok = False
+        self.recorder.record(endpoint, time.perf_counter() - started_at, ok=ok)
+        return response
+
+    def _results(self, query: str) -> list[dict]:
+        results = fake_search_results(query, self.origin_url)
+        for result in results:
+            result["type"] = classify_url(result["link"], result["title"])
+        return results
+
+    # --- Сценарії ---
+
+    def register(self):
+        password = "loadtest-password"
+        self.call("POST /register", "POST", "/register", data={
+            "email": self.email, "password": password, "password_confirm": password,
+        })
+
+    def search_to_convert(self):
+        """Пошук -> додати до списку -> розміри -> оптимізація -> PDF сторінки."""
+        self.call("GET /clear-list", "GET", "/clear-list")
+        query = self.rng.choice(_QUERIES)
+        self.call("POST /search", "POST", "/search", data={"query": query})
+        self.call("GET /", "GET", "/")
+
+        results = self._results(query)
+        selected = self.rng.sample(range(len(results)), k=self.rng.randint(3, len(results)))
+        form = {"selected_indices": [str(i) for i in selected]}
+        for i in selected:
+            result = results[i]
+            form.update({
+                f"link_{i}": result["link"], f"title_{i}": result["title"],
+                f"snippet_{i}": result["snippet"], f"type_{i}": result["type"],
+                f"weight_{i}": str(self.rng.randint(1, 10)),
+            })
+        self.call("POST /add-to-list", "POST", "/add-to-list", data=form)
+        self.call("POST /fetch-sizes", "POST", "/fetch-sizes")
+
+        page = self.call("GET /optimization-list", "GET", "/optimization-list")
+        match = _OPTIMIZE_FORM_RE.search(page.text) if page is not None else None
+        if match:
+            optimize_form = {name: html.unescape(value) for name, value in _INPUT_RE.findall(match.group(1))}
+            optimize_form["memory_size"] = str(self.rng.choice((50, 200, 1000)))
+            self.call("POST /optimize", "POST", "/optimize", data=optimize_form)
+
+        pages = [result for result in results if result["type"] == "text"]
+        if pages:
+            self.call("POST /convert", "POST", "/convert", expect_status=200, expect_type="application/pdf",
+                      data={"url": self.rng.choice(pages)["link"], "type": "text"})
+
+    def bookmarks(self):
+        """Закладки: додати результат у папку, сторінка папки, оптимізація по папці."""
+        if self.folder_id is None:
+            page = self.call("GET /bookmarks/", "GET", "/bookmarks/")
+            match = _FOLDER_RE.search(page.text) if page is not None else None
+            if not match:
+                return
+            self.folder_id = int(match.group(1))
+
+        result = self.rng.choice(self._results(self.rng.choice(_QUERIES)))
+        self.call("POST /bookmarks/add", "POST", "/bookmarks/add", data={
+            "bookmark_index": "0", "url_0": result["link"], "name_0": result["title"],
+            "type_0": result["type"], "folder_id_0": str(self.folder_id),
+        })
+        self.call("GET /bookmarks/", "GET", "/bookmarks/")
+        self.call("GET /bookmarks/folder/{folder_id}/items", "GET", f"/bookmarks/folder/{self.folder_id}/items")
+        self.call("POST /bookmarks/folder/{folder_id}/optimize", "POST",
+                  f"/bookmarks/folder/{self.folder_id}/optimize", data={"memory_size": "500"})
+
+    def history(self):
+        """Історія: кліки по результатах та перегляд сторінки історії."""
+        results = self._results(self.rng.choice(_QUERIES))
+        for result in self.rng.sample(results, k=3):
+            self.call("POST /history/track-click", "POST", "/history/track-click",
+                      data={"url": result["link"], "type": result["type"]})
+        self.call("GET /history/", "GET", "/history/")
+
+    def api_optimize(self):
+        """JSON API оптимізації (програмний клієнт)."""
+        results = self._results(self.rng.choice(_QUERIES))
+        items = [
+            {"title": r["title"], "link": r["link"], "type": r["type"], "weight": self.rng.randint(1, 10)}
+            for r in results
+        ]
+        self.call("POST /api/optimize", "POST", "/api/optimize",
+                  json={"items": items, "memory_size_mb": self.rng.choice((50, 200, 1000))})
+
+
+# Сценарій -> вага (частота вибору)
+JOURNEYS = {
+    "search_to_convert": 3,
+    "bookmarks": 2,
+    "history": 2,
+    "api_optimize": 1,
+}
+
+
+def run_user(user: VirtualUser, deadline: float):
+    """Реєстрація, далі випадкові сценарії (за вагами) до закінчення часу."""
+    user.register()
+    names = list(JOURNEYS)
+    weights = [JOURNEYS[name] for name in names]
+    while time.perf_counter() < deadline:
+        name = user.rng.choices(names, weights)[0]
+        getattr(user, name)()
+        user.recorder.journey_done(name)
@@ -0,0 +1,111 @@
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class Recorder:
+    """Потокобезпечний збір замірів: endpoint -> список тривалостей (с) та кількість помилок."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies: dict[str, list[float]] = defaultdict(list)
+        self._errors: dict[str, int] = defaultdict(int)
+        self._journeys: dict[str, int] = defaultdict(int)
+        self.started_at = time.perf_counter()
+        self.finished_at: float | None = None
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            self._latencies[endpoint].append(seconds)
+            if not ok:
+                self._errors[endpoint] += 1
+
+    def journey_done(self, name: str):
+        with self._lock:
+            self._journeys[name] += 1
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+    def summary(self) -> dict:
+        """Пропускна здатність та перцентилі (мс) для кожного endpoint."""
+        elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+        with self._lock:
+            endpoints = {}
+            for endpoint, latencies in sorted(self._latencies.items()):
+                ordered = sorted(latencies)
+                endpoints[endpoint] = {
+                    "count": len(ordered),
+                    "errors": self._errors.get(endpoint, 0),
+                    "rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+                    **{f"p{p}": round(percentile(ordered, p) * 1000, 1) for p in PERCENTILES},
+                    "max": round(ordered[-1] * 1000, 1),
+                }
+            total = sum(item["count"] for item in endpoints.values())
+            return {
+                "duration_seconds": round(elapsed, 2),
+                "requests": total,
+                "errors": sum(item["errors"] for item in endpoints.values()),
+                "rps": round(total / elapsed, 2) if elapsed else 0.0,
+                "journeys": dict(self._journeys),
+                "endpoints": endpoints,
+            }
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    """Перцентиль за методом найближчого рангу (список вже відсортований)."""
+    if not ordered:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def format_summary(summary: dict) -> str:
+    """Таблиця для консолі."""
+    header = f"{'endpoint':<42}{'count':>7}{'err':>6}{'rps':>8}" + "".join(
+        f"{f'p{p} ms':>10}" for p in PERCENTILES
+    ) + f"{'max ms':>10}"
+    lines = [header, "-" * len(header)]
+    for endpoint, item in summary["endpoints"].items():
+        lines.append(
+            f"{endpoint:<42}{item['count']:>7}{item['errors']:>6}{item['rps']:>8}"
+            + "".join(f"{item[f'p{p}']:>10}" for p in PERCENTILES)
+            + f"{item['max']:>10}"
+        )
+    lines.append("-" * len(header))
+    lines.append(
+        f"Усього: {summary['requests']} запитів за {summary['duration_seconds']} с "
+        f"({summary['rps']} запитів/с), помилок: {summary['errors']}"
+    )
+    lines.append("Сценарії: " + ", ".join(f"{name}={count}" for name, count in summary["journeys"].items()))
+    return "\n".join(lines)
+
+
+def compare_with_baseline(summary: dict, baseline_path: Path, max_regression: float) -> list[str]:
+    """
+    Порівнює p95 та частку помилок з попереднім прогоном.
+    Повертає список регресій (порожній - регресій немає).
+    Endpoint'и з малою кількістю запитів не порівнюються: їх перцентилі нестабільні.
+    """
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    regressions = []
+    for endpoint, item in summary["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before or before["count"] < 20 or item["count"] < 20:
+            continue
+
+        if before["p95"] > 0 and item["p95"] > before["p95"] * (1 + max_regression):
+            regressions.append(f"{endpoint}: p95 {before['p95']} -> {item['p95']} мс")
+
+        error_rate_before = before["errors"] / before["count"]
+        error_rate = item["errors"] / item["count"]
+        if error_rate > error_rate_before + max_regression / 10:
+            regressions.append(
+                f"{endpoint}: помилки {round(error_rate_before * 100, 1)}% -> {round(error_rate * 100, 1)}%"
+            )
+    return regressions
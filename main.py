@@ -1,15 +1,42 @@
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+import time
+import uuid
+import logging
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, JSONResponse
 from starlette.middleware.sessions import SessionMiddleware
 
 # Локальні імпорти
-from config import APP_SECRET_KEY, PDF_CACHE_DIR
-from services.browser_manager import start_browser, stop_browser
+from config import APP_SECRET_KEY, PDF_CACHE_DIR, STATIC_DIR, templates
+from services.logging_setup import setup_logging, stop_logging, request_id_var
+from services.browser_manager import start_browser, stop_browser, get_browser_status, STARTING
+from services.http_client import close_probe_session
+from services.history_writer import start_history_writer, stop_history_writer, get_pending_count
+from services.auth_service import shutdown_password_hasher, get_password_hasher_stats
+from services.media_downloader import get_media_download_stats
+from services.download_scheduler import get_download_scheduler_stats
+from services.worker_registry import start_worker_registry, stop_worker_registry
+from services.admission import POOLS as ADMISSION_POOLS
+from services.http_caching import (
+    CompressionMiddleware, ConditionalGetMiddleware, VersionedStaticFiles, static_url
+)
+from services.metrics import (
+    REQUEST_SECONDS, REQUESTS_IN_PROGRESS, instrument_engine, instrument_templates,
+    register_queue, render_metrics, start_metrics, stop_metrics, is_metrics_access_allowed
+)
 from routers import pages, search, content, optimize
 from routers import auth
 from routers import bookmarks
-from database import Base, engine
+from database import engine
 from routers import history
+from routers import diagnostics
+from routers import media
+from routers import downloads
+from services.schema_version import ensure_schema
+
+# Логування налаштовується до створення застосунку (JSON через чергу, див. services/logging_setup.py)
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # --- Створення FastAPI ---
 app = FastAPI(
@@ -18,6 +45,16 @@ app = FastAPI(
     version="0.1.0"
 )
 
+# --- Метрики (Prometheus, /metrics) ---
+instrument_engine(engine)
+instrument_templates(templates)
+register_queue("history_pending", get_pending_count)
+register_queue("password_hashing", lambda: get_password_hasher_stats()["pending"])
+register_queue("media_downloads", lambda: get_media_download_stats()["in_progress"])
+register_queue("download_plans", lambda: get_download_scheduler_stats()["active_plans"])
+for _pool in ADMISSION_POOLS.values():
+    register_queue(f"admission_{_pool.name}", lambda pool=_pool: pool.waiting)
+
 # --- Middleware ---
 app.add_middleware(
     SessionMiddleware,
@@ -25,6 +62,46 @@ app.add_middleware(
     https_only=False,  # Встановіть True для production
     max_age=86400 * 14  # 2 тижні
 )
+# ETag рахується від нестиснутого тіла, тому ConditionalGet - всередині стиснення
+app.add_middleware(ConditionalGetMiddleware)
+app.add_middleware(CompressionMiddleware)
+
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """
+    ID запиту для логів: з заголовка X-Request-ID (від проксі) або новий.
+    Повертається клієнту в тому ж заголовку.
+    """
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    """
+    Час обробки кожного запиту. Мітка route - шаблон маршруту (/bookmarks/folder/{folder_id}/items),
+    а не фактичний шлях, щоб кількість рядів метрики не залежала від ID.
+    """
+    started_at = time.perf_counter()
+    status_code = 500
+    REQUESTS_IN_PROGRESS.inc()
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_PROGRESS.dec()
+        route = request.scope.get("route")
+        REQUEST_SECONDS.labels(
+            request.method, getattr(route, "path", "unmatched"), str(status_code)
+        ).observe(time.perf_counter() - started_at)
 
 
 # --- Події життєвого циклу ---
@@ -35,26 +112,41 @@ app.add_middleware(
 async def on_startup():
     """
     При старті сервера:
-    1. Створюємо папку кешу.
-    2. Запускаємо Playwright/браузер.
-    3. Створюємо таблиці в БД (якщо їх немає).
+    1. Створюємо таблиці в БД (якщо їх немає) - лише коли змінилась версія схеми.
+    2. Реєструємо воркер у спільному реєстрі (координація воркерів uvicorn).
+    3. Запускаємо Playwright/браузер (одразу, у фоні або при першому рендерингу - BROWSER_LAUNCH_MODE).
+    4. Запускаємо фоновий запис історії (з відновленням спулу).
+    5. Запускаємо оновлення метрик черг (лише з PROMETHEUS_MULTIPROC_DIR).
     """
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        print("Таблиці бази даних перевірено/створено.")
+    if await ensure_schema(engine):
+        logger.info("Таблиці бази даних перевірено/створено.")
+    else:
+        logger.info("Версія схеми БД збігається, create_all пропущено.")
 
+    await start_worker_registry()
     await start_browser()
+    await start_history_writer()
+    await start_metrics()
+    app.state.started = True
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
     """
-    Закриваємо Playwright при зупинці сервера.
+    Дописуємо чергу історії, закриваємо Playwright, знімаємо воркер з реєстру, закриваємо пул HTTP-з'єднань та пул bcrypt,
+    позначаємо процес завершеним у спільних метриках воркерів.
     """
+    await stop_history_writer()
     await stop_browser()
+    await stop_worker_registry()
+    close_probe_session()
+    shutdown_password_hasher()
+    await stop_metrics()
+    stop_logging()
 
-# Монтуємо папку "Static"
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Монтуємо папку "Static" (URL з версією для шаблонів - static_url, див. services/http_caching.py)
+app.mount("/static", VersionedStaticFiles(directory=STATIC_DIR), name="static")
+templates.env.globals["static_url"] = static_url
 
 # --- Підключення Роутерів ---
 app.include_router(auth.router, tags=["Автентифікація"])
@@ -64,8 +156,35 @@ app.include_router(pages.router, tags=["Основні Сторінки"])
 app.include_router(search.router, tags=["Пошук"])
 app.include_router(content.router, tags=["Керування Контентом"])
 app.include_router(optimize.router, tags=["Оптимізація"])
+app.include_router(media.router, tags=["Медіа"])
+app.include_router(downloads.router, tags=["Завантаження"])
+app.include_router(diagnostics.router, tags=["Діагностика"])
 
 
 @app.get("/api/health")
 def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+@app.get("/api/ready")
+def readiness_check():
+    """
+    Готовність приймати трафік (для балансувальника/оркестратора).
+    503, поки не завершено старт або браузер ще запускається у фоні.
+    """
+    browser = get_browser_status()
+    ready = getattr(app.state, "started", False) and browser != STARTING
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "starting", "browser": browser}
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    """Метрики у форматі Prometheus (доступ - METRICS_ALLOWED_IPS / METRICS_TOKEN)."""
+    client_host = request.client.host if request.client else None
+    if not is_metrics_access_allowed(client_host, request.headers.get("authorization")):
+        return Response(status_code=403)
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, NVARCHAR, DateTime, ForeignKey, BIGINT, Identity
+from sqlalchemy import Column, Integer, String, NVARCHAR, DateTime, ForeignKey, BIGINT, Identity, Index, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -24,6 +24,39 @@ class Material(Base):
     Size = Column(BIGINT, nullable=True)
 
 
+# Накопичена статистика виміряних розмірів за типом та доменом (для оцінки розміру).
+# Domain = '' - зведений рядок по всіх доменах типу.
+class SizeStat(Base):
+    __tablename__ = "SizeStats"
+    Type = Column(NVARCHAR(50), primary_key=True)
+    Domain = Column(NVARCHAR(255), primary_key=True)
+    SampleCount = Column(Integer, nullable=False, default=0)
+    SumLogSize = Column(Float, nullable=False, default=0.0)  # Сума ln(розмір у байтах)
+    RateSampleCount = Column(Integer, nullable=False, default=0)
+    SumRate = Column(Float, nullable=False, default=0.0)  # Сума байт/с (для медіа з тривалістю)
+
+
+# Файл у сховищі за вмістом (blob_store/<перші 2 символи>/<sha256>)
+class Blob(Base):
+    __tablename__ = "Blobs"
+    BlobID = Column(Integer, Identity(start=1, increment=1), primary_key=True)
+    Hash = Column(NVARCHAR(64), nullable=False, unique=True)  # SHA-256 (hex)
+    Size = Column(BIGINT, nullable=False)
+    ContentType = Column(NVARCHAR(100), nullable=True)
+    RefCount = Column(Integer, nullable=False, default=0)  # Кількість MaterialBlobs, що посилаються
+    CreationDate = Column(DateTime, nullable=False, server_default=func.now())
+
+
+# Відповідність матеріалу (URL) та його файлу (PDF-рендер або завантажений документ)
+class MaterialBlob(Base):
+    __tablename__ = "MaterialBlobs"
+    MaterialID = Column(Integer, ForeignKey("Materials.MaterialID"), primary_key=True)
+    BlobID = Column(Integer, ForeignKey("Blobs.BlobID"), nullable=False, index=True)
+    CreationDate = Column(DateTime, nullable=False, server_default=func.now())
+
+    blob = relationship("Blob")  # Зв'язок в один бік
+
+
 class BookmarkFolder(Base):
     __tablename__ = "BookmarkFolders"
     FolderID = Column(Integer, Identity(start=1, increment=1), primary_key=True)
@@ -55,4 +88,23 @@ class HistoryMaterial(Base):
     LoadDate = Column(DateTime, nullable=False, server_default=func.now())
 
     user = relationship("User", back_populates="history")
-    material = relationship("Material")  # Зв'язок в один бік
\ No newline at end of file
+    material = relationship("Material")  # Зв'язок в один бік
+
+    __table_args__ = (
+        # Покриваючий індекс для посторінкової (keyset) історії користувача:
+        # WHERE UserID = ? ORDER BY LoadDate DESC, HistoryID DESC
+        Index(
+            "IX_HistoryMaterials_UserID_LoadDate",
+            "UserID", "LoadDate", "HistoryID",
+            mssql_include=["MaterialID"],
+            postgresql_include=["MaterialID"],
+        ),
+    )
+
+
+# Версія схеми БД (хеш моделей, див. services/schema_version.py):
+# якщо збігається з поточною, create_all при старті не виконується
+class SchemaVersion(Base):
+    __tablename__ = "SchemaVersion"
+    Version = Column(NVARCHAR(64), primary_key=True)
+    AppliedDate = Column(DateTime, nullable=False, server_default=func.now())
@@ -0,0 +1,77 @@
+"""
+Спільний сервіс рендерингу PDF: один Chromium на хост замість браузера в кожному воркері.
+
+Запуск (з кореня проекту):
+    uvicorn render_service:app --host 127.0.0.1 --port 8100
+Воркери застосунку використовують його, якщо задано RENDER_SERVICE_URL=http://127.0.0.1:8100
+(тоді власний браузер вони не запускають). Одночасних рендерингів - не більше RENDER_CONCURRENCY.
+"""
+import uuid
+import asyncio
+import logging
+import tempfile
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.responses import FileResponse, JSONResponse
+from starlette.background import BackgroundTask
+
+from config import RENDER_CONCURRENCY
+from schemas import RenderRequest
+from services.logging_setup import setup_logging, stop_logging
+from services.browser_manager import (
+    ensure_browser, stop_browser, get_browser_status, render_page_to_pdf, render_errors, READY
+)
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Render service")
+
+_render_slots = asyncio.Semaphore(RENDER_CONCURRENCY)
+
+
+@app.on_event("startup")
+async def on_startup():
+    # Сервіс існує заради браузера - запускаємо його одразу, незалежно від
+    # BROWSER_LAUNCH_MODE та RENDER_SERVICE_URL (.env може бути спільним з воркерами)
+    await ensure_browser()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await stop_browser()
+    stop_logging()
+
+
+@app.get("/api/ready")
+async def readiness():
+    status = get_browser_status()
+    return JSONResponse({"browser": status}, status_code=200 if status == READY else 503)
+
+
+@app.post("/render")
+async def render(body: RenderRequest):
+    """
+    Рендерить сторінку в PDF і повертає файл.
+    502 - сторінку не вдалося відкрити (detail - повідомлення Playwright), 503 - браузер не запущено.
+    """
+    if await ensure_browser() is None:
+        return JSONResponse({"detail": "Браузер не запущено."}, status_code=503)
+
+    path = Path(tempfile.gettempdir()) / f"render-{uuid.uuid4().hex}.pdf"
+    try:
+        async with _render_slots:
+            await render_page_to_pdf(body.url, path)
+    except render_errors() as e:
+        path.unlink(missing_ok=True)
+        logger.warning("Помилка рендерингу %s: %s", body.url, e.message.splitlines()[0])
+        return JSONResponse({"detail": e.message.splitlines()[0]}, status_code=502)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+
+    return FileResponse(
+        path, media_type="application/pdf",
+        background=BackgroundTask(path.unlink, missing_ok=True)
+    )
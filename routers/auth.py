@@ -5,7 +5,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from config import templates
 from database import get_db
 from schemas import UserCreate, UserLogin
-from services.auth_service import get_user_by_email, create_user, verify_password
+from services.auth_service import (
+    get_user_by_email, create_user, verify_password_async, login_user, logout_user,
+    invalidate_cached_user
+)
 from services.bookmark_service import create_default_folder
 
 router = APIRouter(tags=["Автентифікація"])
@@ -28,7 +31,7 @@ async def register_page(request: Request):
 @router.get("/logout")
 async def logout(request: Request):
     """Видаляє користувача з сесії."""
-    request.session.pop("user_email", None)
+    logout_user(request)
     request.session.pop("optimization_list", None)
     return RedirectResponse(url="/", status_code=303)
 
@@ -44,7 +47,11 @@ async def login_submit(request: Request, db: AsyncSession = Depends(get_db)):
     error = None
     user = await get_user_by_email(db, user_data.email)
 
-    if not user or not verify_password(user_data.password, user.PasswordHash):
+    is_valid, new_hash = False, None
+    if user:
+        is_valid, new_hash = await verify_password_async(user_data.password, user.PasswordHash)
+
+    if not is_valid:
         error = "Неправильний email або пароль"
         return templates.TemplateResponse("login.html", {
             "request": request,
@@ -52,8 +59,14 @@ async def login_submit(request: Request, db: AsyncSession = Depends(get_db)):
             "email": user_data.email
         }, status_code=401)
 
-    # Зберігаємо email в сесії
-    request.session["user_email"] = user.Email
+    # Параметри bcrypt змінились - прозоро оновлюємо хеш
+    if new_hash:
+        user.PasswordHash = new_hash
+        await db.commit()
+        invalidate_cached_user(user.UserID)
+
+    # Зберігаємо користувача в сесії
+    login_user(request, user)
 
     return RedirectResponse(url="/", status_code=303)
 
@@ -86,6 +99,6 @@ async def register_submit(request: Request, db: AsyncSession = Depends(get_db)):
     await create_default_folder(db, user)
     
     # Автоматично логінимо користувача
-    request.session["user_email"] = user.Email
+    login_user(request, user)
 
     return RedirectResponse(url="/", status_code=303)
\ No newline at end of file
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Request, Depends, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+import asyncio
+from fastapi import APIRouter, Request, Depends, Form, File, UploadFile
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import templates
@@ -7,6 +8,13 @@ from database import get_db
 from models import User, BookmarkFolder, Bookmark
 from services.auth_service import get_required_user
 from services import bookmark_service as service
+from services import transfer_service
+from services.content_utils import size_items
+from services.optimizer import solve_knapsack_problem
+from services.admission import admit
+
+# Куди можна повернутись після масового додавання (лише відомі локальні сторінки)
+_BULK_ADD_REDIRECTS = {"/", "/optimization-list", "/bookmarks"}
 
 router = APIRouter(
     prefix="/bookmarks",
@@ -24,8 +32,9 @@ async def get_bookmarks_page(
 ):
     """
     Відображає сторінку керування закладками.
+    Закладки кожної папки підвантажуються при її розгортанні (get_folder_items).
     """
-    folders = await service.get_user_folders_with_bookmarks(db, user)
+    folders = await service.get_user_folders_summary(db, user)
 
     # Отримуємо дані для хедера з сесії
     optimization_list = request.session.get("optimization_list", [])
@@ -33,11 +42,79 @@ async def get_bookmarks_page(
     return templates.TemplateResponse("bookmarks.html", {
         "request": request,
         "folders": folders,
+        # Для списку "Перемістити" у закладках, що рендеряться в main.js
+        "folder_options": [{"id": f.FolderID, "name": f.Name} for f in folders],
+        "transfer_message": request.session.pop("transfer_message", None),
         "user_email": user.Email,  # Передаємо email для хедера
         "optimization_count": len(optimization_list)  # Для хедера
     })
 
 
+@router.get("/folder/{folder_id}/items")
+async def get_folder_items(
+        folder_id: int,
+        user: User = Depends(get_required_user),
+        db: AsyncSession = Depends(get_db),
+        after_id: int | None = None
+):
+    """
+    Повертає сторінку закладок папки у форматі JSON.
+    """
+    rows, next_after_id = await service.get_folder_bookmarks_page(db, user, folder_id, after_id)
+
+    return {
+        "items": [
+            {
+                "bookmark_id": row.BookmarkID,
+                "name": row.Name,
+                "url": row.URL,
+                "type": row.Type,
+                "size_mb": round(row.Size / (1024 * 1024), 2) if row.Size is not None else None,
+            }
+            for row in rows
+        ],
+        "next_after_id": next_after_id,
+    }
+
+
+@router.post("/folder/{folder_id}/optimize", response_class=HTMLResponse)
+async def optimize_folder(
+        request: Request,
+        folder_id: int,
+        user: User = Depends(get_required_user),
+        db: AsyncSession = Depends(get_db),
+        memory_size: str = Form("1000")
+):
+    """
+    Запускає оптимізацію прямо по закладках папки.
+    Відомі розміри беруться з Material.Size, невідомі визначаються
+    паралельно з читанням папки; потім виконується алгоритм рюкзака.
+    """
+    async with admit("probe"):
+        items = await size_items(service.stream_folder_items(db, user, folder_id))
+    # Перебір - CPU-робота: виконується в потоці, щоб не блокувати цикл подій
+    async with admit("solve"):
+        optimized_results, error = await asyncio.to_thread(solve_knapsack_problem, items, memory_size)
+
+    total_size = round(sum(item.get('size_mb') or 0 for item in items), 2)
+    optimization_list = request.session.get("optimization_list", [])
+
+    context = {
+        "request": request,
+        "items": items,
+        "memory_size": memory_size,
+        "total_size": total_size,
+        "user_email": user.Email,
+        "folders": await service.get_user_folders(db, user),
+        "optimization_count": len(optimization_list)
+    }
+    if error:
+        context["error"] = error
+    else:
+        context["optimized_results"] = optimized_results
+    return templates.TemplateResponse("prepare.html", context)
+
+
 @router.post("/add")
 async def add_bookmark(
         request: Request,
@@ -70,8 +147,8 @@ async def add_bookmark(
     if not folder:
         return RedirectResponse(url="/", status_code=303)
 
-    material = await service.get_or_create_material(db, url, type_str)
-    await service.create_bookmark(db, folder.FolderID, material.MaterialID, name)
+    material_id = await service.get_or_create_material_id(db, url, type_str)
+    await service.create_bookmark(db, folder.FolderID, material_id, name)
 
     return RedirectResponse(url="/", status_code=303)
 
@@ -167,4 +244,111 @@ async def move_bookmark(
         bookmark.FolderID = new_folder.FolderID
         await db.commit()
 
-    return RedirectResponse("/bookmarks", status_code=303)
\ No newline at end of file
+    return RedirectResponse("/bookmarks", status_code=303)
+
+
+# --- Масові операції ---
+
+@router.post("/bulk-add")
+async def bulk_add_bookmarks(
+        request: Request,
+        user: User = Depends(get_required_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Додає в папку всі обрані елементи (результати пошуку або оптимальний набір).
+    Приймає 'selected_indices', 'folder_id' та поля 'link_{i}', 'title_{i}', 'type_{i}'.
+    """
+    form_data = await request.form()
+    redirect_to = form_data.get("redirect_to")
+    if redirect_to not in _BULK_ADD_REDIRECTS:
+        redirect_to = "/"
+
+    try:
+        folder_id = int(form_data.get("folder_id", ""))
+    except ValueError:
+        return RedirectResponse(url=redirect_to, status_code=303)
+
+    folder = await service.check_folder_owner(db, user, folder_id)
+    if not folder:
+        return RedirectResponse(url=redirect_to, status_code=303)
+
+    items = []
+    for index in form_data.getlist("selected_indices"):
+        url = form_data.get(f"link_{index}")
+        title = form_data.get(f"title_{index}")
+        type_str = form_data.get(f"type_{index}")
+        if url and title and type_str:
+            items.append((url, type_str, title))
+
+    await service.create_bookmarks(db, folder.FolderID, items)
+    return RedirectResponse(url=redirect_to, status_code=303)
+
+
+@router.post("/bulk-delete")
+async def bulk_delete_bookmarks(
+        user: User = Depends(get_required_user),
+        db: AsyncSession = Depends(get_db),
+        bookmark_ids: list[int] = Form(default=[])
+):
+    """
+    Видаляє кілька закладок одним запитом.
+    """
+    await service.delete_bookmarks(db, user, bookmark_ids)
+    return RedirectResponse("/bookmarks", status_code=303)
+
+
+@router.post("/bulk-move")
+async def bulk_move_bookmarks(
+        user: User = Depends(get_required_user),
+        db: AsyncSession = Depends(get_db),
+        bookmark_ids: list[int] = Form(default=[]),
+        new_folder_id: int = Form(...)
+):
+    """
+    Переміщує кілька закладок в іншу папку одним запитом.
+    """
+    await service.move_bookmarks(db, user, bookmark_ids, new_folder_id)
+    return RedirectResponse("/bookmarks", status_code=303)
+
+
+# --- Експорт та імпорт ---
+
+@router.get("/export")
+async def export_bookmarks(
+        user: User = Depends(get_required_user),
+        format: str = "csv"
+):
+    """
+    Вивантажує всі папки та закладки у файл (format=csv або jsonl) потоково.
+    """
+    fmt = transfer_service.export_format(format)
+    return StreamingResponse(
+        transfer_service.export_bookmarks(user, fmt),
+        media_type=transfer_service.EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="bookmarks.{fmt}"'}
+    )
+
+
+@router.post("/import")
+async def import_bookmarks(
+        request: Request,
+        user: User = Depends(get_required_user),
+        db: AsyncSession = Depends(get_db),
+        file: UploadFile = File(...)
+):
+    """
+    Завантажує папки та закладки з файлу експорту (CSV або JSON Lines, за розширенням файлу).
+    Закладки, що вже є в папці, не дублюються.
+    Підсумок (або запис, на якому імпорт зупинився) показується на сторінці закладок.
+    """
+    fmt = transfer_service.export_format(None, file.filename)
+    try:
+        added, skipped = await transfer_service.import_bookmarks(db, user, file.file, fmt)
+    except transfer_service.ImportFailed as e:
+        request.session["transfer_message"] = (
+            f"Імпортовано {e.added} закладок; файл не вдалося прочитати на записі {e.row}: {e}"
+        )
+    else:
+        request.session["transfer_message"] = f"Імпортовано {added} закладок, пропущено {skipped}."
+    return RedirectResponse("/bookmarks", status_code=303)
@@ -1,5 +1,4 @@
-import io
-import asyncio
+import logging
 from fastapi import APIRouter, Request, Form, Depends
 from fastapi.responses import (
     HTMLResponse, StreamingResponse, RedirectResponse, FileResponse
@@ -9,9 +8,13 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from config import templates, PDF_CACHE_DIR
 from database import get_db
 from models import User
-from services.content_utils import update_item_size, generate_pdf_for_download
+from services.content_utils import size_items, generate_pdf_for_download
 from services.auth_service import get_current_user
-from services.history_service import add_to_history
+from services.history_writer import record_history
+from services.range_streaming import stream_file
+from services.admission import admit
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -26,6 +29,7 @@ async def convert_to_pdf(
     Конвертує URL в PDF.
     Приймає АБО індекс 'convert_index' (з index.html),
     АБО прямий 'url' (з bookmarks.html/history.html).
+    Вже конвертовані матеріали віддаються зі сховища без повторного рендерингу.
     """
     form_data = await request.form()
     url = None
@@ -44,7 +48,8 @@ async def convert_to_pdf(
         request.session["convert_error"] = "Не вдалося знайти URL або індекс для конвертації."
         return RedirectResponse(url="/", status_code=303)
 
-    pdf_content, filename, error = await generate_pdf_for_download(url)
+    async with admit("render"):
+        pdf_path, filename, error = await generate_pdf_for_download(db, url)
 
     if error:
         request.session["convert_error"] = error
@@ -52,34 +57,30 @@ async def convert_to_pdf(
 
     if user:
         try:
-            await add_to_history(db, user, url, "text")
+            record_history(user.UserID, url, "text")
         except Exception as e:
-            print(f"ПОМИЛКА (convert history): {e}")
+            logger.error("Помилка запису історії (convert): %s", e)
 
-    return StreamingResponse(
-        io.BytesIO(pdf_content),
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    return stream_file(pdf_path, request.headers.get("range"), filename, media_type="application/pdf")
 
 
 @router.post("/fetch-sizes")
-# 1. ДОДАЙТЕ db: AsyncSession
-async def fetch_sizes(request: Request, db: AsyncSession = Depends(get_db)):
+async def fetch_sizes(request: Request):
     """
-    Примусово оновлює розміри для ВСІХ елементів у сесії,
-    використовуючи asyncio.gather для паралельної обробки.
+    Примусово оновлює розміри для ВСІХ елементів у сесії (паралельно).
     """
     optimization_list = request.session.get("optimization_list", [])
     if not optimization_list:
         return RedirectResponse(url="/optimization-list", status_code=303)
 
-    print(f"Отримання розмірів для {len(optimization_list)} елементів (паралельно)...")
+    logger.info("Отримання розмірів для %d елементів (паралельно)", len(optimization_list))
 
-    tasks = [update_item_size(item, db) for item in optimization_list]
-    updated_list = await asyncio.gather(*tasks)
+    # Кожен елемент оновлюється з власною сесією БД (спільну сесію не можна
+    # використовувати з кількох задач одночасно)
+    async with admit("probe"):
+        updated_list = await size_items(optimization_list, force=True)
 
-    print("Отримання розмірів завершено.")
+    logger.debug("Отримання розмірів завершено.")
     request.session["optimization_list"] = updated_list
 
     return RedirectResponse(url="/optimization-list", status_code=303)
\ No newline at end of file
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Request, Depends, HTTPException, status
+
+from services.auth_service import get_password_hasher_stats
+from services.media_downloader import get_media_download_stats
+from services.download_scheduler import get_download_scheduler_stats
+from services.probe_guard import get_probe_guard_stats
+from services.logging_setup import get_logging_stats
+from services.worker_registry import get_worker_registry_stats
+from services.admission import get_admission_stats
+from services.metrics import is_metrics_access_allowed
+
+
+def require_metrics_access(request: Request):
+    """Залежність: діагностика доступна на тих самих умовах, що й /metrics (METRICS_ALLOWED_IPS / METRICS_TOKEN)."""
+    client_host = request.client.host if request.client else None
+    if not is_metrics_access_allowed(client_host, request.headers.get("authorization")):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+
+router = APIRouter(prefix="/api", tags=["Діагностика"], dependencies=[Depends(require_metrics_access)])
+
+
+@router.get("/stats")
+async def get_stats():
+    """
+    Поточний стан внутрішніх черг та пулів.
+    """
+    return {
+        "password_hashing": get_password_hasher_stats(),
+        "media_downloads": get_media_download_stats(),
+        "download_plans": get_download_scheduler_stats(),
+        "probe_guard": get_probe_guard_stats(),
+        "logging": get_logging_stats(),
+        "workers": get_worker_registry_stats(),
+        "admission": get_admission_stats(),
+    }
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+from fastapi import APIRouter, Request, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
+
+from models import User
+from schemas import DownloadPlanRequest
+from services.auth_service import get_required_user
+from services.download_scheduler import start_download_plan, get_download_plan
+from services.range_streaming import stream_file
+
+router = APIRouter(prefix="/download-plan", tags=["Завантаження"])
+
+
+def _plan_status(plan: dict) -> dict:
+    data = plan["status"]
+    for item in data["items"]:
+        item["download_url"] = (
+            f"/download-plan/{data['id']}/files/{item['index']}" if str(item["index"]) in plan["files"] else None
+        )
+    return data
+
+
+async def _get_user_plan(plan_id: str, user: User) -> dict:
+    """Стан плану (з будь-якого воркера), якщо план належить користувачу."""
+    plan = await get_download_plan(plan_id)
+    if plan is None or plan["user_id"] != user.UserID:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="План завантаження не знайдено.")
+    return plan
+
+
+@router.post("")
+async def create_download_plan(body: DownloadPlanRequest, user: User = Depends(get_required_user)):
+    """
+    Запускає завантаження оптимального набору як єдиного плану на сервері.
+    Кандидати та ліміт передає сторінка, що показала результат оптимізації
+    (список оптимізації або папка закладок) - сесія для цього не використовується.
+    Стан плану опитується через GET /download-plan/{id}.
+    """
+    try:
+        plan = await start_download_plan([item.model_dump() for item in body.items], body.memory_size_mb,
+                                         user.UserID)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=_plan_status(plan.snapshot()))
+
+
+@router.get("/{plan_id}")
+async def get_download_plan_status(plan_id: str, user: User = Depends(get_required_user)):
+    """Поточний стан плану: черга, бюджет та стан кожного елемента."""
+    return _plan_status(await _get_user_plan(plan_id, user))
+
+
+@router.get("/{plan_id}/files/{index}")
+async def download_plan_file(
+        request: Request,
+        plan_id: str,
+        index: int,
+        user: User = Depends(get_required_user)
+):
+    """Віддає завантажений елемент плану (з підтримкою HTTP Range)."""
+    plan = await _get_user_plan(plan_id, user)
+    ready_file = plan["files"].get(str(index))
+    if ready_file is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Файл ще не готовий.")
+
+    path, filename = ready_file
+    return stream_file(Path(path), request.headers.get("range"), filename)
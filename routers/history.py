@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Request, Depends, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+import logging
+from fastapi import APIRouter, Request, Depends, Form, File, UploadFile
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import templates
 from database import get_db
 from models import User
 from services.auth_service import get_required_user, get_current_user
-from services import history_service
+from services import history_service, history_writer, transfer_service
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/history",
@@ -18,17 +21,27 @@ router = APIRouter(
 async def get_history_page(
         request: Request,
         user: User = Depends(get_required_user),  # Ця сторінка захищена
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_db),
+        cursor: str | None = None,
+        view: str = "all"
 ):
     """
-    Відображає сторінку історії користувача.
+    Відображає одну сторінку історії користувача.
+    cursor - позиція, з якої продовжити; view=latest - лише останній запис для кожного матеріалу.
     """
-    history_items = await history_service.get_user_history(db, user)
+    latest_only = view == "latest"
+    history_items, next_cursor = await history_service.get_user_history_page(
+        db, user, cursor=cursor, latest_only=latest_only
+    )
     optimization_list = request.session.get("optimization_list", [])
 
     return templates.TemplateResponse("history.html", {
         "request": request,
         "history_items": history_items,
+        "next_cursor": next_cursor,
+        "is_first_page": not cursor,
+        "view": "latest" if latest_only else "all",
+        "transfer_message": request.session.pop("transfer_message", None),
         "user_email": user.Email,
         "optimization_count": len(optimization_list)
     })
@@ -37,7 +50,6 @@ async def get_history_page(
 @router.post("/track-click")
 async def track_click_and_redirect(
     request: Request,
-    db: AsyncSession = Depends(get_db),
     user: User | None = Depends(get_current_user)
 ):
     """
@@ -61,10 +73,11 @@ async def track_click_and_redirect(
     if not url or not type_str:
         return RedirectResponse(url="/", status_code=303)
     if user:
+        # Запис в історію виконується у фоні, редірект не чекає на БД
         try:
-            await history_service.add_to_history(db, user, url, type_str)
+            history_writer.record_history(user.UserID, url, type_str)
         except Exception as e:
-            print(f"ПОМИЛКА (track-click history): {e}")
+            logger.error("Помилка запису історії (track-click): %s", e)
 
     # Перенаправляємо користувача на URL, на який він хотів перейти
     return RedirectResponse(url=url, status_code=303)
@@ -83,4 +96,59 @@ async def delete_from_history(
     await history_service.delete_history_item(db, user, history_id)
 
     # Повертаємо користувача назад на сторінку історії
-    return RedirectResponse(url="/history", status_code=303)
\ No newline at end of file
+    return RedirectResponse(url="/history", status_code=303)
+
+
+@router.post("/bulk-delete")
+async def bulk_delete_from_history(
+        user: User = Depends(get_required_user),
+        db: AsyncSession = Depends(get_db),
+        history_ids: list[int] = Form(default=[])
+):
+    """
+    Видаляє кілька записів з історії одним запитом.
+    """
+    await history_service.delete_history_items(db, user, history_ids)
+    return RedirectResponse(url="/history", status_code=303)
+
+
+# --- Експорт та імпорт ---
+
+@router.get("/export")
+async def export_history(
+        user: User = Depends(get_required_user),
+        format: str = "csv"
+):
+    """
+    Вивантажує всю історію у файл (format=csv або jsonl) потоково:
+    рядки читаються серверним курсором і відразу віддаються клієнту.
+    """
+    fmt = transfer_service.export_format(format)
+    return StreamingResponse(
+        transfer_service.export_history(user, fmt),
+        media_type=transfer_service.EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="history.{fmt}"'}
+    )
+
+
+@router.post("/import")
+async def import_history(
+        request: Request,
+        user: User = Depends(get_required_user),
+        db: AsyncSession = Depends(get_db),
+        file: UploadFile = File(...)
+):
+    """
+    Завантажує історію з файлу експорту (CSV або JSON Lines, за розширенням файлу).
+    Підсумок (або запис, на якому імпорт зупинився) показується на сторінці історії.
+    """
+    fmt = transfer_service.export_format(None, file.filename)
+    try:
+        added, skipped = await transfer_service.import_history(db, user, file.file, fmt)
+    except transfer_service.ImportFailed as e:
+        request.session["transfer_message"] = (
+            f"Імпортовано {e.added} записів; файл не вдалося прочитати на записі {e.row}: {e}"
+        )
+    else:
+        request.session["transfer_message"] = f"Імпортовано {added} записів, пропущено {skipped}."
+    return RedirectResponse(url="/history", status_code=303)
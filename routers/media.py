@@ -0,0 +1,77 @@
+import logging
+from fastapi import APIRouter, Request, Depends, Form, HTTPException, status
+from fastapi.responses import JSONResponse
+
+from config import MEDIA_MAX_FILESIZE_BYTES
+from models import User
+from services.auth_service import get_required_user
+from services.history_writer import record_history
+from services.media_downloader import (
+    start_media_download, get_media_status, find_stored_media_by_key, MediaDownloadError, MEDIA_FORMATS
+)
+from services.range_streaming import stream_file
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/media",
+    tags=["Медіа"],
+    dependencies=[Depends(get_required_user)]
+)
+
+
+def _media_status(key: str) -> dict:
+    state, error = get_media_status(key)
+    return {
+        "key": key,
+        "state": state,
+        "error": error,
+        "status_url": f"/media/download/{key}",
+        "file_url": f"/media/files/{key}" if state == "done" else None,
+    }
+
+
+@router.post("/download")
+async def download_media(
+        url: str = Form(..., max_length=2048),
+        type: str = Form(...),
+        user: User = Depends(get_required_user)
+):
+    """
+    Запускає завантаження відео/аудіо (yt-dlp) на сервер у фоні, не більше MEDIA_MAX_FILESIZE_BYTES.
+    Відповідь 202 зі status_url; коли стан "done", файл віддається за file_url.
+    """
+    if type not in MEDIA_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Тип '{type}' не підтримує завантаження.")
+
+    try:
+        key = start_media_download(url, type, max_filesize=MEDIA_MAX_FILESIZE_BYTES)
+    except MediaDownloadError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    record_history(user.UserID, url, type)
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=_media_status(key))
+
+
+@router.get("/download/{key}")
+async def get_media_download_status(key: str):
+    """Стан фонового завантаження медіа."""
+    data = _media_status(key)
+    if data["state"] == "unknown":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Завантаження не знайдено.")
+    return data
+
+
+@router.get("/files/{key}")
+async def get_media_file(request: Request, key: str):
+    """
+    Віддає завантажений медіафайл шматками.
+    Підтримує HTTP Range, тому перерване завантаження можна продовжити.
+    """
+    stored = find_stored_media_by_key(key)
+    if stored is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Файл ще не готовий.")
+
+    path, meta = stored
+    return stream_file(path, request.headers.get("range"), f"{meta['title']}.{meta['ext']}")
@@ -1,25 +1,38 @@
+import logging
 import asyncio
 from fastapi import APIRouter, Request, Form, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 
-from config import templates
-from services.content_utils import update_item_size
+from config import templates, OPTIMIZE_MAX_ITEMS
+from models import User
+from services.auth_service import get_current_user
+from services.bookmark_service import get_user_folders
+from schemas import OptimizeRequest, OptimizeResponse, OptimizerStats
+from services.content_utils import size_items
 from services.optimizer import solve_knapsack_problem
+from services.admission import admit
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
 @router.post("/optimize", response_class=HTMLResponse)
-async def optimize_content(request: Request, db: AsyncSession = Depends(get_db)):
+async def optimize_content(
+        request: Request,
+        db: AsyncSession = Depends(get_db),
+        user: User | None = Depends(get_current_user)
+):
     """
     Виконує оптимізацію.
     Якщо розміри відсутні, він асинхронно оновить їх ПЕРЕД запуском алгоритму.
     """
     form_data = await request.form()
     memory_size = form_data.get("memory_size", "1000")
-    item_count = int(form_data.get("item_count", 0))
+    item_count = min(int(form_data.get("item_count", 0)), OPTIMIZE_MAX_ITEMS)
 
     items_to_optimize = []
     for i in range(item_count):
@@ -37,32 +50,22 @@ async def optimize_content(request: Request, db: AsyncSession = Depends(get_db))
             "weight": int(form_data.get(f"weight_{i}", 5)),
             "size_mb": size_mb,
             "is_estimated": form_data.get(f"is_estimated_{i}") == 'True',
+            "size_method": form_data.get(f"size_method_{i}") or None,
             "cache_file": form_data.get(f"cache_file_{i}")
         })
 
     # --- Оновлення відсутніх розмірів ---
-    items_with_size = []
-    items_needing_size = []
-
-    if items_needing_size:
-        print(f"Оптимізація: оновлення {len(items_needing_size)} відсутніх розмірів (паралельно)...")
-        tasks = [update_item_size(item, db) for item in items_needing_size]
-        updated_items = await asyncio.gather(*tasks)
-        items_to_optimize = items_with_size + updated_items
-        print("Оновлення розмірів завершено.")
-
+    # Розмір 0.0 у формі означає "ще не визначено"
     for item in items_to_optimize:
-        if item.get('size_mb') is None or item.get('size_mb') == 0.0:
-            items_needing_size.append(item)
-        else:
-            items_with_size.append(item)
+        if item['size_mb'] == 0.0:
+            item['size_mb'] = None
 
+    items_needing_size = sum(1 for item in items_to_optimize if item['size_mb'] is None)
     if items_needing_size:
-        print(f"Оптимізація: оновлення {len(items_needing_size)} відсутніх розмірів (паралельно)...")
-        tasks = [update_item_size(item, db) for item in items_needing_size]
-        updated_items = await asyncio.gather(*tasks)
-        items_to_optimize = items_with_size + updated_items
-        print("Оновлення розмірів завершено.")
+        logger.info("Оптимізація: оновлення %d відсутніх розмірів (паралельно)", items_needing_size)
+        async with admit("probe"):
+            items_to_optimize = await size_items(items_to_optimize)
+        logger.debug("Оновлення розмірів завершено.")
     # --- Кінець оновлення розмірів ---
 
     # Зберігаємо оновлені дані в сесії
@@ -70,7 +73,9 @@ async def optimize_content(request: Request, db: AsyncSession = Depends(get_db))
     request.session["memory_size"] = memory_size
 
     # --- Запуск Алгоритму ---
-    optimized_results, error = solve_knapsack_problem(items_to_optimize, memory_size)
+    # Перебір - CPU-робота: виконується в потоці, щоб не блокувати цикл подій
+    async with admit("solve"):
+        optimized_results, error = await asyncio.to_thread(solve_knapsack_problem, items_to_optimize, memory_size)
 
     total_size = round(sum(item.get('size_mb', 0) for item in items_to_optimize), 2)
 
@@ -80,6 +85,7 @@ async def optimize_content(request: Request, db: AsyncSession = Depends(get_db))
         "memory_size": memory_size,
         "total_size": total_size,
         "user_email": request.session.get("user_email"),
+        "folders": await get_user_folders(db, user) if user else [],  # Для збереження набору в закладки
         "optimization_count": len(items_to_optimize)  # Кількість елементів, які ми оптимізували
     }
 
@@ -89,4 +95,45 @@ async def optimize_content(request: Request, db: AsyncSession = Depends(get_db))
 
     # Додаємо результати до контексту і повертаємо
     context["optimized_results"] = optimized_results
-    return templates.TemplateResponse("prepare.html", context)
\ No newline at end of file
+    return templates.TemplateResponse("prepare.html", context)
+
+
+@router.post("/api/optimize", response_model=OptimizeResponse)
+async def optimize_api(request: Request):
+    """
+    JSON API оптимізації для програмних клієнтів.
+    Приймає OptimizeRequest (елементи + ліміт), повертає обраний набір,
+    підсумки та статистику розв'язувача.
+    Тіло валідується напряму з байтів (model_validate_json), без проміжного dict.
+    """
+    try:
+        payload = OptimizeRequest.model_validate_json(await request.body())
+    except ValidationError as e:
+        return JSONResponse(status_code=422, content={"detail": e.errors(include_url=False)})
+
+    items = [item.model_dump() for item in payload.items]
+
+    sized_items = 0
+    if payload.fetch_missing_sizes:
+        sized_items = sum(1 for item in items if item['size_mb'] is None)
+        if sized_items:
+            async with admit("probe"):
+                items = await size_items(items)
+
+    solver_stats = {}
+    async with admit("solve"):
+        optimized_results, error = await asyncio.to_thread(
+            solve_knapsack_problem, items, str(payload.memory_size_mb), solver_stats
+        )
+    if error:
+        return JSONResponse(status_code=400, content={"detail": error})
+
+    response = OptimizeResponse(
+        selected=optimized_results,
+        total_size_mb=round(sum(item['size_mb'] or 0 for item in optimized_results), 2),
+        total_weight=sum(item['weight'] for item in optimized_results),
+        memory_size_mb=payload.memory_size_mb,
+        stats=OptimizerStats(sized_items=sized_items, **solver_stats),
+    )
+    # Модель вже провалідована - серіалізуємо напряму, без повторної перевірки FastAPI
+    return Response(content=response.model_dump_json(), media_type="application/json")
\ No newline at end of file
@@ -4,8 +4,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import templates
 from database import get_db
-from services.auth_service import get_user_by_email
+from models import User
+from services.auth_service import get_current_user
 from services.bookmark_service import get_user_folders
+from services.url_canonicalizer import cache_key_url
 
 router = APIRouter()
 
@@ -13,20 +15,18 @@ router = APIRouter()
 @router.get("/", response_class=HTMLResponse)
 async def read_root(
         request: Request,
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_db),
+        user: User | None = Depends(get_current_user)
 ):
     """
     Головна сторінка, яка відображає форму пошуку.
     """
     optimization_list = request.session.get("optimization_list", [])
     convert_error = request.session.pop("convert_error", None)
-    user_email = request.session.get("user_email")
 
     folders = []
-    if user_email:
-        user = await get_user_by_email(db, user_email)
-        if user:
-            folders = await get_user_folders(db, user)
+    if user:
+        folders = await get_user_folders(db, user)
 
     results = request.session.pop("search_results", None)
     query = request.session.pop("search_query", None)
@@ -36,7 +36,7 @@ async def read_root(
         "request": request,
         "optimization_count": len(optimization_list),
         "convert_error": convert_error,
-        "user_email": user_email,
+        "user_email": user.Email if user else None,
         "folders": folders,
         "results": results,
         "query": query,
@@ -52,12 +52,16 @@ async def add_to_list(request: Request):
     form_data = await request.form()
     selected_indices = form_data.getlist("selected_indices")
     optimization_list = request.session.get("optimization_list", [])
-    existing_links = {item['link'] for item in optimization_list}
+    # Порівнюємо канонічні URL (http/https - той самий ресурс), щоб не додавати його двічі
+    existing_links = {cache_key_url(item['link']) for item in optimization_list}
 
     if selected_indices:
         for index in selected_indices:
             link = form_data.get(f"link_{index}")
-            if link not in existing_links:
+            if not link:
+                continue
+            canonical_link = cache_key_url(link)
+            if canonical_link not in existing_links:
                 optimization_list.append({
                     "title": form_data.get(f"title_{index}"),
                     "link": link,
@@ -68,7 +72,7 @@ async def add_to_list(request: Request):
                     "is_estimated": False,
                     "cache_file": None
                 })
-                existing_links.add(link)
+                existing_links.add(canonical_link)
 
     request.session["optimization_list"] = optimization_list
     return RedirectResponse(url="/", status_code=303)
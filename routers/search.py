@@ -1,10 +1,10 @@
-import serpapi
 from fastapi import APIRouter, Request, Form, Depends
 from fastapi.responses import RedirectResponse  # <-- Змінено
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import SERPAPI_API_KEY
+from config import SERPAPI_API_KEY, SERPAPI_BASE_URL
 from database import get_db
+from services.url_classifier import classify_results
 
 router = APIRouter()
 
@@ -28,35 +28,15 @@ async def search_content(
         request.session["search_error"] = "Ключ Serp API не налаштовано..."
         return RedirectResponse(url="/", status_code=303)
 
+    import serpapi  # імпортується при першому пошуку, а не при старті
+
     client = serpapi.Client()
+    if SERPAPI_BASE_URL:
+        client.BASE_DOMAIN = SERPAPI_BASE_URL.rstrip("/")
 
     try:
         results = client.search({"q": query, "engine": "google", "api_key": SERPAPI_API_KEY})
-        processed_results = []
-        if 'organic_results' in results:
-            for result in results['organic_results']:
-                link = result.get('link', '')
-                title = result.get('title', '')
-                if not link or not title: continue
-
-                result_type = 'text'
-                if link.endswith('.pdf') or title.startswith('[PDF]'):
-                    result_type = 'pdf'
-                elif link.endswith('.doc') or link.endswith('.docx'):
-                    result_type = 'doc'
-                elif link.endswith('.ppt') or link.endswith('.pptx'):
-                    result_type = 'ppt'
-                elif 'youtube.com/watch' in link:
-                    result_type = 'video'
-                elif 'music.youtube.com' in link:
-                    result_type = 'audio_yt_music'
-                elif 'open.spotify.com' in link:
-                    result_type = 'audio_spotify'
-
-                processed_results.append({
-                    'title': title, 'link': link,
-                    'snippet': result.get('snippet', ''), 'type': result_type
-                })
+        processed_results = await classify_results(results.get('organic_results', []))
 
         # Зберігаємо результати в сесію
         request.session["search_results"] = processed_results
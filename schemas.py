@@ -1,4 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
+
+from config import OPTIMIZE_MAX_ITEMS, DOWNLOAD_PLAN_MAX_BUDGET_MB
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -6,4 +8,45 @@ class UserCreate(BaseModel):
 
 class UserLogin(BaseModel):
     email: EmailStr
-    password: str
\ No newline at end of file
+    password: str
+
+
+class OptimizeItem(BaseModel):
+    title: str | None = Field("", max_length=1000)
+    link: str = Field(max_length=2048)
+    snippet: str | None = Field("", max_length=2000)
+    type: str = Field("text", max_length=50)
+    weight: int = Field(5, ge=0, le=1000)
+    size_mb: float | None = Field(None, ge=0, le=1e9)  # None - розмір невідомий (буде визначено)
+    is_estimated: bool = False
+    size_method: str | None = None  # Як отримано розмір: head, range, stream, yt-dlp, estimate...
+    cache_file: str | None = None
+
+class OptimizeRequest(BaseModel):
+    items: list[OptimizeItem] = Field(max_length=OPTIMIZE_MAX_ITEMS)
+    memory_size_mb: float = Field(gt=0)
+    fetch_missing_sizes: bool = True
+
+class DownloadPlanRequest(BaseModel):
+    # Кандидати та ліміт, для яких сторінка показала оптимальний набір
+    items: list[OptimizeItem] = Field(min_length=1, max_length=OPTIMIZE_MAX_ITEMS)
+    memory_size_mb: float = Field(gt=0, le=DOWNLOAD_PLAN_MAX_BUDGET_MB)
+
+class OptimizerStats(BaseModel):
+    candidates: int
+    free_items: int
+    nodes_visited: int
+    duration_ms: float
+    exhaustive: bool = True  # False - перебір зупинено бюджетом, набір може бути не оптимальним
+    sized_items: int
+
+class OptimizeResponse(BaseModel):
+    selected: list[OptimizeItem]
+    total_size_mb: float
+    total_weight: int
+    memory_size_mb: float
+    stats: OptimizerStats
+
+
+class RenderRequest(BaseModel):
+    url: str
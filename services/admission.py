@@ -0,0 +1,130 @@
+import math
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, status
+
+from config import (
+    ADMISSION_RENDER_CONCURRENCY, ADMISSION_RENDER_MAX_QUEUE,
+    ADMISSION_PROBE_CONCURRENCY, ADMISSION_PROBE_MAX_QUEUE,
+    ADMISSION_SOLVE_CONCURRENCY, ADMISSION_SOLVE_MAX_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT_SECONDS, ADMISSION_RETRY_AFTER_SECONDS
+)
+from services.metrics import ADMISSION_REJECTED
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionPool:
+    """
+    Пул допуску: не більше concurrency запитів виконуються одночасно,
+    ще max_queue чекають у черзі (не довше queue_timeout).
+    Коли черга заповнена або очікування вичерпано - 503 з Retry-After,
+    щоб прийняті запити виконувались з передбачуваною затримкою.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    def retry_after(self) -> int:
+        """Оцінка, через скільки звільниться місце: черга * середній час / паралельність."""
+        if not self.completed:
+            return ADMISSION_RETRY_AFTER_SECONDS
+        avg_run = self.total_run_seconds / self.completed
+        return max(math.ceil(avg_run * (self.waiting + 1) / self.concurrency), 1)
+
+    def _reject(self, reason: str) -> HTTPException:
+        ADMISSION_REJECTED.labels(self.name, reason).inc()
+        logger.warning(
+            "Пул %s перевантажений (%s): виконується %d, у черзі %d.",
+            self.name, reason, self.active, self.waiting
+        )
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перевантажений, спробуйте пізніше.",
+            headers={"Retry-After": str(self.retry_after())}
+        )
+
+    @asynccontextmanager
+    async def admit(self):
+        submitted_at = time.monotonic()
+        if not self._slots.locked():
+            # Вільне місце: acquire завершується одразу, без перемикання задач
+            await self._slots.acquire()
+        elif self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise self._reject("queue_full")
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise self._reject("timeout") from None
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+            self.completed += 1
+            self.total_wait_seconds += started_at - submitted_at
+            self.total_run_seconds += time.monotonic() - started_at
+
+    def stats(self) -> dict:
+        completed = self.completed
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(self.total_wait_seconds / completed * 1000, 1) if completed else 0.0,
+            "avg_run_ms": round(self.total_run_seconds / completed * 1000, 1) if completed else 0.0,
+        }
+
+
+# --- Пули ---
+# render - Playwright (/convert), probe - HEAD/Range/yt-dlp (/fetch-sizes), solve - алгоритм рюкзака
+POOLS = {
+    "render": AdmissionPool("render", ADMISSION_RENDER_CONCURRENCY, ADMISSION_RENDER_MAX_QUEUE,
+                            ADMISSION_QUEUE_TIMEOUT_SECONDS),
+    "probe": AdmissionPool("probe", ADMISSION_PROBE_CONCURRENCY, ADMISSION_PROBE_MAX_QUEUE,
+                           ADMISSION_QUEUE_TIMEOUT_SECONDS),
+    "solve": AdmissionPool("solve", ADMISSION_SOLVE_CONCURRENCY, ADMISSION_SOLVE_MAX_QUEUE,
+                           ADMISSION_QUEUE_TIMEOUT_SECONDS),
+}
+
+
+def admit(pool_name: str):
+    """
+    Місце в пулі на час блоку: `async with admit("render"): ...`.
+    Використовується явно всередині обробника навколо саме тієї роботи, яку обмежує пул
+    (а не як залежність FastAPI, момент виходу з якої залежить від версії FastAPI),
+    тож віддача відповіді клієнту та інші етапи запиту місця не займають.
+    """
+    return POOLS[pool_name].admit()
+
+
+def get_admission_stats() -> dict:
+    """Стан пулів допуску (глибина черг)."""
+    return {name: pool.stats() for name, pool in POOLS.items()}
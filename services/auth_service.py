@@ -1,14 +1,44 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import Request, Depends, HTTPException, status
 from fastapi.responses import RedirectResponse
 from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from config import (
+    USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_SIZE, PASSWORD_BCRYPT_ROUNDS,
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE, PASSWORD_HASH_RETRY_AFTER_SECONDS
+)
 from models import User
 from schemas import UserCreate
 from database import get_db
+from services.metrics import count_cache
 
-# Налаштовуємо bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Налаштовуємо bcrypt. min/max_rounds = default_rounds, щоб хеші з іншою
+# "вартістю" позначались як застарілі і перехешовувались при вході.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__max_rounds=PASSWORD_BCRYPT_ROUNDS,
+)
+
+# --- Пул потоків для bcrypt ---
+# bcrypt займає 100-300 мс CPU, тому виконується поза циклом подій
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_stats = {
+    "pending": 0,  # в черзі + виконуються
+    "completed": 0,
+    "rejected": 0,
+    "total_wait_seconds": 0.0,
+    "total_run_seconds": 0.0,
+}
+
+# --- Кеш користувачів (в пам'яті процесу) ---
+# UserID -> (момент закінчення дії запису, Email)
+_user_cache: dict[int, tuple[float, str]] = {}
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Перевіряє, чи збігається пароль з хешем."""
@@ -18,6 +48,73 @@ def get_password_hash(password: str) -> str:
     """Створює хеш пароля."""
     return pwd_context.hash(password)
 
+
+def _timed_call(func, *args):
+    """Виконується в потоці пулу: повертає результат та момент початку роботи."""
+    started_at = time.monotonic()
+    return func(*args), started_at
+
+
+async def _run_hashing(func, *args):
+    """
+    Виконує функцію bcrypt у пулі потоків з контролем допуску:
+    якщо черга заповнена, одразу відповідаємо 503 замість того,
+    щоб накопичувати запити.
+    """
+    if _hash_stats["pending"] >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        _hash_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перевантажений, спробуйте пізніше.",
+            headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER_SECONDS)}
+        )
+
+    _hash_stats["pending"] += 1
+    submitted_at = time.monotonic()
+    try:
+        loop = asyncio.get_running_loop()
+        result, started_at = await loop.run_in_executor(_hash_executor, _timed_call, func, *args)
+    finally:
+        _hash_stats["pending"] -= 1
+
+    _hash_stats["completed"] += 1
+    _hash_stats["total_wait_seconds"] += started_at - submitted_at
+    _hash_stats["total_run_seconds"] += time.monotonic() - started_at
+    return result
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Перевіряє пароль у пулі потоків.
+    Повертає (чи збігається, новий хеш) - новий хеш не None, якщо
+    збережений хеш створено з іншими параметрами і його варто оновити.
+    """
+    return await _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Створює хеш пароля у пулі потоків."""
+    return await _run_hashing(pwd_context.hash, password)
+
+
+def get_password_hasher_stats() -> dict:
+    """Метрики черги хешування паролів."""
+    completed = _hash_stats["completed"]
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_queue": PASSWORD_HASH_MAX_QUEUE,
+        "pending": _hash_stats["pending"],
+        "completed": completed,
+        "rejected": _hash_stats["rejected"],
+        "avg_wait_ms": round(_hash_stats["total_wait_seconds"] / completed * 1000, 1) if completed else 0.0,
+        "avg_run_ms": round(_hash_stats["total_run_seconds"] / completed * 1000, 1) if completed else 0.0,
+    }
+
+
+def shutdown_password_hasher():
+    """Зупиняє пул потоків. Викликається при зупинці FastAPI."""
+    _hash_executor.shutdown(wait=False, cancel_futures=True)
+
 async def get_user_by_email(db: AsyncSession, email: str) -> User | None:
     """Знаходить користувача за email."""
     result = await db.execute(select(User).where(User.Email == email))
@@ -25,28 +122,87 @@ async def get_user_by_email(db: AsyncSession, email: str) -> User | None:
 
 async def create_user(db: AsyncSession, user: UserCreate) -> User:
     """Створює нового користувача в БД."""
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(Email=user.email, PasswordHash=hashed_password)
     db.add(db_user)
     await db.commit()
     await db.refresh(db_user)
     return db_user
 
+def _cache_user(user: User):
+    """Запам'ятовує легкий запис користувача (ID та email) на USER_CACHE_TTL_SECONDS."""
+    now = time.monotonic()
+    if len(_user_cache) >= USER_CACHE_MAX_SIZE:
+        for user_id in [uid for uid, (expires, _) in _user_cache.items() if expires <= now]:
+            del _user_cache[user_id]
+        if len(_user_cache) >= USER_CACHE_MAX_SIZE:
+            _user_cache.clear()
+    _user_cache[user.UserID] = (now + USER_CACHE_TTL_SECONDS, user.Email)
+
+
+def invalidate_cached_user(user_id: int):
+    """
+    Видаляє користувача з кешу.
+    Викликати при виході та будь-якій зміні облікового запису.
+    """
+    _user_cache.pop(user_id, None)
+
+
+def login_user(request: Request, user: User):
+    """
+    Зберігає користувача в сесії. Cookie сесії підписується SessionMiddleware,
+    тому UserID з сесії можна використовувати без звернення до БД.
+    """
+    request.session["user_id"] = user.UserID
+    request.session["user_email"] = user.Email
+    _cache_user(user)
+
+
+def logout_user(request: Request):
+    """Видаляє користувача з сесії та з кешу."""
+    user_id = request.session.pop("user_id", None)
+    request.session.pop("user_email", None)
+    if user_id is not None:
+        invalidate_cached_user(user_id)
+
+
 async def get_current_user(
         request: Request,
         db: AsyncSession = Depends(get_db)
 ) -> User | None:
     """
-    Залежність: Отримує email з сесії та повертає об'єкт User з БД.
+    Залежність: Отримує UserID з сесії та повертає об'єкт User.
+    Поки запис є в кеші, повертається легкий (не прив'язаний до сесії БД) User
+    лише з UserID та Email - без запиту до БД.
     Якщо користувача немає, повертає None.
     """
-    email = request.session.get("user_email")
-    if not email:
+    user_id = request.session.get("user_id")
+
+    if user_id is None:
+        # Сесії, створені до появи user_id, містять лише email
+        email = request.session.get("user_email")
+        if not email:
+            return None
+        user = await get_user_by_email(db, email)
+        if user:
+            login_user(request, user)
+        return user
+
+    cached = _user_cache.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        count_cache("user", hit=True)
+        return User(UserID=user_id, Email=cached[1])
+    count_cache("user", hit=False)
+
+    user = await db.get(User, user_id)
+    if not user:
+        logout_user(request)
         return None
 
-    user = await get_user_by_email(db, email)
+    _cache_user(user)
     return user
 
+
 async def get_required_user(user: User | None = Depends(get_current_user)) -> User:
     """
     Залежність: Вимагає, щоб користувач був залогінений.
@@ -0,0 +1,244 @@
+import logging
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+from pathlib import Path
+
+from sqlalchemy import update, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config import BLOB_STORE_DIR, BLOB_GC_GRACE_SECONDS, STREAM_CHUNK_SIZE
+from models import Blob, MaterialBlob, Material
+from services.bookmark_service import get_or_create_material_id
+from services.metrics import count_cache
+from services.size_estimator import record_size_sample
+from services.url_canonicalizer import url_variants
+
+logger = logging.getLogger(__name__)
+
+
+def blob_path(digest: str) -> Path:
+    """Шлях до файлу за його SHA-256 (два рівні, щоб не тримати все в одній папці)."""
+    return BLOB_STORE_DIR / digest[:2] / digest
+
+
+def _incoming_dir() -> Path:
+    return BLOB_STORE_DIR / ".incoming"
+
+
+def new_incoming_path(suffix: str = "") -> Path:
+    """
+    Тимчасовий файл у сховищі для запису нового вмісту.
+    Лежить на тому ж диску, тому переноситься в сховище без копіювання.
+    """
+    incoming = _incoming_dir()
+    incoming.mkdir(parents=True, exist_ok=True)
+    return incoming / f"{uuid.uuid4().hex}{suffix}"
+
+
+def hash_file(path: Path) -> tuple[str, int]:
+    """SHA-256 та розмір файлу, читаючи його шматками."""
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as file:
+        while chunk := file.read(STREAM_CHUNK_SIZE):
+            sha256.update(chunk)
+            size += len(chunk)
+    return sha256.hexdigest(), size
+
+
+def _place_blob(tmp_path: Path, digest: str) -> Path:
+    """
+    Переносить тимчасовий файл у сховище.
+    Якщо такий вміст уже є - тимчасовий файл видаляється (дедуплікація).
+    """
+    target = blob_path(digest)
+    if target.exists():
+        tmp_path.unlink(missing_ok=True)
+        return target
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp_path, target)
+    return target
+
+
+async def _get_or_create_blob_id(db: AsyncSession, digest: str, size: int, content_type: str | None) -> int:
+    """BlobID за хешем; при паралельній вставці того самого вмісту повторює SELECT."""
+    async def select_id() -> int | None:
+        result = await db.execute(select(Blob.BlobID).where(Blob.Hash == digest))
+        return result.scalar_one_or_none()
+
+    blob_id = await select_id()
+    if blob_id is not None:
+        return blob_id
+
+    blob = Blob(Hash=digest, Size=size, ContentType=content_type, RefCount=0)
+    try:
+        async with db.begin_nested():
+            db.add(blob)
+        return blob.BlobID
+    except IntegrityError:
+        return await select_id()
+
+
+async def _link_material(db: AsyncSession, material_id: int, blob_id: int):
+    """Прив'язує матеріал до файлу та оновлює лічильники посилань."""
+    link = await db.get(MaterialBlob, material_id)
+    if link is not None and link.BlobID == blob_id:
+        return
+
+    if link is None:
+        db.add(MaterialBlob(MaterialID=material_id, BlobID=blob_id))
+    else:
+        await db.execute(
+            update(Blob).where(Blob.BlobID == link.BlobID).values(RefCount=Blob.RefCount - 1)
+        )
+        link.BlobID = blob_id
+
+    await db.execute(
+        update(Blob).where(Blob.BlobID == blob_id).values(RefCount=Blob.RefCount + 1)
+    )
+
+
+async def find_material_blob(db: AsyncSession, url: str) -> Path | None:
+    """
+    Шлях до вже збереженого файлу матеріалу (пошук за вказівником, без рендерингу
+    чи завантаження). None - якщо файлу немає.
+    """
+    result = await db.execute(
+        select(Blob.Hash)
+        .join(MaterialBlob, MaterialBlob.BlobID == Blob.BlobID)
+        .join(Material, Material.MaterialID == MaterialBlob.MaterialID)
+        .where(Material.URL.in_(url_variants(url)))
+    )
+    digest = result.scalars().first()
+    path = blob_path(digest) if digest is not None else None
+    if path is None or not path.exists():
+        count_cache("blob", hit=False)
+        return None
+
+    count_cache("blob", hit=True)
+    return path
+
+
+async def store_material_file(
+        db: AsyncSession,
+        url: str,
+        material_type: str,
+        tmp_path: Path,
+        digest: str | None = None,
+        content_type: str | None = None
+) -> Path:
+    """
+    Зберігає файл матеріалу у сховищі за вмістом та повертає його шлях.
+    tmp_path - файл, створений через new_incoming_path(); якщо хеш уже пораховано
+    під час запису (digest), файл повторно не читається.
+    Однаковий вміст з різних URL займає місце на диску лише один раз.
+    """
+    if digest is None:
+        digest, size = await asyncio.to_thread(hash_file, tmp_path)
+    else:
+        size = tmp_path.stat().st_size
+    path = await asyncio.to_thread(_place_blob, tmp_path, digest)
+
+    try:
+        blob_id = await _get_or_create_blob_id(db, digest, size, content_type)
+        material_id = await get_or_create_material_id(db, url, material_type, commit=False)
+        await _link_material(db, material_id, blob_id)
+        # Розмір файлу - точний розмір матеріалу
+        sized = await db.execute(
+            update(Material)
+            .where(Material.MaterialID == material_id, Material.Size.is_(None))
+            .values(Size=size)
+        )
+        if sized.rowcount:
+            await record_size_sample(db, material_type, url, size)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return path
+
+
+async def merge_material_blobs(db: AsyncSession, keeper_id: int, duplicate_ids: list[int]):
+    """
+    Переносить файли дублікатів матеріалу на основний запис (без commit).
+    Якщо в основного вже є файл, посилання дублікатів просто видаляються.
+    """
+    result = await db.execute(select(MaterialBlob).where(MaterialBlob.MaterialID.in_(duplicate_ids)))
+    links = result.scalars().all()
+    if not links:
+        return
+
+    keeper_link = await db.get(MaterialBlob, keeper_id)
+    for link in links:
+        if keeper_link is None:
+            # Первинний ключ змінити не можна - створюємо новий запис для основного
+            keeper_link = MaterialBlob(MaterialID=keeper_id, BlobID=link.BlobID)
+            db.add(keeper_link)
+        else:
+            await db.execute(
+                update(Blob).where(Blob.BlobID == link.BlobID).values(RefCount=Blob.RefCount - 1)
+            )
+        await db.delete(link)
+    await db.flush()
+
+
+async def collect_garbage(db: AsyncSession, apply: bool = False) -> dict:
+    """
+    Збирач сміття сховища:
+      1. Перераховує RefCount за таблицею MaterialBlobs (виправляє розбіжності).
+      2. Видаляє записи та файли Blob без посилань.
+      3. Видаляє файли без запису в БД та незавершені тимчасові файли,
+         старші за BLOB_GC_GRACE_SECONDS.
+    Повертає статистику; при apply=False нічого не змінює.
+    """
+    stats = {"recounted": 0, "blobs_deleted": 0, "files_deleted": 0, "bytes_freed": 0}
+
+    link_counts = (
+        select(func.count())
+        .where(MaterialBlob.BlobID == Blob.BlobID)
+        .correlate(Blob)
+        .scalar_subquery()
+    )
+    result = await db.execute(select(Blob.BlobID).where(Blob.RefCount != link_counts))
+    stats["recounted"] = len(result.all())
+    if apply and stats["recounted"]:
+        await db.execute(update(Blob).values(RefCount=link_counts))
+        await db.commit()
+
+    condition = Blob.RefCount == 0 if apply else link_counts == 0
+    result = await db.execute(select(Blob.BlobID, Blob.Hash, Blob.Size).where(condition))
+    unreferenced = result.all()
+    known_hashes = set((await db.execute(select(Blob.Hash))).scalars().all())
+
+    for blob_id, digest, size in unreferenced:
+        logger.info("Blob %s: немає посилань (%s байт)", digest, size)
+        stats["blobs_deleted"] += 1
+        stats["bytes_freed"] += size
+        if apply:
+            # RefCount == 0 ще раз: за цей час матеріал міг отримати посилання на файл
+            deleted = await db.execute(delete(Blob).where(Blob.BlobID == blob_id, Blob.RefCount == 0))
+            await db.commit()
+            if deleted.rowcount:
+                blob_path(digest).unlink(missing_ok=True)
+
+    if BLOB_STORE_DIR.exists():
+        cutoff = time.time() - BLOB_GC_GRACE_SECONDS
+        for path in BLOB_STORE_DIR.glob("*/*"):
+            if not path.is_file() or path.name in known_hashes:
+                continue
+            stat = path.stat()
+            if stat.st_mtime > cutoff:
+                continue
+            logger.info("Файл без запису в БД: %s", path)
+            stats["files_deleted"] += 1
+            stats["bytes_freed"] += stat.st_size
+            if apply:
+                path.unlink(missing_ok=True)
+
+    return stats
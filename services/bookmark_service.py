@@ -1,12 +1,31 @@
+from typing import AsyncIterator
+
+from sqlalchemy import text, func, insert, update, delete, exists
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 
+from config import BOOKMARKS_PAGE_SIZE
 from models import User, Material, BookmarkFolder, Bookmark
+from services.url_canonicalizer import canonicalize_url, cache_key_url, url_variants
 
 # Назва стандартної папки
 DEFAULT_FOLDER_NAME = "Мої закладки"
 
+# Скільки URL обробляти одним upsert-запитом
+# (SQL Server обмежує запит 2100 параметрами)
+_UPSERT_CHUNK_SIZE = 500
+
+# Максимум ID в одному "IN (...)" (SQL Server обмежує запит 2100 параметрами)
+_BULK_CHUNK_SIZE = 1000
+
+# Діалекти з підтримкою INSERT ... ON CONFLICT ... RETURNING
+_ON_CONFLICT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
 
 async def create_default_folder(db: AsyncSession, user: User):
     """
@@ -29,41 +48,246 @@ async def get_user_folders(db: AsyncSession, user: User) -> list[BookmarkFolder]
     return result.scalars().all()
 
 
-async def get_user_folders_with_bookmarks(db: AsyncSession, user: User) -> list[BookmarkFolder]:
+async def get_user_folders_summary(db: AsyncSession, user: User) -> list:
     """
-    Отримує список папок, одразу підвантажуючи пов'язані з ними
-    закладки та матеріали.
+    Отримує папки користувача з агрегатами одним запитом:
+    кількість закладок (BookmarkCount) та сумарний відомий розмір у байтах (TotalSize).
+    Самі закладки підвантажуються окремо (get_folder_bookmarks_page).
     """
     result = await db.execute(
-        select(BookmarkFolder)
-        .where(BookmarkFolder.UserID == user.UserID)
-        .options(
-            selectinload(BookmarkFolder.bookmarks)
-            .selectinload(Bookmark.material)
+        select(
+            BookmarkFolder.FolderID,
+            BookmarkFolder.Name,
+            func.count(Bookmark.BookmarkID).label("BookmarkCount"),
+            func.coalesce(func.sum(Material.Size), 0).label("TotalSize"),
         )
+        .outerjoin(Bookmark, Bookmark.FolderID == BookmarkFolder.FolderID)
+        .outerjoin(Material, Material.MaterialID == Bookmark.MaterialID)
+        .where(BookmarkFolder.UserID == user.UserID)
+        .group_by(BookmarkFolder.FolderID, BookmarkFolder.Name)
         .order_by(BookmarkFolder.Name)
     )
-    # unique() потрібен, щоб уникнути дублікатів папок через JOIN
-    return result.scalars().unique().all()
+    return result.all()
+
+
+async def get_folder_bookmarks_page(
+        db: AsyncSession,
+        user: User,
+        folder_id: int,
+        after_id: int | None = None,
+        limit: int = BOOKMARKS_PAGE_SIZE
+) -> tuple[list, int | None]:
+    """
+    Отримує одну сторінку закладок папки (keyset за BookmarkID).
+    Власник папки перевіряється в тому ж запиті.
+    Повертає (рядки, after_id для наступної сторінки або None).
+    """
+    query = (
+        select(
+            Bookmark.BookmarkID,
+            Bookmark.Name,
+            Material.URL,
+            Material.Type,
+            Material.Size,
+        )
+        .join(BookmarkFolder, BookmarkFolder.FolderID == Bookmark.FolderID)
+        .join(Material, Material.MaterialID == Bookmark.MaterialID)
+        .where(
+            Bookmark.FolderID == folder_id,
+            BookmarkFolder.UserID == user.UserID
+        )
+    )
+    if after_id is not None:
+        query = query.where(Bookmark.BookmarkID > after_id)
+
+    result = await db.execute(query.order_by(Bookmark.BookmarkID).limit(limit + 1))
+    rows = result.all()
+
+    next_after_id = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after_id = rows[-1].BookmarkID
+    return rows, next_after_id
+
+
+async def stream_folder_items(db: AsyncSession, user: User, folder_id: int) -> AsyncIterator[dict]:
+    """
+    Потоково (серверним курсором) віддає закладки папки у форматі
+    елементів списку оптимізації, разом з відомими Material.Size та Material.Type.
+    Власник папки перевіряється в тому ж запиті.
+    """
+    result = await db.stream(
+        select(Bookmark.Name, Material.URL, Material.Type, Material.Size)
+        .join(BookmarkFolder, BookmarkFolder.FolderID == Bookmark.FolderID)
+        .join(Material, Material.MaterialID == Bookmark.MaterialID)
+        .where(
+            Bookmark.FolderID == folder_id,
+            BookmarkFolder.UserID == user.UserID
+        )
+        .order_by(Bookmark.BookmarkID)
+    )
+    async for row in result:
+        yield {
+            "title": row.Name,
+            "link": row.URL,
+            "snippet": "",
+            "type": row.Type,
+            "weight": 5,
+            "size_mb": round(row.Size / (1024 * 1024), 2) if row.Size is not None else None,
+            "is_estimated": False,
+            "cache_file": None
+        }
+
+
+async def get_or_create_material_ids(
+        db: AsyncSession, items: list[tuple[str, str]], commit: bool = True
+) -> dict[str, int]:
+    """
+    Знаходить або створює матеріали для списку пар (url, тип) одним
+    атомарним запитом на кожні _UPSERT_CHUNK_SIZE URL.
+    Повертає словник {канонічний URL: MaterialID}.
+
+    SQL Server: MERGE ... WITH (HOLDLOCK) ... OUTPUT
+    SQLite/PostgreSQL: INSERT ... ON CONFLICT (URL) DO UPDATE ... RETURNING
+    Тип існуючого матеріалу не змінюється.
+    Матеріал, збережений з іншою схемою (http/https), використовується замість нового.
+    commit=False дозволяє виконати upsert в одній транзакції з подальшими змінами.
+    """
+    rows: dict[str, str] = {}
+    # Канонічний URL -> URL, під яким ресурс іде в upsert (http- та https-варіанти - один рядок)
+    aliases: dict[str, str] = {}
+    primary_by_key: dict[str, str] = {}
+    for url, type_str in items:
+        canonical = canonicalize_url(url)
+        primary = primary_by_key.setdefault(cache_key_url(canonical), canonical)
+        aliases[canonical] = primary
+        rows.setdefault(primary, type_str)
+    if not rows:
+        return {}
+
+    dialect = db.bind.dialect.name
+    material_ids: dict[str, int] = {}
+
+    try:
+        material_ids.update(await _find_other_scheme_ids(db, list(rows)))
+        values = [(url, type_str) for url, type_str in rows.items() if url not in material_ids]
+        for start in range(0, len(values), _UPSERT_CHUNK_SIZE):
+            chunk = values[start:start + _UPSERT_CHUNK_SIZE]
+            if dialect == "mssql":
+                result = await db.execute(*_mssql_merge_statement(chunk))
+            elif dialect in _ON_CONFLICT_INSERTS:
+                result = await db.execute(_on_conflict_statement(dialect, chunk))
+            else:
+                material_ids.update(await _select_then_insert(db, chunk))
+                continue
+            material_ids.update({url: material_id for url, material_id in result.all()})
+        if commit:
+            await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    return {canonical: material_ids[primary] for canonical, primary in aliases.items()}
+
+
+async def get_or_create_material_id(db: AsyncSession, url: str, type: str, commit: bool = True) -> int:
+    """
+    Повертає MaterialID для URL, створюючи матеріал за потреби (один запит).
+    """
+    material_ids = await get_or_create_material_ids(db, [(url, type)], commit=commit)
+    return material_ids[canonicalize_url(url)]
 
 
 async def get_or_create_material(db: AsyncSession, url: str, type: str) -> Material:
     """
     Знаходить матеріал за URL. Якщо його немає в БД, створює новий.
+    URL зберігається в канонічній формі (див. url_canonicalizer).
+    Якщо потрібен лише ID - використовуйте get_or_create_material_id.
     """
-    result = await db.execute(
-        select(Material).where(Material.URL == url)
+    material_id = await get_or_create_material_id(db, url, type)
+    return await db.get(Material, material_id)
+
+
+async def _find_other_scheme_ids(db: AsyncSession, urls: list[str]) -> dict[str, int]:
+    """
+    {канонічний URL: MaterialID} для URL, чий матеріал збережено лише з іншою схемою (http/https).
+    Якщо є і матеріал з точним URL (дублікат до об'єднання) - його знайде upsert.
+    """
+    found: dict[str, int] = {}
+    for start in range(0, len(urls), _BULK_CHUNK_SIZE // 2):
+        # Форма URL -> канонічний URL, за яким її шукали
+        variants = {}
+        for url in urls[start:start + _BULK_CHUNK_SIZE // 2]:
+            variants.update({variant: url for variant in url_variants(url)})
+        result = await db.execute(
+            select(Material.URL, Material.MaterialID).where(Material.URL.in_(list(variants)))
+        )
+        stored = dict(result.all())
+        for url in set(variants.values()):
+            if url not in stored:
+                twin_id = next((stored[v] for v in url_variants(url)[1:] if v in stored), None)
+                if twin_id is not None:
+                    found[url] = twin_id
+    return found
+
+
+def _on_conflict_statement(dialect: str, chunk: list[tuple[str, str]]):
+    """INSERT ... ON CONFLICT (URL) DO UPDATE ... RETURNING для SQLite/PostgreSQL."""
+    stmt = _ON_CONFLICT_INSERTS[dialect](Material).values(
+        [{"URL": url, "Type": type_str} for url, type_str in chunk]
+    )
+    # "Порожнє" оновлення потрібне, щоб RETURNING повернув і вже існуючі рядки
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Material.URL],
+        set_={"URL": stmt.excluded.URL}
+    )
+    return stmt.returning(Material.URL, Material.MaterialID)
+
+
+def _mssql_merge_statement(chunk: list[tuple[str, str]]):
+    """MERGE ... OUTPUT для SQL Server. HOLDLOCK усуває гонку між паралельними запитами."""
+    placeholders = ", ".join(f"(:url_{i}, :type_{i})" for i in range(len(chunk)))
+    params = {}
+    for i, (url, type_str) in enumerate(chunk):
+        params[f"url_{i}"] = url
+        params[f"type_{i}"] = type_str
+
+    stmt = text(
+        "MERGE INTO Materials WITH (HOLDLOCK) AS target "
+        f"USING (VALUES {placeholders}) AS source (URL, Type) "
+        "ON target.URL = source.URL "
+        "WHEN MATCHED THEN UPDATE SET target.URL = source.URL "
+        "WHEN NOT MATCHED THEN INSERT (URL, Type) VALUES (source.URL, source.Type) "
+        "OUTPUT inserted.URL, inserted.MaterialID;"
     )
-    material = result.scalars().first()
+    return stmt, params
+
+
+async def _select_then_insert(db: AsyncSession, chunk: list[tuple[str, str]]) -> dict[str, int]:
+    """
+    Запасний шлях для інших СУБД: SELECT існуючих + INSERT відсутніх.
+    При конфлікті унікальності (паралельна вставка) повторює SELECT.
+    """
+    urls = [url for url, _ in chunk]
 
-    if not material:
-        print(f"Створення нового матеріалу: {url}")
-        material = Material(URL=url, Type=type, Size=None)  # Розмір буде отримано пізніше
-        db.add(material)
-        await db.commit()
-        await db.refresh(material)
+    async def select_ids() -> dict[str, int]:
+        result = await db.execute(
+            select(Material.URL, Material.MaterialID).where(Material.URL.in_(urls))
+        )
+        return {url: material_id for url, material_id in result.all()}
+
+    material_ids = await select_ids()
+    missing = [Material(URL=url, Type=type_str) for url, type_str in chunk if url not in material_ids]
+    if not missing:
+        return material_ids
 
-    return material
+    try:
+        async with db.begin_nested():
+            db.add_all(missing)
+        material_ids.update({m.URL: m.MaterialID for m in missing})
+    except IntegrityError:
+        material_ids = await select_ids()
+    return material_ids
 
 
 async def create_bookmark(db: AsyncSession, folder_id: int, material_id: int, name: str):
@@ -79,6 +303,80 @@ async def create_bookmark(db: AsyncSession, folder_id: int, material_id: int, na
     await db.commit()
 
 
+async def create_bookmarks(db: AsyncSession, folder_id: int, items: list[tuple[str, str, str]]) -> int:
+    """
+    Масово створює закладки в папці з елементів (url, тип, назва):
+    один upsert матеріалів та багаторядковий INSERT, одна транзакція.
+    Власника папки має перевірити код, що викликає.
+    """
+    if not items:
+        return 0
+
+    material_ids = await get_or_create_material_ids(
+        db, [(url, type_str) for url, type_str, _ in items], commit=False
+    )
+    rows = [
+        {"FolderID": folder_id, "MaterialID": material_ids[canonicalize_url(url)], "Name": name}
+        for url, _, name in items
+    ]
+    for start in range(0, len(rows), _UPSERT_CHUNK_SIZE):
+        await db.execute(insert(Bookmark).values(rows[start:start + _UPSERT_CHUNK_SIZE]))
+    await db.commit()
+    return len(rows)
+
+
+def _user_folder_ids(user: User):
+    """Підзапит: ID усіх папок користувача (для фільтра власника)."""
+    return select(BookmarkFolder.FolderID).where(BookmarkFolder.UserID == user.UserID)
+
+
+async def delete_bookmarks(db: AsyncSession, user: User, bookmark_ids: list[int]) -> int:
+    """
+    Видаляє закладки користувача одним DELETE ... WHERE BookmarkID IN (...) AND <власник>.
+    Чужі ID просто ігноруються. Повертає кількість видалених.
+    """
+    deleted = 0
+    for start in range(0, len(bookmark_ids), _BULK_CHUNK_SIZE):
+        result = await db.execute(
+            delete(Bookmark)
+            .where(
+                Bookmark.BookmarkID.in_(bookmark_ids[start:start + _BULK_CHUNK_SIZE]),
+                Bookmark.FolderID.in_(_user_folder_ids(user))
+            )
+            .execution_options(synchronize_session=False)
+        )
+        deleted += result.rowcount
+    await db.commit()
+    return deleted
+
+
+async def move_bookmarks(db: AsyncSession, user: User, bookmark_ids: list[int], new_folder_id: int) -> int:
+    """
+    Переміщує закладки користувача в іншу його папку одним UPDATE.
+    Якщо цільова папка не належить користувачу, нічого не змінюється.
+    Повертає кількість переміщених.
+    """
+    target_owned = exists().where(
+        BookmarkFolder.FolderID == new_folder_id,
+        BookmarkFolder.UserID == user.UserID
+    )
+    moved = 0
+    for start in range(0, len(bookmark_ids), _BULK_CHUNK_SIZE):
+        result = await db.execute(
+            update(Bookmark)
+            .where(
+                Bookmark.BookmarkID.in_(bookmark_ids[start:start + _BULK_CHUNK_SIZE]),
+                Bookmark.FolderID.in_(_user_folder_ids(user)),
+                target_owned
+            )
+            .values(FolderID=new_folder_id)
+            .execution_options(synchronize_session=False)
+        )
+        moved += result.rowcount
+    await db.commit()
+    return moved
+
+
 async def check_bookmark_owner(db: AsyncSession, user: User, bookmark_id: int) -> Bookmark | None:
     """
     Перевіряє, чи належить закладка користувачу, і повертає її.
@@ -1,47 +1,151 @@
-from playwright.async_api import async_playwright, Browser, Playwright
+import logging
+import asyncio
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from config import BROWSER_LAUNCH_MODE, RENDER_SERVICE_URL
+from services.metrics import stage_timer, OPEN_PAGES
+
+# Playwright імпортується лише під час запуску браузера (див. _launch)
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, Playwright
+
+logger = logging.getLogger(__name__)
+
+# Стан браузера (для /api/ready)
+NOT_STARTED = "not_started"
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+REMOTE = "remote"  # рендерить спільний сервіс (RENDER_SERVICE_URL), свого браузера немає
 
 # --- Глобальні змінні Playwright ---
-_playwright_context: Playwright | None = None
-_browser_instance: Browser | None = None
+_playwright_context: "Playwright | None" = None
+_browser_instance: "Browser | None" = None
+_launch_task: asyncio.Task | None = None
 
 
-async def start_browser():
+class RenderError(Exception):
+    """Сторінку не вдалося відрендерити у спільному сервісі (message - як у помилок Playwright)."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+def render_errors() -> tuple[type[Exception], ...]:
     """
-    Запускає Playwright та браузер Chromium.
-    Викликається при старті FastAPI.
+    Помилки рендерингу для except: `except render_errors() as e` (у всіх є e.message).
+    Вираз обчислюється лише коли виняток уже виник, тому Playwright не імпортується заздалегідь.
     """
+    from playwright.async_api import Error
+    return Error, RenderError
+
+
+async def _launch():
     global _playwright_context, _browser_instance
 
-    print("Запуск Playwright...")
+    logger.info("Запуск Playwright...")
     try:
+        from playwright.async_api import async_playwright
+
         _playwright_context = await async_playwright().start()
         # Ми запускаємо лише chromium, оскільки він найкраще підходить для PDF
         _browser_instance = await _playwright_context.chromium.launch()
-        print("Браузер Chromium (Playwright) успішно запущено.")
+        logger.info("Браузер Chromium (Playwright) успішно запущено.")
     except Exception as e:
-        print(f"!!! ПОМИЛКА ЗАПУСКУ PLAYWRIGHT !!!")
-        print(f"PDF-генерація не працюватиме.")
-        print(f"Переконайтеся, що ви виконали: 'pip install playwright' та 'python -m playwright install chromium'")
-        print(f"Деталі помилки: {e}")
+        logger.error(
+            "Помилка запуску Playwright, PDF-генерація не працюватиме. "
+            "Переконайтеся, що ви виконали: 'pip install playwright' та 'python -m playwright install chromium'. "
+            "Деталі: %s", e
+        )
         _browser_instance = None
 
 
+def _start_launch() -> asyncio.Task:
+    global _launch_task
+    if _launch_task is None:
+        _launch_task = asyncio.create_task(_launch())
+    return _launch_task
+
+
+async def start_browser():
+    """
+    Запускає Playwright та браузер Chromium відповідно до BROWSER_LAUNCH_MODE.
+    Викликається при старті FastAPI:
+      startup    - старт сервера чекає на браузер;
+      background - браузер запускається паралельно з обробкою запитів;
+      lazy       - браузер запускається при першому рендерингу.
+    Якщо задано RENDER_SERVICE_URL, воркер власного браузера не запускає.
+    """
+    if RENDER_SERVICE_URL:
+        return
+    if BROWSER_LAUNCH_MODE == "startup":
+        await _start_launch()
+    elif BROWSER_LAUNCH_MODE == "background":
+        _start_launch()
+
+
 async def stop_browser():
     """
     Зупиняє браузер та Playwright.
     Викликається при зупинці FastAPI.
     """
-    global _playwright_context, _browser_instance
+    global _playwright_context, _browser_instance, _launch_task
+    if _launch_task is not None and not _launch_task.done():
+        # Браузер ще запускається - дочекаємось, щоб не залишити процес Chromium
+        await _launch_task
+    _launch_task = None
+
     if _browser_instance:
         await _browser_instance.close()
-        print("Браузер Chromium (Playwright) закрито.")
+        _browser_instance = None
+        logger.info("Браузер Chromium (Playwright) закрито.")
     if _playwright_context:
         await _playwright_context.stop()
-        print("Playwright зупинено.")
+        _playwright_context = None
+        logger.info("Playwright зупинено.")
 
 
-def get_browser() -> Browser | None:
+async def ensure_browser() -> "Browser | None":
     """
     Надає доступ до глобального екземпляра браузера.
+    Якщо браузер ще запускається - чекає на нього; якщо не запускався (lazy) - запускає.
+    None - запуск не вдався.
+    """
+    if _browser_instance is None:
+        # shield: скасування запиту не перериває запуск браузера для інших
+        await asyncio.shield(_start_launch())
+    return _browser_instance
+
+
+def get_browser_status() -> str:
+    """Стан браузера: not_started, starting, ready, failed або remote."""
+    if _browser_instance is not None:
+        return READY
+    if RENDER_SERVICE_URL:
+        return REMOTE
+    if _launch_task is None:
+        return NOT_STARTED
+    return STARTING if not _launch_task.done() else FAILED
+
+
+async def render_page_to_pdf(link: str, path: Path):
     """
-    return _browser_instance
\ No newline at end of file
+    Рендерить сторінку в PDF локальним браузером.
+    Помилки Playwright передаються викликачу; якщо браузер не запустився - Exception.
+    """
+    browser_instance = await ensure_browser()  # Чекаємо, якщо браузер ще запускається
+    if browser_instance is None:
+        raise Exception("Браузер Playwright не запущено. Пропуск генерації PDF.")
+
+    page = await browser_instance.new_page()
+    OPEN_PAGES.inc()
+    try:
+        with stage_timer("playwright_goto"):
+            await page.goto(link, timeout=15000, wait_until='domcontentloaded')
+        with stage_timer("playwright_pdf"):
+            await page.pdf(path=str(path))
+    finally:
+        await page.close()
+        OPEN_PAGES.dec()
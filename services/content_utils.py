@@ -1,219 +1,490 @@
+import logging
 import io
-import hashlib
-import requests
-import yt_dlp
+import re
+import asyncio
+from typing import AsyncIterable, Iterable
 from pathlib import Path
-from playwright.async_api import Error as PlaywrightError
 from urllib.parse import urlparse
+from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from models import Material
 
 # Локальні імпорти
 from config import (
-    ESTIMATED_PDF_MB, ESTIMATED_SPOTIFY_MB, ESTIMATED_VIDEO_MB,
-    ESTIMATED_AUDIO_MB, PDF_CACHE_DIR
+    PDF_CACHE_DIR, SIZE_PROBE_CONCURRENCY, SIZE_PROBE_STREAM_MAX_BYTES, SIZE_PROBE_TIMEOUT_SECONDS,
+    RENDER_CONCURRENCY, RENDER_LEASE_SECONDS, RENDER_SERVICE_URL, RENDER_SERVICE_TIMEOUT_SECONDS,
+    STREAM_CHUNK_SIZE
 )
-from services.browser_manager import get_browser
+from database import async_session_factory
+from services.browser_manager import render_page_to_pdf, render_errors, RenderError
+from services.http_client import get_probe_session
+from services.admission import admit
+from services.metrics import stage_timer, count_error, count_size_result
+from services.probe_guard import (
+    check_probe_allowed, record_probe_success, record_probe_failure, abandon_probe_trial,
+    ProbeSuppressed, ProbeFailure
+)
+from services.size_estimator import (
+    estimate_size_mb, default_estimate_mb, record_size_sample, bitrate_size_bytes
+)
+from services.blob_store import find_material_blob, new_incoming_path, store_material_file
+from services.url_canonicalizer import cache_key_url, pdf_cache_name, url_variants
+from services.worker_registry import claim_or_wait, release_claim, shared_slot
+
+logger = logging.getLogger(__name__)
+
+
+_CONTENT_RANGE_TOTAL = re.compile(r"^bytes\s+(?:\d+-\d+|\*)/(\d+)$")
 
+# Як отримано розмір (size_method)
+SIZE_METHOD_HEAD = 'head'          # Content-Length у відповіді на HEAD
+SIZE_METHOD_RANGE = 'range'        # Content-Range у відповіді на GET bytes=0-0
+SIZE_METHOD_GET = 'get'            # Content-Length у відповіді на GET (Range проігноровано)
+SIZE_METHOD_STREAM = 'stream'      # підраховано байти невеликого файлу
+SIZE_METHOD_YTDLP = 'yt-dlp'       # filesize/filesize_approx з yt-dlp
+SIZE_METHOD_BITRATE = 'bitrate'    # тривалість x бітрейт (оцінка)
+SIZE_METHOD_RENDER = 'render'      # розмір згенерованого PDF
+SIZE_METHOD_ESTIMATE = 'estimate'  # статистична оцінка (size_estimator)
 
-def get_external_content_size_mb(link: str, content_type: str) -> (float, bool):
+
+def _check_probe_status(response):
+    if response.status_code >= 500:
+        raise ProbeFailure(f"HTTP {response.status_code}")
+    if response.status_code in (404, 410):
+        raise ProbeFailure(f"HTTP {response.status_code}", host_failure=False)
+
+
+def _probe_document_size(link: str) -> (int | None, str | None):
+    """
+    Ланцюжок проб для документів: HEAD -> GET з Range: bytes=0-0 (Content-Range)
+    -> підрахунок байтів потоку (лише для файлів до SIZE_PROBE_STREAM_MAX_BYTES).
+    Повертає (розмір у байтах, метод) або (None, None).
+    """
+    session = get_probe_session()
+
+    with stage_timer("head_probe"):
+        response = session.head(link, allow_redirects=True, timeout=SIZE_PROBE_TIMEOUT_SECONDS)
+    _check_probe_status(response)
+    content_length = response.headers.get('Content-Length')
+    # Частина серверів відповідає на HEAD "Content-Length: 0" або взагалі не підтримує HEAD
+    if response.status_code == 200 and content_length and int(content_length) > 0:
+        return int(content_length), SIZE_METHOD_HEAD
+
+    with stage_timer("range_probe"), session.get(
+            link, headers={'Range': 'bytes=0-0'}, stream=True,
+            allow_redirects=True, timeout=SIZE_PROBE_TIMEOUT_SECONDS
+    ) as response:
+        _check_probe_status(response)
+
+        if response.status_code == 206:
+            match = _CONTENT_RANGE_TOTAL.match(response.headers.get('Content-Range', '').strip())
+            if match:
+                return int(match.group(1)), SIZE_METHOD_RANGE
+            return None, None
+
+        if response.status_code != 200:
+            return None, None
+
+        # Сервер ігнорує Range і віддає весь файл
+        content_length = response.headers.get('Content-Length')
+        if content_length and 'gzip' not in response.headers.get('Content-Encoding', ''):
+            return int(content_length), SIZE_METHOD_GET
+
+        if not SIZE_PROBE_STREAM_MAX_BYTES:
+            return None, None
+
+        # Без довжини (chunked) - рахуємо байти, але не більше ліміту
+        received = 0
+        for chunk in response.iter_content(64 * 1024):
+            received += len(chunk)
+            if received > SIZE_PROBE_STREAM_MAX_BYTES:
+                return None, None
+        return received, SIZE_METHOD_STREAM
+
+
+def _probe_external_size(link: str, content_type: str) -> (float | None, bool, float | None, str | None):
+    """
+    Сама проба (HTTP / yt-dlp). Помилки передаються викликачу.
+    """
+    duration = None
+    if content_type in ['pdf', 'doc', 'ppt']:
+        size_bytes, method = _probe_document_size(link)
+        if size_bytes is not None:
+            return round(size_bytes / (1024 * 1024), 2), False, None, method
+        return None, True, None, None
+
+    elif content_type == 'video':
+        import yt_dlp  # важкий модуль - імпортується при першій пробі відео
+
+        ydl_opts = {'quiet': True, 'no_warnings': True}
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with stage_timer("ytdlp_extract"):
+                info = ydl.extract_info(link, download=False)
+            duration = info.get('duration')
+            formats = info.get('formats', [])
+            video_size = 0
+            audio_size = 0
+
+            video_streams = [
+                f for f in formats
+                if f.get('vcodec') != 'none' and f.get('acodec') == 'none' and (
+                        f.get('filesize') or f.get('filesize_approx'))
+            ]
+            if video_streams:
+                best_video_stream = max(video_streams, key=lambda f: f.get('height', 0))
+                video_size = best_video_stream.get('filesize') or best_video_stream.get('filesize_approx')
+
+            audio_streams = [
+                f for f in formats
+                if f.get('acodec') != 'none' and f.get('vcodec') == 'none' and (
+                        f.get('filesize') or f.get('filesize_approx'))
+            ]
+            if audio_streams:
+                best_audio_stream = max(audio_streams, key=lambda f: f.get('abr', 0))
+                audio_size = best_audio_stream.get('filesize') or best_audio_stream.get('filesize_approx')
+
+            if video_size > 0 and audio_size > 0:
+                total_size_bytes = video_size + audio_size
+                return round(total_size_bytes / (1024 * 1024), 2), False, duration, SIZE_METHOD_YTDLP
+
+            progressive_streams = [
+                f for f in formats
+                if f.get('vcodec') != 'none' and f.get('acodec') != 'none' and (
+                        f.get('filesize') or f.get('filesize_approx'))
+            ]
+            if progressive_streams:
+                best_prog_stream = max(progressive_streams, key=lambda f: f.get('height', 0))
+                prog_size = best_prog_stream.get('filesize') or best_prog_stream.get('filesize_approx')
+                if prog_size:
+                    return round(prog_size / (1024 * 1024), 2), False, duration, SIZE_METHOD_YTDLP
+
+            # Розмір не вказано - рахуємо за тривалістю та бітрейтом обраного формату
+            size_bytes = bitrate_size_bytes(duration, info.get('tbr'))
+            if size_bytes:
+                return round(size_bytes / (1024 * 1024), 2), True, duration, SIZE_METHOD_BITRATE
+        return None, True, duration, None
+
+    elif content_type == 'audio_yt_music':
+        import yt_dlp
+
+        ydl_opts = {'format': 'bestaudio/best', 'quiet': True, 'no_warnings': True}
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with stage_timer("ytdlp_extract"):
+                info = ydl.extract_info(link, download=False)
+            duration = info.get('duration')
+            filesize = info.get('filesize') or info.get('filesize_approx')
+            if filesize:
+                return round(filesize / (1024 * 1024), 2), False, duration, SIZE_METHOD_YTDLP
+
+            size_bytes = bitrate_size_bytes(duration, info.get('tbr') or info.get('abr'))
+            if size_bytes:
+                return round(size_bytes / (1024 * 1024), 2), True, duration, SIZE_METHOD_BITRATE
+        return None, True, duration, None
+
+    return None, True, duration, None
+
+
+def _is_host_failure(error: Exception) -> bool:
+    """Чи вказує помилка на проблему з хостом (а не лише з конкретним URL)."""
+    import requests
+
+    if isinstance(error, ProbeFailure):
+        return error.host_failure
+    if isinstance(error, (requests.RequestException, OSError)):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in ("timed out", "timeout", "connection", "unable to download webpage"))
+
+
+def get_external_content_size_mb(link: str, content_type: str) -> (float | None, bool, float | None, str | None):
     """
     Отримує розмір для ЗОВНІШНІХ ресурсів (не для 'text').
-    (Код функції повністю скопійовано з вашого файлу)
+    Повертає (розмір_MB, is_estimated, тривалість_с, метод - див. SIZE_METHOD_*).
+    Якщо розмір визначити не вдалося, розмір - None (оцінку дає size_estimator);
+    тривалість медіа повертається, якщо yt-dlp її повідомив.
+    Для медіа без filesize розмір рахується за тривалістю та бітрейтом (оцінка).
+    URL з недавніми невдачами та "вимкнені" хости не пробуються (probe_guard).
     """
     try:
-        if content_type in ['pdf', 'doc', 'ppt']:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36'}
-            response = requests.head(link, allow_redirects=True, timeout=5, headers=headers)
+        check_probe_allowed(link)
+    except ProbeSuppressed as e:
+        logger.debug("Пропуск проби: %s", e)
+        return None, True, None, None
 
+    try:
+        result = _probe_external_size(link, content_type)
+    except Exception as e:
+        logger.warning("Помилка отримання зовнішнього розміру для %s: %s", link, e)
+        count_error("size_probe")
+        record_probe_failure(link, host_failure=_is_host_failure(e))
+        return None, True, None, None
+
+    record_probe_success(link)
+    return result
+
+
+def _render_remote_blocking(link: str, path: Path):
+    """
+    Рендеринг у спільному сервісі (render_service.py): PDF пишеться у файл шматками.
+    Сторінка не відкрилась - RenderError; сервіс недоступний - Exception.
+    """
+    import requests
+
+    try:
+        with stage_timer("render_remote"), get_probe_session().post(
+                f"{RENDER_SERVICE_URL.rstrip('/')}/render", json={"url": link},
+                stream=True, timeout=RENDER_SERVICE_TIMEOUT_SECONDS
+        ) as response:
             if response.status_code == 200:
-                content_length = response.headers.get('Content-Length')
-                if content_length:
-                    return round(int(content_length) / (1024 * 1024), 2), False
-            return ESTIMATED_PDF_MB, True
+                with open(path, "wb") as file:
+                    for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                        file.write(chunk)
+                return
+            try:
+                detail = response.json().get("detail", "")
+            except ValueError:
+                detail = response.text[:200]
+    except requests.RequestException as e:
+        raise Exception(f"Сервіс рендерингу недоступний: {e}") from e
 
+    if response.status_code == 502:
+        raise RenderError(detail)
+    raise Exception(f"Сервіс рендерингу: HTTP {response.status_code}: {detail}")
 
-        elif content_type == 'video':
-            ydl_opts = {'quiet': True, 'no_warnings': True}
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(link, download=False)
-                formats = info.get('formats', [])
-                video_size = 0
-                audio_size = 0
-
-                video_streams = [
-                    f for f in formats
-                    if f.get('vcodec') != 'none' and f.get('acodec') == 'none' and (
-                            f.get('filesize') or f.get('filesize_approx'))
-                ]
-                if video_streams:
-                    best_video_stream = max(video_streams, key=lambda f: f.get('height', 0))
-                    video_size = best_video_stream.get('filesize') or best_video_stream.get('filesize_approx')
-
-                audio_streams = [
-                    f for f in formats
-                    if f.get('acodec') != 'none' and f.get('vcodec') == 'none' and (
-                            f.get('filesize') or f.get('filesize_approx'))
-                ]
-                if audio_streams:
-                    best_audio_stream = max(audio_streams, key=lambda f: f.get('abr', 0))
-                    audio_size = best_audio_stream.get('filesize') or best_audio_stream.get('filesize_approx')
-
-                if video_size > 0 and audio_size > 0:
-                    total_size_bytes = video_size + audio_size
-                    return round(total_size_bytes / (1024 * 1024), 2), False
-
-                progressive_streams = [
-                    f for f in formats
-                    if f.get('vcodec') != 'none' and f.get('acodec') != 'none' and (
-                            f.get('filesize') or f.get('filesize_approx'))
-                ]
-                if progressive_streams:
-                    best_prog_stream = max(progressive_streams, key=lambda f: f.get('height', 0))
-                    prog_size = best_prog_stream.get('filesize') or best_prog_stream.get('filesize_approx')
-                    if prog_size:
-                        return round(prog_size / (1024 * 1024), 2), False
-            return ESTIMATED_VIDEO_MB, True
-
-        elif content_type == 'audio_yt_music':
-            ydl_opts = {'format': 'bestaudio/best', 'quiet': True, 'no_warnings': True}
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(link, download=False)
-                filesize = info.get('filesize') or info.get('filesize_approx')
-                if filesize:
-                    return round(filesize / (1024 * 1024), 2), False
-            return ESTIMATED_AUDIO_MB, True
 
-    except Exception as e:
-        print(f"Помилка отримання зовнішнього розміру для {link}: {e}")
-        if content_type == 'video':
-            return ESTIMATED_VIDEO_MB, True
-        elif content_type == 'audio_yt_music':
-            return ESTIMATED_AUDIO_MB, True
+async def _find_rendered(link: str) -> Path | None:
+    """Пошук у сховищі окремою сесією: щоб побачити файл, щойно збережений іншим воркером."""
+    async with async_session_factory() as lookup_db:
+        return await find_material_blob(lookup_db, link)
+
+
+async def render_pdf_to_cache(db: AsyncSession, link: str) -> Path:
+    """
+    Повертає PDF сторінки зі сховища за вмістом, рендерячи його лише за потреби.
+    Якщо матеріал уже конвертувався (будь-ким), це лише пошук вказівника в БД.
+    Ту саму сторінку одночасно рендерить лише один воркер, решта чекають на його результат;
+    кількість рендерингів на хості обмежена RENDER_CONCURRENCY (services/worker_registry.py).
+    Помилки рендерингу (render_errors()) та ProbeSuppressed передаються викликачу.
+    """
+    stored = await find_material_blob(db, link)
+    if stored:
+        return stored
+
+    # Файл зі старого PDF-кешу (за хешем URL) переносимо у сховище без рендерингу
+    legacy_path = PDF_CACHE_DIR / pdf_cache_name(link)
+    if legacy_path.exists():
+        tmp_path = new_incoming_path(".pdf")
+        try:
+            legacy_path.replace(tmp_path)
+        except FileNotFoundError:
+            # Файл щойно переніс інший воркер
+            stored = await _find_rendered(link)
+            if stored:
+                return stored
         else:
-            return ESTIMATED_PDF_MB, True
-    return 0.0, True
+            return await store_material_file(db, link, 'text', tmp_path, content_type="application/pdf")
+
+    # Сторінки, що недавно не відкрились (або весь їхній хост), не чекаємо повторно
+    check_probe_allowed(link)
+
+    # Результат проби повідомляється probe_guard на кожному виході, інакше пробна
+    # спроба (half-open) запобіжника хоста так і лишилась би незавершеною
+    probe_reported = False
+    claim_key = f"render:{cache_key_url(link)}"
+    try:
+        while not await claim_or_wait(claim_key, RENDER_LEASE_SECONDS):
+            stored = await _find_rendered(link)
+            if stored:
+                # Сторінку відрендерив інший воркер - хост відповідає
+                record_probe_success(link)
+                probe_reported = True
+                return stored
+
+        try:
+            logger.debug("Генерація PDF для: %s", link)
+            tmp_path = new_incoming_path(".pdf")
+            try:
+                async with shared_slot("render", RENDER_CONCURRENCY, RENDER_LEASE_SECONDS):
+                    if RENDER_SERVICE_URL:
+                        await asyncio.to_thread(_render_remote_blocking, link, tmp_path)
+                    else:
+                        await render_page_to_pdf(link, tmp_path)
+            except BaseException as e:
+                tmp_path.unlink(missing_ok=True)
+                if isinstance(e, render_errors()):
+                    count_error("render")
+                    record_probe_failure(link, host_failure=_is_host_failure(e) or "net::err_" in str(e).lower())
+                    probe_reported = True
+                raise
+            record_probe_success(link)
+            probe_reported = True
+
+            cache_path = await store_material_file(db, link, 'text', tmp_path, content_type="application/pdf")
+        finally:
+            await release_claim(claim_key)
+    except asyncio.CancelledError:
+        if not probe_reported:
+            abandon_probe_trial(link)
+        raise
+    except Exception:
+        if not probe_reported:
+            record_probe_failure(link, host_failure=False)
+        raise
+
+    logger.debug("Збережено в: %s", cache_path)
+    return cache_path
 
 
 async def update_item_size(item: dict, db: AsyncSession) -> dict:
     """
     Оновлює розмір для одного елемента, генеруючи PDF-кеш, якщо потрібно.
+    Якщо точний розмір отримати не вдалося, використовується оцінка
+    за статистикою вже виміряних матеріалів (size_estimator).
     """
     updated_item = item.copy()
     size_mb = None
     is_estimated = False
-    cache_file = updated_item.get('cache_file')
-    browser_instance = get_browser()  # Отримуємо браузер з менеджера
+    duration = None
+    size_method = None
 
     try:
         if updated_item['type'] == 'text':
-            if not cache_file:
-                url_hash = hashlib.md5(updated_item['link'].encode()).hexdigest()
-                cache_file = f"{url_hash}.pdf"
-
-            cache_path = PDF_CACHE_DIR / cache_file
-            updated_item['cache_file'] = cache_file
-
-            if not cache_path.exists():
-                if browser_instance is None:
-                    raise Exception("Браузер Playwright не запущено. Пропуск генерації PDF.")
-
-                print(f"Генерація PDF (Playwright) для: {updated_item['link']}...")
-                page = None
-                try:
-                    page = await browser_instance.new_page()
-                    await page.goto(updated_item['link'], timeout=15000, wait_until='domcontentloaded')
-                    await page.pdf(path=str(cache_path))
-                    print(f"Збережено в: {cache_path}")
-                except PlaywrightError as e:
-                    print(f"!!! ПОМИЛКА (Playwright) для {updated_item['link']}: {e.message.splitlines()[0]}")
-                    updated_item['cache_file'] = None
-                    size_mb = ESTIMATED_PDF_MB
-                    is_estimated = True
-                finally:
-                    if page:
-                        await page.close()
-
-            if cache_path.exists():
+            try:
+                # Рендеринг для розміру ділить пул допуску з /convert
+                async with admit("render"):
+                    cache_path = await render_pdf_to_cache(db, updated_item['link'])
+                updated_item['cache_file'] = cache_path.name
                 size_bytes = cache_path.stat().st_size
                 size_mb = round(size_bytes / (1024 * 1024), 2)
                 is_estimated = False
-            elif updated_item['cache_file'] is None:
-                pass  # Помилка вже оброблена
-            else:
-                raise Exception(f"Файл кешу {cache_path} не знайдено, хоча помилки Playwright не було.")
+                size_method = SIZE_METHOD_RENDER
+            except render_errors() as e:
+                logger.warning("Помилка Playwright для %s: %s", updated_item['link'], e.message.splitlines()[0])
+                updated_item['cache_file'] = None
+            except HTTPException:
+                # Пул рендерингу перевантажений - розмір буде оцінено
+                logger.debug("Рендеринг для розміру пропущено (пул перевантажений): %s", updated_item['link'])
+                updated_item['cache_file'] = None
 
         elif updated_item['type'] == 'audio_spotify':
-            size_mb = ESTIMATED_SPOTIFY_MB
             is_estimated = True
 
         else:
             # Для всіх інших типів (video, audio_yt, pdf, doc...)
-            size_mb, is_estimated = get_external_content_size_mb(updated_item['link'], updated_item['type'])
+            # Синхронні requests/yt-dlp виконуються в потоці, щоб не блокувати цикл подій
+            size_mb, is_estimated, duration, size_method = await asyncio.to_thread(
+                get_external_content_size_mb, updated_item['link'], updated_item['type']
+            )
 
+    except ProbeSuppressed as e:
+        logger.debug("Пропуск проби: %s", e)
+        size_mb = None
+        updated_item['cache_file'] = None
     except Exception as e:
-        print(f"ПОМИЛКА (update_item_size) для {updated_item['link']}: {e}")
-        if updated_item['type'] == 'video':
-            size_mb = ESTIMATED_VIDEO_MB
-        elif updated_item['type'] in ['audio_yt_music', 'audio_spotify']:
-            size_mb = ESTIMATED_AUDIO_MB
-        else:
-            size_mb = ESTIMATED_PDF_MB
-        is_estimated = True
+        logger.warning("Помилка update_item_size для %s: %s", updated_item['link'], e)
+        count_error("update_item_size")
+        size_mb = None
         updated_item['cache_file'] = None
 
+    if size_mb is None:
+        try:
+            size_mb = await estimate_size_mb(db, updated_item['type'], updated_item['link'] or '', duration)
+        except Exception as e:
+            logger.warning("Помилка оцінки розміру для %s: %s", updated_item['link'], e)
+            await db.rollback()
+            size_mb = default_estimate_mb(updated_item['type'])
+        is_estimated = True
+        size_method = SIZE_METHOD_ESTIMATE
+
     updated_item['size_mb'] = size_mb
     updated_item['is_estimated'] = is_estimated
+    updated_item['size_method'] = size_method
+    count_size_result(updated_item['type'], is_estimated, size_method)
 
     if not is_estimated and size_mb is not None and updated_item.get('link'):
         try:
             result = await db.execute(
-                select(Material).where(Material.URL == updated_item['link'])
+                select(Material).where(Material.URL.in_(url_variants(updated_item['link'])))
             )
             material = result.scalars().first()
 
             # Оновлюємо, тільки якщо матеріал існує і розмір ще не встановлено
             if material and material.Size is None:
                 material.Size = int(size_mb * 1024 * 1024)  # Конвертуємо MB в байти
+                # Кожен матеріал потрапляє в статистику оцінок один раз - при першому вимірі
+                await record_size_sample(db, material.Type, material.URL, material.Size, duration)
                 await db.commit()
-                print(f"Оновлено розмір в БД (в байтах): {material.URL}")
+                logger.debug("Оновлено розмір в БД (в байтах): %s", material.URL)
         except Exception as e:
-            print(f"ПОМИЛKA (оновлення розміру в БД): {e}")
+            logger.error("Помилка оновлення розміру в БД: %s", e)
             await db.rollback()
 
     return updated_item
 
 
-async def generate_pdf_for_download(url: str) -> (bytes, str, str | None):
+async def generate_pdf_for_download(db: AsyncSession, url: str) -> (Path | None, str | None, str | None):
     """
-    Генерує PDF для негайного завантаження.
-    Повертає (pdf_content, filename, error_message)
+    Готує PDF для завантаження (зі сховища або новим рендерингом).
+    Повертає (шлях_до_файлу, filename, error_message)
     """
-    browser_instance = get_browser()
-    if browser_instance is None:
-        return None, None, "Сервіс генерації PDF не запущено (Playwright)."
-
-    page = None
     try:
-        page = await browser_instance.new_page()
-        await page.goto(url, timeout=15000, wait_until='domcontentloaded')
-
-        pdf_content = await page.pdf()
-
-        parsed_url = urlparse(url)
-        filename = f"{parsed_url.netloc.replace('.', '_')}.pdf"
-
-        return pdf_content, filename, None
-
-    except PlaywrightError as e:
+        pdf_path = await render_pdf_to_cache(db, url)
+    except render_errors() as e:
         error_message = e.message.splitlines()[0]
-        print(f"ПОМИЛКА (Playwright) /convert для {url}: {error_message}")
+        logger.warning("Помилка Playwright /convert для %s: %s", url, error_message)
         return None, None, f"Не вдалося згенерувати PDF (Playwright): {error_message}"
+    except ProbeSuppressed:
+        return None, None, "Сторінка недавно не відповідала. Спробуйте пізніше."
     except Exception as e:
-        print(f"ЗАГАЛЬНА ПОМИЛКА /convert для {url}: {e}")
+        logger.exception("Загальна помилка /convert для %s", url)
         return None, None, f"Загальна помилка сервера: {e}"
+
+    parsed_url = urlparse(url)
+    filename = f"{parsed_url.netloc.replace('.', '_')}.pdf"
+    return pdf_path, filename, None
+
+
+async def size_items(items: AsyncIterable[dict] | Iterable[dict], force: bool = False) -> list[dict]:
+    """
+    Отримує розміри (size_mb is None) для елементів, що надходять потоком
+    (наприклад, з курсора БД) або звичайним списком.
+    Перевірка розміру для елемента без Size стартує одразу, як тільки він надійшов,
+    паралельно з читанням решти; одночасно - не більше SIZE_PROBE_CONCURRENCY.
+    Кожна перевірка працює з власною сесією БД.
+    force=True - оновити розміри всіх елементів, а не лише відсутні.
+    Порядок елементів зберігається.
+    """
+    semaphore = asyncio.Semaphore(SIZE_PROBE_CONCURRENCY)
+
+    async def size_one(item: dict) -> dict:
+        async with semaphore:
+            async with async_session_factory() as db:
+                return await update_item_size(item, db)
+
+    pending = []
+    tasks = []
+
+    def schedule(item: dict):
+        if force or item.get('size_mb') is None:
+            task = asyncio.create_task(size_one(item))
+            tasks.append(task)
+            pending.append(task)
+        else:
+            pending.append(item)
+
+    try:
+        if isinstance(items, AsyncIterable):
+            async for item in items:
+                schedule(item)
+        else:
+            for item in items:
+                schedule(item)
+
+        return [await entry if isinstance(entry, asyncio.Task) else entry for entry in pending]
     finally:
-        if page:
-            await page.close()
\ No newline at end of file
+        # Помилка джерела, скасування запиту або помилка перевірки: решта перевірок
+        # не працює далі у фоні, а їхні винятки забираються (без "exception was never retrieved")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
\ No newline at end of file
@@ -0,0 +1,415 @@
+import logging
+import time
+import uuid
+import asyncio
+import hashlib
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit, unquote
+
+from fastapi import HTTPException
+
+from config import (
+    DOWNLOAD_PLAN_CONCURRENCY, DOWNLOAD_BANDWIDTH_LIMIT_BPS,
+    DOWNLOAD_ASSUMED_BPS, DOWNLOAD_PLAN_TTL_SECONDS, STREAM_CHUNK_SIZE, MEDIA_MAX_FILESIZE_BYTES
+)
+from database import async_session_factory
+from services.admission import admit
+from services.blob_store import find_material_blob, new_incoming_path, store_material_file
+from services.content_utils import render_pdf_to_cache
+from services.history_writer import record_history
+from services.http_client import get_probe_session
+from services.media_downloader import ensure_media, MEDIA_FORMATS
+from services.optimizer import solve_knapsack_problem
+from services.worker_registry import worker_share, publish_state, read_state
+
+logger = logging.getLogger(__name__)
+
+_MB = 1024 * 1024
+
+# Типи, які завантажуються як звичайні файли по HTTP
+FILE_TYPES = {'pdf', 'doc', 'ppt'}
+DOWNLOADABLE_TYPES = FILE_TYPES | set(MEDIA_FORMATS) | {'text'}
+
+# Розміри приходять у MB з двома знаками: менша різниця з оцінкою - похибка округлення, а не новий розмір
+_SIZE_TOLERANCE_BYTES = _MB // 100
+
+# Фіксовані витрати часу на елемент (с): рендеринг сторінки, розбір сторінки yt-dlp
+_TYPE_OVERHEAD_SECONDS = {'text': 3.0, 'video': 2.0, 'audio_yt_music': 2.0}
+
+# Стани елементів плану
+QUEUED = 'queued'      # обрано планом, чекає на завантаження
+RUNNING = 'running'
+DONE = 'done'
+DROPPED = 'dropped'    # не вміщається в поточний план (може повернутися при переплануванні)
+SKIPPED = 'skipped'    # фактичний розмір перевищив залишок бюджету
+FAILED = 'failed'
+
+
+class BudgetExceeded(Exception):
+    """Фактичний розмір елемента не вміщується в залишок бюджету."""
+
+
+class BandwidthLimiter:
+    """
+    Спільний ліміт швидкості для всіх потоків завантаження.
+    Між воркерами uvicorn ліміт ділиться порівну (worker_share).
+    Кожен прочитаний шматок резервує свій проміжок часу на "віртуальному годиннику",
+    а потік чекає до кінця цього проміжку. Викликається з робочих потоків.
+    """
+
+    def __init__(self, rate_bps: int):
+        self.rate_bps = rate_bps
+        self._lock = threading.Lock()
+        self._next_free = time.monotonic()
+
+    def consume(self, nbytes: int):
+        rate_bps = worker_share(self.rate_bps)
+        if not rate_bps:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._next_free = max(self._next_free, now) + nbytes / rate_bps
+            delay = self._next_free - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+# --- Глобальний стан планувальника ---
+_bandwidth = BandwidthLimiter(DOWNLOAD_BANDWIDTH_LIMIT_BPS)
+# Плани, що виконує цей воркер; іншим воркерам стан плану доступний через реєстр (publish_state)
+_plans: dict[str, "DownloadPlan"] = {}
+
+
+def estimate_seconds(item: dict) -> float:
+    """Орієнтовний час завантаження елемента за розміром та типом."""
+    rate = DOWNLOAD_BANDWIDTH_LIMIT_BPS or DOWNLOAD_ASSUMED_BPS
+    size_bytes = (item.get('size_mb') or 0) * _MB
+    return _TYPE_OVERHEAD_SECONDS.get(item['type'], 0.0) + size_bytes / rate
+
+
+def _priority(item: dict) -> tuple[float, float]:
+    """Спершу найцінніші на мегабайт, серед рівних - найшвидші."""
+    density = item['weight'] / max(item['size_mb'], 0.01)
+    return -density, estimate_seconds(item)
+
+
+class DownloadPlan:
+    """
+    Виконання оптимального набору як єдиного плану.
+    Бюджет (MB) рахується як сума фактичних розмірів завершених елементів
+    плюс резерв для тих, що зараз завантажуються. Резерв бронюється при старті
+    елемента, а при завершенні фактичний розмір перевіряється з актуальним
+    зайнятим бюджетом - обидва кроки під self.lock.
+    """
+
+    def __init__(self, items: list[dict], budget_mb: float, user_id: int):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.budget_bytes = int(budget_mb * _MB)
+        self.replans = 0
+        self.created_at = time.monotonic()
+        self.finished_at: float | None = None
+        self.task: asyncio.Task | None = None
+        self.queue: list[dict] = []
+        self.lock = asyncio.Lock()
+
+        self.items = []
+        for index, item in enumerate(items):
+            size_mb = item.get('size_mb')
+            plan_item = {
+                'index': index,
+                'title': item.get('title') or item.get('link'),
+                'link': item.get('link'),
+                'type': item.get('type'),
+                'weight': item.get('weight', 5),
+                'size_mb': size_mb,
+                'is_estimated': item.get('is_estimated', False),
+                'estimated_bytes': int(size_mb * _MB) if size_mb is not None else None,
+                'actual_bytes': None,
+                'reserved_bytes': 0,  # резерв бюджету, поки елемент завантажується
+                'state': DROPPED,
+                'file': None,
+                'filename': None,
+                'error': None,
+            }
+            if plan_item['type'] not in DOWNLOADABLE_TYPES:
+                plan_item['state'] = SKIPPED
+                plan_item['error'] = "Тип не підтримує завантаження."
+            self.items.append(plan_item)
+
+    def committed_bytes(self, exclude: dict | None = None) -> int:
+        """Зайнятий бюджет: фактичні розміри завершених + резерв активних."""
+        total = 0
+        for item in self.items:
+            if item is exclude:
+                continue
+            if item['state'] == DONE:
+                total += item['actual_bytes']
+            elif item['state'] == RUNNING:
+                total += item['reserved_bytes']
+        return total
+
+    def reserve(self, item: dict) -> int:
+        """
+        Запускає елемент: бронює його оцінку в бюджеті (викликати під self.lock).
+        Повертає максимум байтів, який елемент може зайняти зараз.
+        """
+        item['state'] = RUNNING
+        item['reserved_bytes'] = item['estimated_bytes']
+        return self.budget_bytes - self.committed_bytes(exclude=item)
+
+    def replan(self):
+        """
+        Перераховує план для ще не розпочатих елементів на залишок бюджету
+        (той самий алгоритм рюкзака) та впорядковує чергу за пріоритетом.
+        """
+        candidates = [item for item in self.items if item['state'] in (QUEUED, DROPPED)]
+        remaining_mb = max(self.budget_bytes - self.committed_bytes(), 0) / _MB
+
+        chosen, error = solve_knapsack_problem(candidates, str(remaining_mb))
+        if error:
+            logger.error("Помилка планувальника %s: %s", self.id, error)
+            chosen = []
+
+        chosen_ids = {id(item) for item in chosen}
+        for item in candidates:
+            item['state'] = QUEUED if id(item) in chosen_ids else DROPPED
+        self.queue = sorted(chosen, key=_priority)
+
+    def next_item(self) -> dict | None:
+        """Перший за пріоритетом елемент черги, що вміщається у вільний бюджет."""
+        available = self.budget_bytes - self.committed_bytes()
+        for item in self.queue:
+            if item['state'] == QUEUED and item['estimated_bytes'] <= available:
+                return item
+        return None
+
+    def snapshot(self) -> dict:
+        """
+        Стан плану для обробників запитів (і для інших воркерів - тому лише JSON-типи):
+        власник, стан для клієнта та готові файли (індекс -> [шлях, ім'я файлу]).
+        """
+        return {
+            "user_id": self.user_id,
+            "status": self.to_dict(),
+            "files": {
+                str(item['index']): [str(item['file']), item['filename']]
+                for item in self.items if item['state'] == DONE
+            },
+        }
+
+    def to_dict(self) -> dict:
+        delivered = sum(item['actual_bytes'] for item in self.items if item['state'] == DONE)
+        order = {id(item): position for position, item in enumerate(self.queue)}
+        return {
+            "id": self.id,
+            "finished": self.finished_at is not None,
+            "budget_mb": round(self.budget_bytes / _MB, 2),
+            "committed_mb": round(self.committed_bytes() / _MB, 2),
+            "delivered_mb": round(delivered / _MB, 2),
+            "replans": self.replans,
+            "items": [
+                {
+                    "index": item['index'],
+                    "title": item['title'],
+                    "link": item['link'],
+                    "type": item['type'],
+                    "weight": item['weight'],
+                    "size_mb": item['size_mb'],
+                    "is_estimated": item['is_estimated'],
+                    "actual_mb": round(item['actual_bytes'] / _MB, 2) if item['actual_bytes'] is not None else None,
+                    "state": item['state'],
+                    "order": order.get(id(item)),
+                    "error": item['error'],
+                }
+                for item in self.items
+            ],
+        }
+
+
+def _fetch_file_blocking(url: str, max_bytes: int, tmp_path: Path) -> str:
+    """
+    Завантажує документ (pdf/doc/ppt) у тимчасовий файл шматками (виконується в потоці)
+    і паралельно рахує SHA-256 для сховища. Швидкість обмежується спільним лімітом,
+    а завантаження переривається, щойно файл перевищує залишок бюджету.
+    """
+    sha256 = hashlib.sha256()
+    received = 0
+    try:
+        with get_probe_session().get(url, stream=True, allow_redirects=True, timeout=15) as response:
+            response.raise_for_status()
+            declared = int(response.headers.get('Content-Length') or 0)
+            if declared > max_bytes:
+                raise BudgetExceeded(f"Файл ({declared} байт) більший за допустимий розмір ({max_bytes} байт).")
+
+            with open(tmp_path, "wb") as file:
+                for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                    received += len(chunk)
+                    if received > max_bytes:
+                        raise BudgetExceeded(f"Файл перевищив допустимий розмір ({max_bytes} байт).")
+                    _bandwidth.consume(len(chunk))
+                    sha256.update(chunk)
+                    file.write(chunk)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    return sha256.hexdigest()
+
+
+async def _fetch_item(item: dict, max_bytes: int) -> tuple[Path, str]:
+    """
+    Отримує файл елемента. Повертає (шлях, ім'я файлу для користувача).
+    Файл не більший за залишок бюджету та MEDIA_MAX_FILESIZE_BYTES;
+    рендеринг сторінок займає місце в пулі допуску render, як і /convert.
+    """
+    link, content_type = item['link'], item['type']
+    max_bytes = min(max_bytes, MEDIA_MAX_FILESIZE_BYTES)
+
+    if content_type in MEDIA_FORMATS:
+        # yt-dlp має власний ліміт швидкості - ділимо спільний ліміт між слотами
+        ratelimit = worker_share(DOWNLOAD_BANDWIDTH_LIMIT_BPS) // DOWNLOAD_PLAN_CONCURRENCY or None
+        path, meta = await ensure_media(link, content_type, ratelimit=ratelimit, max_filesize=max_bytes)
+        return path, f"{meta['title']}.{meta['ext']}"
+
+    async with async_session_factory() as db:
+        if content_type == 'text':
+            async with admit("render"):
+                path = await render_pdf_to_cache(db, link)
+            return path, f"{item['title']}.pdf"
+
+        url_path = Path(unquote(urlsplit(link).path))
+        suffix = url_path.suffix.lower() if url_path.suffix[1:].isalnum() else f".{content_type}"
+        filename = url_path.name or f"{item['title']}{suffix}"
+
+        # Документ, вже завантажений раніше (будь-ким), береться зі сховища
+        path = await find_material_blob(db, link)
+        if path is None:
+            tmp_path = new_incoming_path(suffix)
+            digest = await asyncio.to_thread(_fetch_file_blocking, link, max_bytes, tmp_path)
+            path = await store_material_file(db, link, content_type, tmp_path, digest=digest)
+        return path, filename
+
+
+async def _run_item(plan: DownloadPlan, item: dict, allowance: int):
+    """
+    Завантажує елемент. allowance - ліміт на час завантаження (залишок бюджету при старті);
+    фінальна перевірка - з актуальним бюджетом, бо паралельні елементи могли завершитись
+    більшими за свою оцінку.
+    """
+    try:
+        path, filename = await _fetch_item(item, allowance)
+        actual_bytes = path.stat().st_size
+    except BudgetExceeded as e:
+        outcome = (SKIPPED, str(e))
+    except HTTPException as e:
+        # Пул render перевантажений
+        outcome = (FAILED, e.detail)
+    except Exception as e:
+        logger.warning("Не вдалося завантажити %s: %s", item['link'], e)
+        outcome = (FAILED, str(e))
+    else:
+        outcome = None
+
+    async with plan.lock:
+        item['reserved_bytes'] = 0
+        if outcome is None and actual_bytes > plan.budget_bytes - plan.committed_bytes(exclude=item):
+            outcome = (SKIPPED, f"Фактичний розмір ({actual_bytes} байт) перевищує залишок бюджету.")
+
+        if outcome is None:
+            item.update(state=DONE, actual_bytes=actual_bytes, file=path, filename=filename)
+            record_history(plan.user_id, item['link'], item['type'])
+        else:
+            item['state'], item['error'] = outcome
+
+        # Фактичний розмір відрізняється від оцінки (або місце звільнилось) - перебудовуємо план
+        if item['state'] != DONE or abs(item['actual_bytes'] - item['estimated_bytes']) > _SIZE_TOLERANCE_BYTES:
+            plan.replans += 1
+            plan.replan()
+        await _publish(plan)
+
+
+async def _run_plan(plan: DownloadPlan):
+    """Запускає елементи за пріоритетом, не більше DOWNLOAD_PLAN_CONCURRENCY одночасно."""
+    running: set[asyncio.Task] = set()
+    try:
+        while True:
+            async with plan.lock:
+                started = False
+                while len(running) < DOWNLOAD_PLAN_CONCURRENCY:
+                    item = plan.next_item()
+                    if item is None:
+                        break
+                    allowance = plan.reserve(item)
+                    running.add(asyncio.create_task(_run_item(plan, item, allowance)))
+                    started = True
+                if started:
+                    await _publish(plan)
+
+            if not running:
+                break
+            _, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        plan.finished_at = time.monotonic()
+        async with plan.lock:
+            await _publish(plan)
+
+
+def _drop_expired_plans():
+    now = time.monotonic()
+    for plan_id, plan in list(_plans.items()):
+        if plan.finished_at is not None and now - plan.finished_at > DOWNLOAD_PLAN_TTL_SECONDS:
+            del _plans[plan_id]
+
+
+async def _publish(plan: DownloadPlan):
+    """
+    Публікує стан плану в реєстрі воркерів: браузер опитує план через будь-який воркер.
+    Викликається під plan.lock, тож старіший стан не перезапише новіший.
+    Завершений план зберігається DOWNLOAD_PLAN_TTL_SECONDS, незавершений - поки живий цей воркер.
+    """
+    ttl = DOWNLOAD_PLAN_TTL_SECONDS if plan.finished_at is not None else None
+    await publish_state(_state_key(plan.id), plan.snapshot(), ttl)
+
+
+def _state_key(plan_id: str) -> str:
+    return f"download_plan:{plan_id}"
+
+
+async def start_download_plan(items: list[dict], memory_size: str | float, user_id: int) -> DownloadPlan:
+    """
+    Створює план для списку оптимізації та запускає його у фоні.
+    Елементи обираються тим самим алгоритмом рюкзака, що й на сторінці оптимізації.
+    Некоректний memory_size піднімає ValueError.
+    """
+    budget_mb = float(memory_size)
+    if budget_mb <= 0:
+        raise ValueError("Об'єм пам'яті має бути більшим за нуль.")
+
+    _drop_expired_plans()
+    plan = DownloadPlan(items, budget_mb, user_id)
+    plan.replan()
+    # Спершу публікуємо: наступне опитування може потрапити на інший воркер
+    await _publish(plan)
+    plan.task = asyncio.create_task(_run_plan(plan))
+    _plans[plan.id] = plan
+    return plan
+
+
+async def get_download_plan(plan_id: str) -> dict | None:
+    """Стан плану (DownloadPlan.snapshot) - з цього воркера або з реєстру, якщо план виконує інший."""
+    plan = _plans.get(plan_id)
+    if plan is not None:
+        return plan.snapshot()
+    return await read_state(_state_key(plan_id))
+
+
+def get_download_scheduler_stats() -> dict:
+    """Стан планувальника завантажень."""
+    return {
+        "concurrency": DOWNLOAD_PLAN_CONCURRENCY,
+        "bandwidth_limit_bps": DOWNLOAD_BANDWIDTH_LIMIT_BPS,
+        "plans": len(_plans),
+        "active_plans": sum(1 for plan in _plans.values() if plan.finished_at is None),
+    }
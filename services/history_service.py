@@ -1,9 +1,24 @@
+import logging
+import base64
+from datetime import datetime
+
+from sqlalchemy import insert, delete, func, or_, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload
+
+from config import HISTORY_PAGE_SIZE
 
 from models import User, Material, HistoryMaterial
-from services.bookmark_service import get_or_create_material
+from services.bookmark_service import get_or_create_material_id, get_or_create_material_ids
+from services.url_canonicalizer import canonicalize_url
+from services.logging_setup import SAMPLED
+
+logger = logging.getLogger(__name__)
+
+# SQL Server дозволяє до 1000 рядків у VALUES та 2100 параметрів на запит
+# (також використовується як розмір пачки ID для масового видалення)
+_HISTORY_INSERT_CHUNK_SIZE = 500
 
 
 async def add_to_history(db: AsyncSession, user: User, url: str, type_str: str):
@@ -11,34 +26,124 @@ async def add_to_history(db: AsyncSession, user: User, url: str, type_str: str):
     Додає матеріал до історії користувача.
     Створює матеріал, якщо він не існує, і записує подію завантаження.
     """
-    # 1. Знаходимо або створюємо матеріал
-    material = await get_or_create_material(db, url, type_str)
+    # 1. Знаходимо або створюємо матеріал (один upsert-запит у тій самій транзакції)
+    material_id = await get_or_create_material_id(db, url, type_str, commit=False)
 
     # 2. Створюємо запис в історії
     # Ми не перевіряємо наявність, а просто додаємо новий запис
     # кожного разу, щоб фіксувати кожну взаємодію.
     history_entry = HistoryMaterial(
         UserID=user.UserID,
-        MaterialID=material.MaterialID
+        MaterialID=material_id
     )
     db.add(history_entry)
     await db.commit()
-    print(f"Додано до історії [User: {user.UserID}]: {url}")
+    logger.info("Додано до історії [User: %s]: %s", user.UserID, url, extra=SAMPLED)
 
 
-async def get_user_history(db: AsyncSession, user: User) -> list[HistoryMaterial]:
+async def add_history_batch(db: AsyncSession, events: list[dict]):
     """
-    Отримує всю історію завантажень для користувача.
+    Записує пачку подій історії: один upsert матеріалів
+    та багаторядковий INSERT у HistoryMaterials, одна транзакція.
+    Подія: {"user_id": int, "url": str, "type": str, "load_date": datetime}.
     """
-    result = await db.execute(
+    material_ids = await get_or_create_material_ids(
+        db, [(event["url"], event["type"]) for event in events], commit=False
+    )
+
+    rows = [
+        {
+            "UserID": event["user_id"],
+            "MaterialID": material_ids[canonicalize_url(event["url"])],
+            "LoadDate": event["load_date"],
+        }
+        for event in events
+    ]
+    for start in range(0, len(rows), _HISTORY_INSERT_CHUNK_SIZE):
+        await db.execute(insert(HistoryMaterial).values(rows[start:start + _HISTORY_INSERT_CHUNK_SIZE]))
+    await db.commit()
+    logger.info("Додано до історії %d записів", len(rows), extra=SAMPLED)
+
+
+def encode_history_cursor(item: HistoryMaterial) -> str:
+    """
+    Курсор сторінки - позиція останнього показаного запису (LoadDate, HistoryID).
+    """
+    raw = f"{item.LoadDate.isoformat()}|{item.HistoryID}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_history_cursor(cursor: str | None) -> tuple[datetime, int] | None:
+    """
+    Розбирає курсор. Для некоректного курсора повертає None (перша сторінка).
+    """
+    if not cursor:
+        return None
+    try:
+        load_date_str, history_id_str = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(load_date_str), int(history_id_str)
+    except ValueError:
+        return None
+
+
+async def get_user_history_page(
+        db: AsyncSession,
+        user: User,
+        cursor: str | None = None,
+        limit: int = HISTORY_PAGE_SIZE,
+        latest_only: bool = False
+) -> tuple[list[HistoryMaterial], str | None]:
+    """
+    Отримує одну сторінку історії (новіші спочатку) за keyset-пагінацією:
+    замість OFFSET продовжуємо з позиції курсора, тому вартість запиту
+    не залежить від довжини історії (індекс IX_HistoryMaterials_UserID_LoadDate).
+
+    latest_only=True - лише останній запис для кожного матеріалу
+    (дедуплікація в SQL через ROW_NUMBER()).
+
+    Повертає (записи, курсор наступної сторінки або None).
+    """
+    order_columns = (HistoryMaterial.LoadDate.desc(), HistoryMaterial.HistoryID.desc())
+
+    query = (
         select(HistoryMaterial)
         .where(HistoryMaterial.UserID == user.UserID)
-        .options(
-            selectinload(HistoryMaterial.material)
-        )
-        .order_by(HistoryMaterial.LoadDate.desc())  # Новіші спочатку
+        .options(joinedload(HistoryMaterial.material))
     )
-    return result.scalars().all()
+
+    if latest_only:
+        ranked = (
+            select(
+                HistoryMaterial.HistoryID,
+                func.row_number().over(
+                    partition_by=HistoryMaterial.MaterialID,
+                    order_by=order_columns
+                ).label("rn")
+            )
+            .where(HistoryMaterial.UserID == user.UserID)
+            .subquery()
+        )
+        query = query.join(ranked, ranked.c.HistoryID == HistoryMaterial.HistoryID).where(ranked.c.rn == 1)
+
+    position = decode_history_cursor(cursor)
+    if position:
+        load_date, history_id = position
+        query = query.where(
+            or_(
+                HistoryMaterial.LoadDate < load_date,
+                and_(HistoryMaterial.LoadDate == load_date, HistoryMaterial.HistoryID < history_id)
+            )
+        )
+
+    # Беремо на один запис більше, щоб знати, чи є наступна сторінка
+    result = await db.execute(query.order_by(*order_columns).limit(limit + 1))
+    items = result.scalars().all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_history_cursor(items[-1])
+    return items, next_cursor
 
 
 async def check_history_owner(db: AsyncSession, user: User, history_id: int) -> HistoryMaterial | None:
@@ -64,6 +169,27 @@ async def delete_history_item(db: AsyncSession, user: User, history_id: int):
     if item_to_delete:
         await db.delete(item_to_delete)
         await db.commit()
-        print(f"Видалено запис історії {history_id} для користувача {user.UserID}")
+        logger.info("Видалено запис історії %s для користувача %s", history_id, user.UserID)
     else:
-        print(f"Помилка видалення: Запис історії {history_id} не знайдено або немає доступу.")
\ No newline at end of file
+        logger.warning("Помилка видалення: запис історії %s не знайдено або немає доступу.", history_id)
+
+
+async def delete_history_items(db: AsyncSession, user: User, history_ids: list[int]) -> int:
+    """
+    Видаляє записи історії користувача одним DELETE ... WHERE HistoryID IN (...) AND UserID = ?.
+    Повертає кількість видалених.
+    """
+    deleted = 0
+    for start in range(0, len(history_ids), _HISTORY_INSERT_CHUNK_SIZE):
+        result = await db.execute(
+            delete(HistoryMaterial)
+            .where(
+                HistoryMaterial.HistoryID.in_(history_ids[start:start + _HISTORY_INSERT_CHUNK_SIZE]),
+                HistoryMaterial.UserID == user.UserID
+            )
+            .execution_options(synchronize_session=False)
+        )
+        deleted += result.rowcount
+    await db.commit()
+    logger.info("Видалено %d записів історії для користувача %s", deleted, user.UserID)
+    return deleted
\ No newline at end of file
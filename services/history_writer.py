@@ -0,0 +1,254 @@
+import logging
+import os
+import json
+import asyncio
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError, InterfaceError
+
+from config import (
+    HISTORY_FLUSH_BATCH_SIZE, HISTORY_FLUSH_INTERVAL_SECONDS, HISTORY_SPOOL_PATH,
+    HISTORY_DEAD_LETTER_PATH, HISTORY_MAX_PENDING
+)
+from database import async_session_factory
+from services.history_service import add_history_batch
+from services.metrics import count_error
+from services.worker_registry import WORKER_ID, get_live_worker_ids
+
+logger = logging.getLogger(__name__)
+
+# Власний спул воркера: інші воркери його не переписують і не відтворюють
+_SPOOL_PATH = HISTORY_SPOOL_PATH.with_name(f"{HISTORY_SPOOL_PATH.stem}.{WORKER_ID}{HISTORY_SPOOL_PATH.suffix}")
+
+# Помилки з'єднання з БД: пачка не винна, повторюємо її цілою пізніше
+_TRANSIENT_ERRORS = (OperationalError, InterfaceError, OSError, asyncio.TimeoutError)
+
+# --- Глобальний стан буфера ---
+# Події, які ще не записані в БД
+_pending: list[dict] = []
+# Події з _pending, які ще не дописані у спул (дописує фонова задача)
+_unspooled: list[dict] = []
+# Події для файлу dead-letter: (подія, причина)
+_dead_letters: list[tuple[dict, str]] = []
+_spool_lock: asyncio.Lock | None = None
+_wakeup: asyncio.Event | None = None
+_flusher_task: asyncio.Task | None = None
+
+
+def record_history(user_id: int, url: str, type_str: str):
+    """
+    Ставить подію історії в чергу без очікування БД та диска.
+    Фонова задача дописує подію у спул воркера (до HISTORY_FLUSH_INTERVAL_SECONDS),
+    тож після цього вона не губиться при падінні процесу (доставка "щонайменше один раз").
+    Якщо черга переповнена (БД довго недоступна) - подія йде у dead-letter.
+    """
+    event = {
+        "user_id": user_id,
+        "url": url,
+        "type": type_str,
+        "load_date": datetime.now().isoformat(),
+    }
+    if len(_pending) >= HISTORY_MAX_PENDING:
+        count_error("history_overflow")
+        _dead_letters.append((event, "черга переповнена"))
+        return
+
+    _pending.append(event)
+    _unspooled.append(event)
+    if _wakeup is not None and len(_pending) >= HISTORY_FLUSH_BATCH_SIZE:
+        _wakeup.set()
+
+
+def _read_spool(path: Path) -> list[dict]:
+    events = []
+    with open(path, encoding="utf-8") as spool:
+        for line in spool:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Обірваний останній рядок (падіння під час запису)
+                continue
+    return events
+
+
+def _adopt_orphan_spools() -> list[dict]:
+    """
+    Забирає спули воркерів, що вже не працюють (та спільний спул попередніх версій).
+    Файл спершу атомарно перейменовується - тож при одночасному старті
+    кількох воркерів кожен спул відтворює лише один з них.
+    """
+    live_workers = get_live_worker_ids()
+    events = []
+    candidates = [HISTORY_SPOOL_PATH, *HISTORY_SPOOL_PATH.parent.glob(
+        f"{HISTORY_SPOOL_PATH.stem}.*{HISTORY_SPOOL_PATH.suffix}"
+    )]
+    for path in candidates:
+        owner = path.name[len(HISTORY_SPOOL_PATH.stem) + 1:-len(HISTORY_SPOOL_PATH.suffix) or None]
+        if path == _SPOOL_PATH or (path != HISTORY_SPOOL_PATH and live_workers is not None and owner in live_workers):
+            continue
+        claimed = path.with_name(f"{path.name}.{WORKER_ID}.adopting")
+        try:
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            continue  # Забрав інший воркер
+        events.extend(_read_spool(claimed))
+        claimed.unlink()
+    return events
+
+
+def _append_lines(path: Path, lines: list[str]):
+    # Один write - рядки інших воркерів (dead-letter спільний) не перемішуються з нашими
+    with open(path, "a", encoding="utf-8") as file:
+        file.write("".join(lines))
+
+
+def _write_spool(events: list[dict]):
+    """Атомарно замінює спул воркера переданими подіями."""
+    if not events:
+        _SPOOL_PATH.unlink(missing_ok=True)
+        return
+
+    tmp_path = _SPOOL_PATH.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as spool:
+        for event in events:
+            spool.write(json.dumps(event, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, _SPOOL_PATH)
+
+
+async def _sync_spool(rewrite: bool = False):
+    """
+    Дописує нові події у спул та dead-letter (в потоці, поза обробкою запитів).
+    rewrite=True - спул переписується поточною чергою (після запису пачки в БД).
+    """
+    async with _spool_lock:
+        if _dead_letters:
+            dead = _dead_letters[:]
+            del _dead_letters[:len(dead)]
+            lines = [
+                json.dumps({**event, "error": reason}, ensure_ascii=False) + "\n"
+                for event, reason in dead
+            ]
+            await asyncio.to_thread(_append_lines, HISTORY_DEAD_LETTER_PATH, lines)
+            logger.error("%d подій історії записано у %s", len(dead), HISTORY_DEAD_LETTER_PATH)
+
+        if rewrite:
+            _unspooled.clear()
+            await asyncio.to_thread(_write_spool, _pending[:])
+        elif _unspooled:
+            batch = _unspooled[:]
+            del _unspooled[:len(batch)]
+            lines = [json.dumps(event, ensure_ascii=False) + "\n" for event in batch]
+            await asyncio.to_thread(_append_lines, _SPOOL_PATH, lines)
+
+
+async def _write_batch(batch: list[dict]) -> list[dict]:
+    """
+    Записує пачку; якщо БД відкинула її через дані - ділить навпіл, щоб знайти
+    події, які не записуються, і відправити їх у dead-letter.
+    Повертає події, які треба повторити (БД недоступна).
+    """
+    try:
+        events = [
+            {**event, "load_date": datetime.fromisoformat(event["load_date"])}
+            for event in batch
+        ]
+        async with async_session_factory() as db:
+            await add_history_batch(db, events)
+        return []
+    except _TRANSIENT_ERRORS as e:
+        logger.error("Помилка запису історії (%d подій): %s", len(batch), e)
+        count_error("history_flush")
+        return batch
+    except Exception as e:
+        if len(batch) == 1:
+            logger.error("Подію історії відхилено: %s", e)
+            count_error("history_dead_letter")
+            _dead_letters.append((batch[0], str(e)))
+            return []
+
+    middle = len(batch) // 2
+    retry = await _write_batch(batch[:middle])
+    if retry:
+        # БД стала недоступною - другу половину навіть не пробуємо
+        return retry + batch[middle:]
+    return await _write_batch(batch[middle:])
+
+
+async def flush_history() -> bool:
+    """
+    Записує накопичені події в БД однією транзакцією.
+    Якщо БД недоступна, події повертаються в чергу для наступної спроби;
+    події, які БД відхиляє, після поділу пачки йдуть у dead-letter.
+    """
+    if not _pending:
+        await _sync_spool()
+        return True
+
+    batch = _pending[:]
+    del _pending[:len(batch)]
+
+    try:
+        retry = await _write_batch(batch)
+    except asyncio.CancelledError:
+        _pending[:0] = batch
+        raise
+
+    if retry:
+        _pending[:0] = retry
+        await _sync_spool()
+        return False
+
+    # Події, що надійшли під час запису, залишаються у спулі
+    await _sync_spool(rewrite=True)
+    return True
+
+
+async def _flush_loop():
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=HISTORY_FLUSH_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        await flush_history()
+
+
+async def start_history_writer():
+    """
+    Відновлює події зі спулів воркерів, що не працюють, та запускає фонову задачу запису.
+    Викликається при старті FastAPI (після реєстру воркерів).
+    """
+    global _spool_lock, _wakeup, _flusher_task
+
+    _spool_lock = asyncio.Lock()
+    recovered = await asyncio.to_thread(_adopt_orphan_spools)
+    if recovered:
+        logger.info("Відновлено %d подій історії зі спулу.", len(recovered))
+        _pending[:0] = recovered
+        await _sync_spool(rewrite=True)
+
+    _wakeup = asyncio.Event()
+    _flusher_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_history_writer():
+    """
+    Зупиняє фонову задачу та записує залишок черги.
+    Викликається при зупинці FastAPI.
+    """
+    global _flusher_task
+    if _flusher_task:
+        _flusher_task.cancel()
+        try:
+            await _flusher_task
+        except asyncio.CancelledError:
+            pass
+        _flusher_task = None
+
+    await flush_history()
+
+
+def get_pending_count() -> int:
+    """Кількість подій, що очікують запису в БД."""
+    return len(_pending)
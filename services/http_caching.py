@@ -0,0 +1,271 @@
+import zlib
+import hashlib
+from urllib.parse import parse_qs
+
+from jinja2 import pass_context
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.staticfiles import StaticFiles
+
+from config import COMPRESSION_MIN_BYTES, GZIP_LEVEL, BROTLI_QUALITY, STATIC_DIR, STATIC_MAX_AGE_SECONDS
+
+# brotli - необов'язкова залежність
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Типи, які варто стискати (PDF, медіа, архіви вже стиснені)
+_COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/javascript", "application/x-ndjson",
+    "application/xml", "image/svg+xml",
+)
+# ETag/304 - для сторінок та JSON (файли мають власні ETag від FileResponse/StaticFiles)
+_CONDITIONAL_TYPES = ("text/html", "application/json")
+
+# Шлях статики -> (mtime_ns, розмір, хеш вмісту)
+_asset_versions: dict[str, tuple[int, int, str]] = {}
+
+
+def _is_compressible(content_type: str) -> bool:
+    return content_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+def _accepted_encodings(headers: Headers) -> set[str]:
+    """Кодування з Accept-Encoding (без тих, що мають q=0)."""
+    accepted = set()
+    for part in headers.get("accept-encoding", "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name)
+    return accepted
+
+
+class _GzipEncoder:
+    name = "gzip"
+
+    def __init__(self):
+        # wbits=31 - формат gzip; час у заголовку 0, тож однаковий вміст стискається однаково
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        # SYNC_FLUSH: потокові відповіді (експорт) доходять до клієнта шматками, а не в кінці
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    name = "br"
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Стискає текстові відповіді (HTML, JSON, CSS/JS, CSV) від COMPRESSION_MIN_BYTES:
+    brotli, якщо встановлений і клієнт його приймає, інакше gzip.
+    Відповідь одним шматком стискається цілком (з Content-Length), потокова - шматками.
+    Вже закодовані відповіді та діапазони (206) не змінюються.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = _accepted_encodings(Headers(scope=scope))
+        if brotli is not None and "br" in accepted:
+            encoder_class = _BrotliEncoder
+        elif "gzip" in accepted:
+            encoder_class = _GzipEncoder
+        else:
+            encoder_class = None
+
+        start_message = None
+        encoder = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = MutableHeaders(scope=message)
+                if _is_compressible(headers.get("content-type", "")):
+                    headers.add_vary_header("Accept-Encoding")
+                    passthrough = (
+                        encoder_class is None or message["status"] != 200
+                        or "content-encoding" in headers or "content-range" in headers
+                    )
+                else:
+                    passthrough = True
+                if passthrough:
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            headers = MutableHeaders(scope=start_message)
+
+            if encoder is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                encoder = encoder_class()
+                headers["Content-Encoding"] = encoder.name
+                if more_body:
+                    del headers["content-length"]
+                    await send(start_message)
+                else:
+                    compressed = encoder.compress(body) + encoder.finish()
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+
+            chunk = encoder.compress(body)
+            if not more_body:
+                chunk += encoder.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class ConditionalGetMiddleware:
+    """
+    ETag та 304 Not Modified для GET-сторінок і JSON, що віддаються одним шматком.
+    ETag - слабкий (W/), від нестиснутого тіла, тому однаковий для gzip/br/без стиснення.
+    Сторінки залежать від сесії, тому за замовчуванням Cache-Control: private, no-cache -
+    браузер щоразу перепитує сервер, але при незмінній сторінці отримує 304 без тіла.
+    Потокові відповіді передаються без змін.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match", "")
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                passthrough = (
+                    message["status"] != 200 or "etag" in headers
+                    or "no-store" in headers.get("cache-control", "")
+                    or not headers.get("content-type", "").startswith(_CONDITIONAL_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            if message.get("more_body", False):
+                # Потокова відповідь: ETag невідомий до кінця тіла
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            etag = f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+            headers = MutableHeaders(scope=start_message)
+            headers["ETag"] = etag
+            if "cache-control" not in headers:
+                headers["Cache-Control"] = "private, no-cache"
+
+            if _etag_matches(if_none_match, etag):
+                start_message["status"] = 304
+                del headers["content-length"]
+                del headers["content-type"]
+                # Без Content-Type CompressionMiddleware не додасть Vary, а 304 має повторювати його з 200
+                headers.add_vary_header("Accept-Encoding")
+                await send(start_message)
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            await send(start_message)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Слабке порівняння (RFC 9110): W/ ігнорується."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def asset_version(path: str) -> str:
+    """Короткий хеш вмісту файлу статики (перераховується лише після зміни файлу)."""
+    file_path = STATIC_DIR / path
+    stat = file_path.stat()
+    cached = _asset_versions.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    version = hashlib.sha256(file_path.read_bytes()).hexdigest()[:12]
+    _asset_versions[path] = (stat.st_mtime_ns, stat.st_size, version)
+    return version
+
+
+@pass_context
+def static_url(context, path: str) -> str:
+    """
+    URL статики з версією для шаблонів: {{ static_url('css/style.css') }}.
+    Після зміни файлу змінюється і URL, тож браузер може кешувати його безстроково.
+    """
+    request = context["request"]
+    return f"{request.url_for('static', path=path)}?v={asset_version(path)}"
+
+
+class VersionedStaticFiles(StaticFiles):
+    """
+    Статика з Cache-Control: файли з актуальною версією (?v=...) - immutable
+    на STATIC_MAX_AGE_SECONDS, без версії - no-cache (перевірка через ETag/Last-Modified).
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        path = self.get_path(scope)
+        version = parse_qs(scope["query_string"].decode()).get("v", [None])[0]
+        try:
+            current = asset_version(path)
+        except OSError:
+            current = None
+        if version and version == current:
+            response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE_SECONDS}, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
@@ -0,0 +1,44 @@
+from typing import TYPE_CHECKING
+
+from config import PROBE_POOL_SIZE
+
+# requests імпортується при створенні сесії (першій пробі), а не при старті застосунку
+if TYPE_CHECKING:
+    import requests
+
+# Заголовки, з якими ми "пробуємо" зовнішні ресурси (HEAD/GET)
+PROBE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36'
+}
+
+# --- Глобальна сесія (пул з'єднань) ---
+_probe_session: "requests.Session | None" = None
+
+
+def get_probe_session() -> "requests.Session":
+    """
+    Повертає спільну requests.Session з пулом з'єднань.
+    Повторні запити до того ж хоста перевикористовують TCP/TLS з'єднання.
+    """
+    global _probe_session
+    if _probe_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=PROBE_POOL_SIZE, pool_maxsize=PROBE_POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update(PROBE_HEADERS)
+        _probe_session = session
+    return _probe_session
+
+
+def close_probe_session():
+    """
+    Закриває пул з'єднань. Викликається при зупинці FastAPI.
+    """
+    global _probe_session
+    if _probe_session is not None:
+        _probe_session.close()
+        _probe_session = None
@@ -0,0 +1,160 @@
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from config import LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_SAMPLE_EVERY
+
+# ID поточного HTTP-запиту (встановлюється middleware в main.py)
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Позначка для частих повідомлень: logger.info("...", extra=SAMPLED)
+SAMPLED = {"sampled": True}
+
+# Стандартні атрибути LogRecord - усе інше (extra=...) потрапляє в JSON як поля
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "sampled"}
+
+# --- Глобальний стан ---
+_listener: QueueListener | None = None
+_handler: QueueHandler | None = None
+_stats = {"dropped": 0, "sampled_out": 0}
+
+
+class _RequestContextFilter(logging.Filter):
+    """
+    Виконується в потоці, що логує: додає request_id та проріджує часті повідомлення.
+    Лічильник ведеться за шаблоном повідомлення (record.msg), тому аргументи мають
+    передаватися через %s, а не f-рядком.
+    """
+
+    def __init__(self, sample_every: int):
+        super().__init__()
+        self.sample_every = max(sample_every, 1)
+        self._counters: dict[tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        if not getattr(record, "sampled", False) or self.sample_every == 1:
+            return True
+
+        key = (record.name, str(record.msg))
+        with self._lock:
+            count = self._counters.get(key, 0)
+            self._counters[key] = count + 1
+        if count % self.sample_every:
+            _stats["sampled_out"] += 1
+            return False
+        # Скільки подій представляє цей запис
+        record.sample_rate = self.sample_every
+        return True
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """
+    Кладе запис у чергу без блокування; якщо черга переповнена (stdout не встигає),
+    запис відкидається замість того, щоб зупиняти цикл подій.
+    Форматування (JSON) виконує потік QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Лише підставляємо аргументи (щоб запис не тримав посилань на об'єкти);
+        # трасування винятку форматується тут, бо exc_info не можна передати між потоками безпечно
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _stats["dropped"] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Один JSON-об'єкт на рядок."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", "-") != "-":
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _parse_levels(spec: str) -> dict[str, str]:
+    """'services.content_utils=DEBUG,routers=WARNING' -> {модуль: рівень}."""
+    levels = {}
+    for part in spec.split(","):
+        name, sep, level = part.partition("=")
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """
+    Налаштовує кореневий логер: QueueHandler у викликаючому потоці,
+    форматування та запис у stdout - у фоновому потоці QueueListener.
+    Повторний виклик нічого не робить.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        ))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _handler = _DroppingQueueHandler(log_queue)
+    _handler.addFilter(_RequestContextFilter(LOG_SAMPLE_EVERY))
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """
+    Дописує записи, що залишились у черзі, та зупиняє фоновий потік.
+    Після зупинки попередження та помилки йдуть напряму в stderr (logging.lastResort).
+    """
+    global _listener, _handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_handler)
+        _listener.stop()
+        _listener, _handler = None, None
+
+
+def get_logging_stats() -> dict:
+    """Відкинуті (переповнення черги) та проріджені записи."""
+    return dict(_stats)
@@ -0,0 +1,224 @@
+import re
+import logging
+import json
+import asyncio
+import hashlib
+from pathlib import Path
+
+from config import (
+    MEDIA_STORE_DIR, MEDIA_DOWNLOAD_CONCURRENCY, MEDIA_VIDEO_FORMAT, MEDIA_AUDIO_FORMAT,
+    MEDIA_DOWNLOAD_LEASE_SECONDS
+)
+from services.metrics import stage_timer, count_error
+from services.url_canonicalizer import canonicalize_url, cache_key_url
+from services.worker_registry import claim_or_wait, release_claim, shared_slot
+
+logger = logging.getLogger(__name__)
+
+# Типи, які можна завантажити через yt-dlp, та формат для кожного
+MEDIA_FORMATS = {
+    'video': MEDIA_VIDEO_FORMAT,
+    'audio_yt_music': MEDIA_AUDIO_FORMAT,
+}
+
+# --- Глобальний стан завантажувача ---
+_download_slots = asyncio.Semaphore(MEDIA_DOWNLOAD_CONCURRENCY)
+# Ключ медіа -> задача, що зараз завантажує його (щоб не качати двічі)
+_in_progress: dict[str, asyncio.Task] = {}
+# Ключ медіа -> помилка останнього фонового завантаження (для опитування стану)
+_failed: dict[str, str] = {}
+_MAX_FAILED_ENTRIES = 1000
+_MEDIA_KEY_RE = re.compile(r"[0-9a-f]{32}")
+
+
+class MediaDownloadError(Exception):
+    """Не вдалося завантажити медіафайл."""
+
+
+def media_key(url: str) -> str:
+    """Ключ файлу в сховищі (за ключем кешу URL)."""
+    return hashlib.md5(cache_key_url(url).encode()).hexdigest()
+
+
+def _partial_dir() -> Path:
+    return MEDIA_STORE_DIR / ".partial"
+
+
+def find_stored_media(url: str) -> tuple[Path, dict] | None:
+    """
+    Повертає (шлях до файлу, метадані), якщо медіа вже є у сховищі.
+    """
+    return find_stored_media_by_key(media_key(url))
+
+
+def find_stored_media_by_key(key: str) -> tuple[Path, dict] | None:
+    """Те саме за ключем медіа (для посилань на файл); некоректний ключ - None."""
+    if not _MEDIA_KEY_RE.fullmatch(key):
+        return None
+    meta_path = MEDIA_STORE_DIR / f"{key}.json"
+    if not meta_path.exists():
+        return None
+
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    file_path = MEDIA_STORE_DIR / meta["file"]
+    if not file_path.exists():
+        return None
+    return file_path, meta
+
+
+def _download_blocking(url: str, content_type: str, key: str, ratelimit: int | None = None,
+                       max_filesize: int | None = None) -> dict:
+    """
+    Завантажує медіа через yt-dlp (виконується в потоці).
+    yt-dlp пише файл шматками у .partial/ (з підтримкою докачування .part),
+    після завершення файл атомарно переноситься у сховище.
+    """
+    import yt_dlp  # важкий модуль - імпортується при першому завантаженні
+
+    partial_dir = _partial_dir()
+    partial_dir.mkdir(parents=True, exist_ok=True)
+
+    ydl_opts = {
+        'format': MEDIA_FORMATS[content_type],
+        'outtmpl': str(partial_dir / f"{key}.%(ext)s"),
+        'quiet': True,
+        'no_warnings': True,
+        'noplaylist': True,
+        'continuedl': True,
+    }
+    if ratelimit:
+        ydl_opts['ratelimit'] = ratelimit
+    if max_filesize:
+        # Більші файли yt-dlp пропускає (файл не створюється)
+        ydl_opts['max_filesize'] = max_filesize
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with stage_timer("ytdlp_download"):
+            info = ydl.extract_info(url, download=True)
+        downloaded = Path(ydl.prepare_filename(info))
+
+    if not downloaded.exists():
+        if max_filesize:
+            raise MediaDownloadError(f"Файл недоступний або більший за {max_filesize // (1024 * 1024)} MB: {url}")
+        raise MediaDownloadError(f"yt-dlp не створив файл для {url}")
+
+    target = MEDIA_STORE_DIR / downloaded.name
+    downloaded.replace(target)
+
+    meta = {
+        "url": canonicalize_url(url),
+        "type": content_type,
+        "file": target.name,
+        "title": info.get('title') or key,
+        "ext": info.get('ext') or target.suffix.lstrip('.'),
+        "size": target.stat().st_size,
+    }
+    # Метадані пишемо останніми: їх наявність означає завершене завантаження
+    meta_path = MEDIA_STORE_DIR / f"{key}.json"
+    tmp_meta_path = meta_path.with_suffix(".json.tmp")
+    tmp_meta_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    tmp_meta_path.replace(meta_path)
+    return meta
+
+
+async def _download(url: str, content_type: str, key: str, ratelimit: int | None,
+                    max_filesize: int | None) -> tuple[Path, dict]:
+    # Той самий файл інший воркер вже може завантажувати - тоді чекаємо на його результат
+    claim_key = f"media:{key}"
+    while not await claim_or_wait(claim_key, MEDIA_DOWNLOAD_LEASE_SECONDS):
+        stored = find_stored_media(url)
+        if stored:
+            return stored
+
+    try:
+        async with _download_slots, shared_slot("media", MEDIA_DOWNLOAD_CONCURRENCY, MEDIA_DOWNLOAD_LEASE_SECONDS):
+            logger.info("Завантаження медіа (%s): %s", content_type, url)
+            try:
+                meta = await asyncio.to_thread(
+                    _download_blocking, url, content_type, key, ratelimit, max_filesize
+                )
+            except MediaDownloadError:
+                raise
+            except Exception as e:
+                count_error("media_download")
+                raise MediaDownloadError(f"Не вдалося завантажити {url}: {e}") from e
+            logger.info("Медіа збережено: %s (%s байт)", meta['file'], meta['size'])
+            return MEDIA_STORE_DIR / meta["file"], meta
+    finally:
+        await release_claim(claim_key)
+
+
+async def ensure_media(url: str, content_type: str, ratelimit: int | None = None,
+                       max_filesize: int | None = None) -> tuple[Path, dict]:
+    """
+    Повертає (шлях, метадані) медіафайлу, завантажуючи його за потреби.
+    Одночасно виконується не більше MEDIA_DOWNLOAD_CONCURRENCY завантажень (на всі воркери);
+    паралельні запити того самого URL (і з інших воркерів) чекають на одне завантаження.
+    ratelimit - обмеження швидкості (байт/с) для yt-dlp.
+    max_filesize - максимальний розмір файлу (байт); більші файли не завантажуються.
+    """
+    if content_type not in MEDIA_FORMATS:
+        raise MediaDownloadError(f"Тип '{content_type}' не підтримує завантаження.")
+
+    stored = find_stored_media(url)
+    if stored:
+        return stored
+
+    # shield: якщо клієнт відключиться, завантаження для інших триває
+    return await asyncio.shield(_download_task(url, content_type, ratelimit, max_filesize))
+
+
+def _download_task(url: str, content_type: str, ratelimit: int | None,
+                   max_filesize: int | None) -> asyncio.Task:
+    """Задача завантаження URL: вже запущена або нова."""
+    key = media_key(url)
+    task = _in_progress.get(key)
+    if task is None:
+        MEDIA_STORE_DIR.mkdir(parents=True, exist_ok=True)
+        _failed.pop(key, None)
+        task = asyncio.create_task(_download(url, content_type, key, ratelimit, max_filesize))
+        _in_progress[key] = task
+        task.add_done_callback(lambda done: _finish_download(key, done))
+    return task
+
+
+def _finish_download(key: str, task: asyncio.Task):
+    _in_progress.pop(key, None)
+    error = None if task.cancelled() else task.exception()
+    if error is not None:
+        if len(_failed) >= _MAX_FAILED_ENTRIES:
+            _failed.pop(next(iter(_failed)))
+        _failed[key] = str(error)
+
+
+def start_media_download(url: str, content_type: str, max_filesize: int | None = None) -> str:
+    """
+    Запускає завантаження у фоні (якщо файлу ще немає) та повертає ключ медіа
+    для опитування стану через get_media_status.
+    """
+    if content_type not in MEDIA_FORMATS:
+        raise MediaDownloadError(f"Тип '{content_type}' не підтримує завантаження.")
+
+    key = media_key(url)
+    if not find_stored_media_by_key(key):
+        _download_task(url, content_type, None, max_filesize)
+    return key
+
+
+def get_media_status(key: str) -> tuple[str, str | None]:
+    """Стан завантаження за ключем: ("done" | "running" | "failed" | "unknown", помилка)."""
+    if find_stored_media_by_key(key):
+        return "done", None
+    if key in _in_progress:
+        return "running", None
+    if key in _failed:
+        return "failed", _failed[key]
+    return "unknown", None
+
+
+def get_media_download_stats() -> dict:
+    """Стан черги завантажень медіа."""
+    return {
+        "concurrency": MEDIA_DOWNLOAD_CONCURRENCY,
+        "in_progress": len(_in_progress),
+    }
@@ -0,0 +1,175 @@
+import os
+import hmac
+import time
+import asyncio
+import logging
+from typing import Callable
+
+import jinja2
+# config - до prometheus_client: режим кількох процесів вмикається PROMETHEUS_MULTIPROC_DIR (зокрема з .env)
+from config import PROMETHEUS_MULTIPROC_DIR, METRICS_REFRESH_SECONDS, METRICS_ALLOWED_IPS, METRICS_TOKEN
+from prometheus_client import (
+    Counter, Gauge, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# Межі гістограм (с): від швидких запитів до БД до повільного рендерингу сторінок
+_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 60)
+
+# --- Метрики ---
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Час обробки HTTP-запиту",
+    ["method", "route", "status"], buckets=_LATENCY_BUCKETS
+)
+# multiprocess_mode - як сумуються значення воркерів (з PROMETHEUS_MULTIPROC_DIR): livesum - лише живих процесів
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP-запити, що зараз обробляються", multiprocess_mode="livesum"
+)
+
+# stage: head_probe, range_probe, ytdlp_extract, ytdlp_download, playwright_goto,
+# playwright_pdf, knapsack_solve, db_query, template_render
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds", "Час виконання окремих етапів обробки",
+    ["stage"], buckets=_LATENCY_BUCKETS
+)
+# cache: blob, user, sniff, probe_negative; result: hit / miss
+CACHE_EVENTS = Counter("cache_events_total", "Звернення до кешів", ["cache", "result"])
+# kind: exact / estimated; method: head, range, yt-dlp, estimate...
+SIZE_RESULTS = Counter("size_results_total", "Отримані розміри матеріалів", ["type", "kind", "method"])
+ERRORS = Counter("errors_total", "Помилки за етапами", ["stage"])
+# pool: render, probe, solve; reason: queue_full / timeout
+ADMISSION_REJECTED = Counter("admission_rejected_total", "Запити, відхилені контролем допуску", ["pool", "reason"])
+
+OPEN_PAGES = Gauge("playwright_open_pages", "Відкриті сторінки Playwright", multiprocess_mode="livesum")
+QUEUE_DEPTH = Gauge("queue_depth", "Глибина внутрішніх черг", ["queue"], multiprocess_mode="livesum")
+
+# Черга -> функція, що повертає її глибину
+_queue_depths: dict[str, Callable[[], float]] = {}
+_refresh_task: asyncio.Task | None = None
+
+
+def stage_timer(stage: str):
+    """Контекстний менеджер: `with stage_timer("head_probe"): ...` (працює і в async-коді)."""
+    return STAGE_SECONDS.labels(stage).time()
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def count_cache(cache: str, hit: bool):
+    CACHE_EVENTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def count_error(stage: str):
+    ERRORS.labels(stage).inc()
+
+
+def count_size_result(content_type: str, is_estimated: bool, method: str | None):
+    SIZE_RESULTS.labels(content_type or "unknown", "estimated" if is_estimated else "exact", method or "unknown").inc()
+
+
+def register_queue(queue: str, get_depth):
+    """
+    Глибина черги зчитується функцією (без інструментування гарячого шляху): в момент збору метрик,
+    а з PROMETHEUS_MULTIPROC_DIR - кожні METRICS_REFRESH_SECONDS, бо /metrics віддає інший воркер.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        _queue_depths[queue] = get_depth
+    else:
+        QUEUE_DEPTH.labels(queue).set_function(get_depth)
+
+
+def _refresh_queue_depths():
+    for queue, get_depth in _queue_depths.items():
+        try:
+            QUEUE_DEPTH.labels(queue).set(get_depth())
+        except Exception as e:
+            logger.warning("Не вдалося отримати глибину черги %s: %s", queue, e)
+
+
+async def _refresh_loop():
+    while True:
+        _refresh_queue_depths()
+        await asyncio.sleep(METRICS_REFRESH_SECONDS)
+
+
+async def start_metrics():
+    """Запускає оновлення глибини черг у спільних файлах метрик (лише з PROMETHEUS_MULTIPROC_DIR)."""
+    global _refresh_task
+    if PROMETHEUS_MULTIPROC_DIR and _queue_depths:
+        _refresh_task = asyncio.create_task(_refresh_loop())
+
+
+async def stop_metrics():
+    """
+    Зупиняє оновлення черг і позначає процес завершеним:
+    його livesum-значення (запити в обробці, черги) більше не входять у суму.
+    """
+    global _refresh_task
+    if _refresh_task:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Час кожного SQL-запиту через події SQLAlchemy."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._query_started_at = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        observe_stage("db_query", time.perf_counter() - context._query_started_at)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        count_error("db_query")
+
+
+class _TimedTemplate(jinja2.Template):
+    """Шаблон Jinja2, що вимірює час рендерингу."""
+
+    def render(self, *args, **kwargs):
+        with stage_timer("template_render"):
+            return super().render(*args, **kwargs)
+
+
+def instrument_templates(templates):
+    """Підміняє клас шаблонів у середовищі Jinja2Templates (до першого завантаження шаблону)."""
+    templates.env.template_class = _TimedTemplate
+
+
+def is_metrics_access_allowed(client_host: str | None, authorization: str | None) -> bool:
+    """/metrics - лише з METRICS_ALLOWED_IPS і, якщо задано METRICS_TOKEN, з правильним Bearer-токеном."""
+    if "*" not in METRICS_ALLOWED_IPS and client_host not in METRICS_ALLOWED_IPS:
+        return False
+    if METRICS_TOKEN:
+        scheme, _, token = (authorization or "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), METRICS_TOKEN.encode())
+    return True
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Поточні метрики у текстовому форматі Prometheus.
+    З PROMETHEUS_MULTIPROC_DIR - зведені з файлів усіх воркерів (один scrape target на хост).
+    """
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest(), CONTENT_TYPE_LATEST
+
+    _refresh_queue_depths()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,8 +1,21 @@
-def solve_knapsack_problem(items_to_optimize: list, mb_limit_str: str) -> (list, str | None):
+import time
+
+from config import KNAPSACK_MAX_NODES, KNAPSACK_TIME_LIMIT_SECONDS
+from services.metrics import observe_stage
+
+
+def solve_knapsack_problem(items_to_optimize: list, mb_limit_str: str, stats: dict | None = None) -> (list, str | None):
     """
-    Виконує алгоритм рюкзака (Метод гілок та меж).
+    Виконує алгоритм рюкзака (Метод гілок та меж, ітеративно).
+    Перебір обмежений KNAPSACK_MAX_NODES вузлами та KNAPSACK_TIME_LIMIT_SECONDS:
+    після вичерпання бюджету повертається найкращий знайдений набір (не гірший за жадібний).
     Повертає (список_оптимізованих_елементів, повідомлення_про_помилку)
+    Якщо передано словник stats, він заповнюється статистикою розв'язувача:
+    candidates (елементи в переборі), free_items, nodes_visited, duration_ms,
+    exhaustive (False - перебір зупинено бюджетом).
     """
+    started_at = time.perf_counter()
+    nodes_visited = 0
     try:
         mb_limit = float(mb_limit_str)
         processed_items = []
@@ -12,6 +25,7 @@ def solve_knapsack_problem(items_to_optimize: list, mb_limit_str: str) -> (list,
             size = item.get('size_mb', 0.0)
             value = item.get('weight', 0)
 
+            if size is None: continue  # Розмір невідомий - не можемо гарантувати ліміт
             if value <= 0 or size < 0: continue  # Ігноруємо безцінні або "негативні"
             if size == 0.0:
                 free_items_indices.add(i)  # Додаємо "безкоштовні"
@@ -26,8 +40,17 @@ def solve_knapsack_problem(items_to_optimize: list, mb_limit_str: str) -> (list,
         # --- Сам Алгоритм ---
         processed_items.sort(key=lambda x: x['density'], reverse=True)
         n = len(processed_items)
+
+        # Початковий рекорд - жадібний набір: з ним гілки відсікаються раніше,
+        # і він же повертається, якщо перебір не вкладеться в бюджет
         Vbest = 0.0  # Найкраща знайдена цінність
         best_selection_indices = set()  # Індекси найкращого набору
+        greedy_size = 0.0
+        for item in processed_items:
+            if greedy_size + item['size'] <= mb_limit:
+                greedy_size += item['size']
+                Vbest += item['value']
+                best_selection_indices.add(item['original_index'])
 
         def calculate_bound(node_index: int, current_value: float, current_size: float) -> float:
             """Розраховує верхню межу (bound) для вузла."""
@@ -45,45 +68,42 @@ def solve_knapsack_problem(items_to_optimize: list, mb_limit_str: str) -> (list,
                     break
             return bound
 
-        def solve_knapsack(node_index: int, current_value: float, current_size: float,
-                           current_selection_indices: list):
-            """Рекурсивна функція вирішення."""
-            nonlocal Vbest, best_selection_indices
+        # Перебір без рекурсії (глибина дорівнює кількості елементів).
+        # Вузол: (індекс, цінність, розмір, обрані) - обрані як зв'язний список (індекс, батько)
+        deadline = started_at + KNAPSACK_TIME_LIMIT_SECONDS
+        exhaustive = True
+        stack = [(0, 0.0, 0.0, None)]
+        while stack:
+            if nodes_visited >= KNAPSACK_MAX_NODES or (
+                    nodes_visited % 1024 == 0 and time.perf_counter() > deadline):
+                exhaustive = False
+                break
+            node_index, current_value, current_size, selection = stack.pop()
+            nodes_visited += 1
 
             if node_index == n:  # Дійшли до кінця гілки
                 if current_value > Vbest:
                     Vbest = current_value
-                    best_selection_indices = set(current_selection_indices)
-                return
+                    best_selection_indices = set()
+                    while selection is not None:
+                        best_selection_indices.add(selection[0])
+                        selection = selection[1]
+                continue
 
             # --- Відсікання (Pruning) ---
-            bound = calculate_bound(node_index, current_value, current_size)
-            if bound <= Vbest:
-                return  # Ця гілка не дасть кращого результату
+            if calculate_bound(node_index, current_value, current_size) <= Vbest:
+                continue  # Ця гілка не дасть кращого результату
 
             item = processed_items[node_index]
-
-            # 1. Гілка "Взяти елемент" (якщо він влазить)
+            # Гілка "Не брати елемент" - у стек першою, щоб спершу перевірялась гілка "Взяти"
+            stack.append((node_index + 1, current_value, current_size, selection))
             if current_size + item['size'] <= mb_limit:
-                current_selection_indices.append(item['original_index'])
-                solve_knapsack(
+                stack.append((
                     node_index + 1,
                     current_value + item['value'],
                     current_size + item['size'],
-                    current_selection_indices
-                )
-                current_selection_indices.pop()  # Backtrack
-
-            # 2. Гілка "Не брати елемент"
-            solve_knapsack(
-                node_index + 1,
-                current_value,
-                current_size,
-                current_selection_indices
-            )
-
-        # Запуск рекурсії
-        solve_knapsack(0, 0.0, 0.0, [])
+                    (item['original_index'], selection)
+                ))
 
         # --- Формування результату ---
         # Об'єднуємо обрані елементи та "безкоштовні"
@@ -91,6 +111,17 @@ def solve_knapsack_problem(items_to_optimize: list, mb_limit_str: str) -> (list,
 
         optimized_results = [items_to_optimize[i] for i in final_indices]
 
+        duration = time.perf_counter() - started_at
+        observe_stage("knapsack_solve", duration)
+        if stats is not None:
+            stats.update({
+                "candidates": n,
+                "free_items": len(free_items_indices),
+                "nodes_visited": nodes_visited,
+                "duration_ms": round(duration * 1000, 3),
+                "exhaustive": exhaustive,
+            })
+
         return optimized_results, None
 
     except Exception as e:
@@ -0,0 +1,159 @@
+import time
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from config import (
+    PROBE_NEGATIVE_TTL_SECONDS, PROBE_NEGATIVE_MAX_TTL_SECONDS, PROBE_NEGATIVE_CACHE_SIZE,
+    PROBE_BREAKER_THRESHOLD, PROBE_BREAKER_COOLDOWN_SECONDS, PROBE_BREAKER_MAX_COOLDOWN_SECONDS,
+    PROBE_BREAKER_TRIAL_TIMEOUT_SECONDS
+)
+from services.metrics import count_cache, count_error
+from services.url_canonicalizer import canonicalize_url
+
+# Стани запобіжника хоста
+CLOSED = 'closed'        # проби дозволені
+OPEN = 'open'            # проби одразу пропускаються до закінчення паузи
+HALF_OPEN = 'half_open'  # пауза минула - дозволена одна пробна спроба
+
+
+class ProbeSuppressed(Exception):
+    """Проба пропущена: URL у негативному кеші або хост тимчасово вимкнено."""
+
+
+class ProbeFailure(Exception):
+    """
+    Проба не вдалася.
+    host_failure=True - проблема з хостом (таймаут, з'єднання, 5xx), а не лише з URL.
+    """
+
+    def __init__(self, message: str, host_failure: bool = True):
+        super().__init__(message)
+        self.host_failure = host_failure
+
+
+# --- Глобальний стан (проби виконуються в робочих потоках) ---
+_lock = threading.Lock()
+# Канонічний URL -> (час, до якого пробу пропускаємо, кількість невдач поспіль)
+_negative_cache: OrderedDict[str, tuple[float, int]] = OrderedDict()
+# Хост -> {"state", "failures", "retry_at", "cooldown", "trial_started"}
+_breakers: dict[str, dict] = {}
+_stats = {"negative_hits": 0, "breaker_short_circuits": 0, "failures": 0}
+
+
+def _host(url: str) -> str:
+    try:
+        return (urlsplit(url).hostname or '').lower()
+    except ValueError:
+        return ''
+
+
+def check_probe_allowed(url: str):
+    """
+    Піднімає ProbeSuppressed, якщо пробувати URL зараз не варто.
+    Якщо пауза відкритого запобіжника минула, пропускає одну пробну спробу (half-open).
+    Пробна спроба без результату довше PROBE_BREAKER_TRIAL_TIMEOUT_SECONDS
+    вважається невдалою: запобіжник знову розмикається.
+    """
+    now = time.monotonic()
+    key = canonicalize_url(url)
+    with _lock:
+        entry = _negative_cache.get(key)
+        if entry and entry[0] > now:
+            _stats["negative_hits"] += 1
+            count_cache("probe_negative", hit=True)
+            raise ProbeSuppressed(f"URL у негативному кеші ще {round(entry[0] - now)} с: {url}")
+
+        breaker = _breakers.get(_host(url))
+        if breaker is None or breaker["state"] == CLOSED:
+            return
+        if breaker["state"] == HALF_OPEN and breaker["trial_started"] + PROBE_BREAKER_TRIAL_TIMEOUT_SECONDS <= now:
+            _reopen(breaker, now)
+        if breaker["state"] == OPEN and breaker["retry_at"] <= now:
+            breaker["state"] = HALF_OPEN
+            breaker["trial_started"] = now
+            return
+        _stats["breaker_short_circuits"] += 1
+        raise ProbeSuppressed(f"Хост {_host(url)} тимчасово вимкнено (запобіжник: {breaker['state']}).")
+
+
+def _reopen(breaker: dict, now: float):
+    """Пробна спроба не вдалася - знову розмикаємо з подвоєною паузою (викликати під _lock)."""
+    breaker["cooldown"] = min(breaker["cooldown"] * 2, PROBE_BREAKER_MAX_COOLDOWN_SECONDS)
+    breaker["state"] = OPEN
+    breaker["retry_at"] = now + breaker["cooldown"]
+
+
+def abandon_probe_trial(url: str):
+    """
+    Проба перервана без результату (скасування запиту): якщо це була пробна спроба,
+    запобіжник повертається в OPEN без нової паузи - наступна проба стане новою пробною.
+    """
+    with _lock:
+        breaker = _breakers.get(_host(url))
+        if breaker is not None and breaker["state"] == HALF_OPEN:
+            breaker["state"] = OPEN
+            breaker["retry_at"] = time.monotonic()
+
+
+def record_probe_success(url: str):
+    """Скидає негативний кеш URL та замикає запобіжник хоста."""
+    with _lock:
+        _negative_cache.pop(canonicalize_url(url), None)
+        _breakers.pop(_host(url), None)
+
+
+def record_probe_failure(url: str, host_failure: bool = True):
+    """
+    Запам'ятовує невдачу: URL - у негативний кеш з експоненційною паузою;
+    при невдачі хоста - рахує її для запобіжника.
+    """
+    now = time.monotonic()
+    key = canonicalize_url(url)
+    with _lock:
+        _stats["failures"] += 1
+        count_error("probe")
+
+        failures = _negative_cache.pop(key, (0, 0))[1] + 1
+        ttl = min(PROBE_NEGATIVE_TTL_SECONDS * 2 ** (failures - 1), PROBE_NEGATIVE_MAX_TTL_SECONDS)
+        _negative_cache[key] = (now + ttl, failures)
+        if len(_negative_cache) > PROBE_NEGATIVE_CACHE_SIZE:
+            _negative_cache.popitem(last=False)
+
+        host = _host(url)
+        breaker = _breakers.get(host)
+        if breaker is not None and breaker["state"] == HALF_OPEN:
+            # Невдала пробна спроба (будь-якого роду) знову розмикає запобіжник
+            breaker["failures"] += 1
+            _reopen(breaker, now)
+            return
+        if not host_failure:
+            return
+
+        if breaker is None:
+            breaker = _breakers[host] = {
+                "state": CLOSED, "failures": 0, "retry_at": 0.0, "cooldown": 0.0, "trial_started": 0.0
+            }
+        breaker["failures"] += 1
+        if breaker["failures"] >= PROBE_BREAKER_THRESHOLD:
+            breaker["cooldown"] = PROBE_BREAKER_COOLDOWN_SECONDS
+            breaker["state"] = OPEN
+            breaker["retry_at"] = now + breaker["cooldown"]
+
+
+def get_probe_guard_stats() -> dict:
+    """Стан негативного кешу та запобіжників (для /api/stats)."""
+    now = time.monotonic()
+    with _lock:
+        return {
+            **_stats,
+            "negative_cache_size": sum(1 for retry_at, _ in _negative_cache.values() if retry_at > now),
+            "breakers": {
+                host: {
+                    "state": breaker["state"],
+                    "failures": breaker["failures"],
+                    "retry_in_seconds": max(round(breaker["retry_at"] - now, 1), 0.0),
+                }
+                for host, breaker in _breakers.items()
+            },
+        }
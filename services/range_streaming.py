@@ -0,0 +1,87 @@
+import re
+import mimetypes
+from pathlib import Path
+from urllib.parse import quote
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+
+from config import STREAM_CHUNK_SIZE
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range_header(range_header: str | None, file_size: int) -> tuple[int, int] | None:
+    """
+    Розбирає заголовок Range (лише один діапазон).
+    Повертає (початок, кінець включно) або None, якщо Range не передано.
+    Для діапазону за межами файлу піднімає 416.
+    """
+    if not range_header:
+        return None
+
+    match = _RANGE_RE.match(range_header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        # Некоректний або складений (кілька діапазонів) Range - віддаємо весь файл
+        return None
+
+    start_str, end_str = match.groups()
+    if start_str == "":
+        # bytes=-N - останні N байтів
+        start = max(file_size - int(end_str), 0)
+        end = file_size - 1
+    else:
+        start = int(start_str)
+        end = min(int(end_str), file_size - 1) if end_str else file_size - 1
+
+    if start >= file_size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    return start, end
+
+
+def _read_chunks(path: Path, start: int, length: int):
+    """Синхронний генератор (Starlette виконує його в пулі потоків)."""
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = file.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def stream_file(path: Path, range_header: str | None, filename: str,
+                media_type: str | None = None) -> StreamingResponse:
+    """
+    Віддає файл шматками з підтримкою HTTP Range (докачування).
+    Файл ніколи не завантажується в пам'ять повністю.
+    """
+    file_size = path.stat().st_size
+    byte_range = parse_range_header(range_header, file_size)
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+    }
+    if byte_range:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    else:
+        start, end = 0, file_size - 1
+        status_code = status.HTTP_200_OK
+
+    length = end - start + 1
+    headers["Content-Length"] = str(length)
+
+    return StreamingResponse(
+        _read_chunks(path, start, length),
+        status_code=status_code,
+        media_type=media_type or mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        headers=headers
+    )
@@ -0,0 +1,59 @@
+import hashlib
+import logging
+
+from sqlalchemy import MetaData, delete, insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.future import select
+
+from config import SCHEMA_VERSION_CHECK
+from database import Base
+from models import SchemaVersion
+
+logger = logging.getLogger(__name__)
+
+
+def schema_fingerprint(metadata: MetaData) -> str:
+    """
+    SHA-256 опису моделей: таблиці, колонки (тип, NULL, ключі) та індекси.
+    Змінюється при будь-якій зміні моделей, що впливає на create_all.
+    """
+    parts = []
+    for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+        parts.append(f"table:{table.name}")
+        for column in table.columns:
+            foreign_keys = sorted(fk.target_fullname for fk in column.foreign_keys)
+            parts.append(
+                f"column:{column.name}:{column.type!r}:{column.nullable}:{column.primary_key}:"
+                f"{column.unique}:{foreign_keys}"
+            )
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            parts.append(f"index:{index.name}:{[column.name for column in index.columns]}:{index.unique}")
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+async def _stored_versions(engine: AsyncEngine) -> list[str]:
+    """Збережені версії; порожній список, якщо таблиці версій ще немає."""
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(select(SchemaVersion.Version))
+            return list(result.scalars().all())
+    except DBAPIError:
+        return []
+
+
+async def ensure_schema(engine: AsyncEngine) -> bool:
+    """
+    Створює таблиці, яких немає (create_all), лише якщо версія схеми змінилась.
+    Повертає True, якщо create_all виконувався.
+    """
+    version = schema_fingerprint(Base.metadata)
+    if SCHEMA_VERSION_CHECK and version in await _stored_versions(engine):
+        return False
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(delete(SchemaVersion))
+        await conn.execute(insert(SchemaVersion).values(Version=version))
+    logger.info("Версію схеми БД оновлено: %s", version[:12])
+    return True
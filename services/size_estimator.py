@@ -0,0 +1,125 @@
+import math
+from urllib.parse import urlsplit
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config import (
+    ESTIMATED_PDF_MB, ESTIMATED_SPOTIFY_MB, ESTIMATED_VIDEO_MB,
+    ESTIMATED_AUDIO_MB, SIZE_ESTIMATOR_MIN_SAMPLES
+)
+from models import SizeStat
+
+_MB = 1024 * 1024
+
+# Початкові оцінки, поки для типу не накопичено статистики
+DEFAULT_ESTIMATES_MB = {
+    'video': ESTIMATED_VIDEO_MB,
+    'audio_yt_music': ESTIMATED_AUDIO_MB,
+    'audio_spotify': ESTIMATED_SPOTIFY_MB,
+}
+
+ALL_DOMAINS = ''
+
+
+def size_domain(url: str) -> str:
+    """Домен для статистики (без www. та порту)."""
+    try:
+        host = (urlsplit(url).hostname or '').lower()
+    except ValueError:
+        return ALL_DOMAINS
+    return host[4:] if host.startswith('www.') else host
+
+
+def default_estimate_mb(content_type: str) -> float:
+    return DEFAULT_ESTIMATES_MB.get(content_type, ESTIMATED_PDF_MB)
+
+
+def bitrate_size_bytes(duration: float | None, tbr: float | None) -> int | None:
+    """Розмір медіа за тривалістю (с) та загальним бітрейтом yt-dlp (tbr, кбіт/с)."""
+    if not duration or not tbr:
+        return None
+    return int(duration * tbr * 1024 / 8)
+
+
+async def _load_stats(db: AsyncSession, content_type: str, domain: str) -> dict[str, SizeStat]:
+    """Рядки статистики домену та зведений рядок типу - одним запитом за первинним ключем."""
+    result = await db.execute(
+        select(SizeStat).where(
+            SizeStat.Type == content_type,
+            SizeStat.Domain.in_({domain, ALL_DOMAINS})
+        ).execution_options(populate_existing=True)
+    )
+    return {row.Domain: row for row in result.scalars().all()}
+
+
+async def estimate_size_mb(db: AsyncSession, content_type: str, url: str,
+                           duration: float | None = None) -> float:
+    """
+    Оцінює розмір матеріалу, коли точний розмір отримати не вдалося.
+    Порядок: тривалість x середній байтрейт (для медіа) -> середній розмір
+    на домені -> середній розмір типу -> початкова оцінка з config.py.
+    Середній розмір рахується як середнє геометричне (розміри файлів
+    мають дуже нерівномірний розподіл, і кілька великих не спотворюють оцінку).
+    """
+    domain = size_domain(url)
+    stats = await _load_stats(db, content_type, domain)
+    candidates = [stats.get(domain), stats.get(ALL_DOMAINS)]
+
+    if duration:
+        for row in candidates:
+            if row and row.RateSampleCount >= SIZE_ESTIMATOR_MIN_SAMPLES:
+                return round(duration * row.SumRate / row.RateSampleCount / _MB, 2)
+
+    for row in candidates:
+        if row and row.SampleCount >= SIZE_ESTIMATOR_MIN_SAMPLES:
+            return round(math.exp(row.SumLogSize / row.SampleCount) / _MB, 2)
+
+    return default_estimate_mb(content_type)
+
+
+async def record_size_sample(db: AsyncSession, content_type: str, url: str, size_bytes: int,
+                             duration: float | None = None):
+    """
+    Додає виміряний розмір до статистики домену та типу (без commit).
+    Оновлення інкрементне (SampleCount + 1, SumLogSize + ln(розмір)),
+    тому оцінка не потребує перегляду таблиці Materials.
+    """
+    if not size_bytes or size_bytes <= 0:
+        return
+
+    values = {
+        "SampleCount": SizeStat.SampleCount + 1,
+        "SumLogSize": SizeStat.SumLogSize + math.log(size_bytes),
+    }
+    if duration and duration > 0:
+        values["RateSampleCount"] = SizeStat.RateSampleCount + 1
+        values["SumRate"] = SizeStat.SumRate + size_bytes / duration
+
+    for domain in {size_domain(url), ALL_DOMAINS}:
+        await _increment(db, content_type, domain, values)
+
+
+async def _increment(db: AsyncSession, content_type: str, domain: str, values: dict):
+    """UPDATE існуючого рядка; якщо його немає - INSERT (з повтором UPDATE при конфлікті)."""
+    statement = (
+        update(SizeStat)
+        .where(SizeStat.Type == content_type, SizeStat.Domain == domain)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(statement)
+    if result.rowcount:
+        return
+
+    try:
+        async with db.begin_nested():
+            db.add(SizeStat(
+                Type=content_type, Domain=domain,
+                SampleCount=0, SumLogSize=0.0, RateSampleCount=0, SumRate=0.0
+            ))
+    except IntegrityError:
+        pass  # Рядок щойно створено паралельно
+    await db.execute(statement)
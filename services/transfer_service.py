@@ -0,0 +1,347 @@
+import io
+import csv
+import json
+import codecs
+import asyncio
+import logging
+from datetime import datetime
+from typing import AsyncIterator, BinaryIO, Iterator
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config import EXPORT_BATCH_SIZE, IMPORT_BATCH_SIZE
+from database import async_session_factory
+from models import User, Material, BookmarkFolder, Bookmark, HistoryMaterial
+from services.bookmark_service import get_or_create_material_ids
+from services.url_canonicalizer import canonicalize_url
+from services.url_classifier import classify_url
+
+logger = logging.getLogger(__name__)
+
+# Формати файлів: CSV (з BOM, щоб Excel правильно показував кирилицю) та JSON Lines
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+}
+HISTORY_COLUMNS = ("load_date", "url", "type", "size")
+BOOKMARK_COLUMNS = ("folder", "name", "url", "type", "size", "created")
+
+# SQL Server обмежує запит 2100 параметрами та 1000 рядками у VALUES
+_INSERT_CHUNK_SIZE = 500
+_MAX_URL_LENGTH = 2048
+_MAX_NAME_LENGTH = 255
+# Скільки байтів початку файлу перевіряти, щоб обрати кодування (UTF-8 або cp1251 від Excel)
+_ENCODING_SAMPLE_BYTES = 64 * 1024
+
+
+class ImportFailed(Exception):
+    """
+    Файл імпорту не вдалося дочитати (кодування, зламаний CSV).
+    added - скільки записів імпортовано до помилки, row - номер запису з помилкою (з 1).
+    """
+
+    def __init__(self, message: str, row: int, added: int = 0):
+        super().__init__(message)
+        self.row = row
+        self.added = added
+
+
+# --- Експорт ---
+
+def export_format(value: str | None, filename: str | None = None) -> str:
+    """Формат за параметром або розширенням файлу; за замовчуванням CSV."""
+    if value in EXPORT_FORMATS:
+        return value
+    if filename and filename.lower().endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    return "csv"
+
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _format_rows(rows, columns: tuple[str, ...], fmt: str) -> str:
+    """Пачка рядків одним шматком відповіді."""
+    if fmt == "jsonl":
+        return "".join(
+            json.dumps(dict(zip(columns, map(_serialize, row))), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([["" if value is None else _serialize(value) for value in row] for row in rows])
+    return buffer.getvalue()
+
+
+async def _stream_export(query, columns: tuple[str, ...], fmt: str) -> AsyncIterator[str]:
+    """
+    Віддає результат запиту пачками по EXPORT_BATCH_SIZE рядків через серверний курсор:
+    у пам'яті лише одна пачка (кортежі, без ORM-об'єктів), незалежно від розміру експорту.
+    Власна сесія БД: StreamingResponse читає генератор вже після завершення залежностей запиту.
+    """
+    if fmt == "csv":
+        yield "\ufeff" + _format_rows([columns], columns, fmt)
+
+    async with async_session_factory() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield _format_rows(rows, columns, fmt)
+
+
+def export_history(user: User, fmt: str) -> AsyncIterator[str]:
+    """Уся історія користувача (старіші спочатку) у форматі fmt."""
+    query = (
+        select(HistoryMaterial.LoadDate, Material.URL, Material.Type, Material.Size)
+        .join(Material, Material.MaterialID == HistoryMaterial.MaterialID)
+        .where(HistoryMaterial.UserID == user.UserID)
+        .order_by(HistoryMaterial.LoadDate, HistoryMaterial.HistoryID)
+    )
+    return _stream_export(query, HISTORY_COLUMNS, fmt)
+
+
+def export_bookmarks(user: User, fmt: str) -> AsyncIterator[str]:
+    """
+    Усі папки та закладки користувача у форматі fmt.
+    Порожня папка експортується рядком без URL (щоб імпорт відновив і її).
+    """
+    query = (
+        select(
+            BookmarkFolder.Name, Bookmark.Name, Material.URL, Material.Type, Material.Size,
+            Bookmark.CreationDate
+        )
+        .outerjoin(Bookmark, Bookmark.FolderID == BookmarkFolder.FolderID)
+        .outerjoin(Material, Material.MaterialID == Bookmark.MaterialID)
+        .where(BookmarkFolder.UserID == user.UserID)
+        .order_by(BookmarkFolder.FolderID, Bookmark.BookmarkID)
+    )
+    return _stream_export(query, BOOKMARK_COLUMNS, fmt)
+
+
+# --- Імпорт ---
+
+def _detect_encoding(file: BinaryIO) -> str:
+    """UTF-8, якщо початок файлу ним декодується, інакше cp1251 (CSV, збережений Excel)."""
+    sample = file.read(_ENCODING_SAMPLE_BYTES)
+    file.seek(0)
+    try:
+        # final=False: обрізаний на межі вибірки багатобайтовий символ - не помилка
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return "cp1251"
+    return "utf-8"
+
+
+def _text_lines(file: BinaryIO) -> Iterator[str]:
+    """
+    Рядки файлу як текст. Декодується кожен рядок окремо (а не блоками, як у TextIOWrapper),
+    тож помилка кодування виникає саме на зламаному рядку, а попередні вже прочитані.
+    """
+    encoding = _detect_encoding(file)
+    for number, line in enumerate(file):
+        text = line.decode(encoding)
+        yield text.removeprefix("\ufeff") if number == 0 else text
+
+
+def _read_rows(file: BinaryIO, fmt: str) -> Iterator[dict]:
+    """Рядки файлу імпорту як словники (файл читається потоково, некоректні рядки JSON пропускаються)."""
+    text = _text_lines(file)
+    if fmt == "csv":
+        yield from csv.DictReader(text)
+        return
+    for line in text:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(row, dict):
+            yield row
+
+
+async def _read_batches(file: BinaryIO, fmt: str) -> AsyncIterator[list[dict]]:
+    """
+    Пачки по IMPORT_BATCH_SIZE рядків; читання файлу - в потоці (він може лежати на диску).
+    Якщо файл далі не читається, віддається прочитана частина пачки, потім ImportFailed.
+    """
+    rows = _read_rows(file, fmt)
+
+    def read_batch() -> tuple[list[dict], Exception | None]:
+        batch = []
+        try:
+            while len(batch) < IMPORT_BATCH_SIZE:
+                batch.append(next(rows))
+        except StopIteration:
+            pass
+        except (UnicodeDecodeError, csv.Error) as e:
+            return batch, e
+        return batch, None
+
+    read = 0
+    while True:
+        batch, error = await asyncio.to_thread(read_batch)
+        read += len(batch)
+        if batch:
+            yield batch
+        if error is not None:
+            raise ImportFailed(str(error), row=read + 1)
+        if len(batch) < IMPORT_BATCH_SIZE:
+            return
+
+
+def _clean_str(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def _parse_date(value) -> datetime | None:
+    try:
+        parsed = datetime.fromisoformat(_clean_str(value))
+    except ValueError:
+        return None
+    # У БД - локальний час без часового поясу (як func.now())
+    return parsed.astimezone().replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+def _material_fields(row: dict) -> tuple[str, str] | None:
+    """(url, тип) рядка імпорту; None - рядок без коректного URL."""
+    url = _clean_str(row.get("url"))
+    if not url.startswith(("http://", "https://")) or len(url) > _MAX_URL_LENGTH:
+        return None
+    return url, _clean_str(row.get("type"))[:50] or classify_url(url)
+
+
+async def import_history(db: AsyncSession, user: User, file: BinaryIO, fmt: str) -> tuple[int, int]:
+    """
+    Імпортує історію пачками: upsert матеріалів, потім багаторядковий INSERT
+    лише тих подій (матеріал, LoadDate), яких ще немає - повторний імпорт не дублює записи.
+    Рядки без коректного load_date пропускаються: з поточним часом замість дати
+    повторний імпорт того самого файлу щоразу додавав би нові записи.
+    Кожна пачка - окрема транзакція. Повертає (додано, пропущено);
+    якщо файл не вдалося дочитати - ImportFailed з кількістю вже доданих записів.
+    """
+    added = skipped = 0
+    try:
+        async for batch in _read_batches(file, fmt):
+            events = []
+            for row in batch:
+                material = _material_fields(row)
+                load_date = _parse_date(row.get("load_date"))
+                if material is None or load_date is None:
+                    skipped += 1
+                    continue
+                events.append((*material, load_date))
+            if not events:
+                continue
+
+            material_ids = await get_or_create_material_ids(
+                db, [(url, type_str) for url, type_str, _ in events], commit=False
+            )
+            keys = {(material_ids[canonicalize_url(url)], load_date) for url, _, load_date in events}
+            existing = set((await db.execute(
+                select(HistoryMaterial.MaterialID, HistoryMaterial.LoadDate).where(
+                    HistoryMaterial.UserID == user.UserID,
+                    HistoryMaterial.MaterialID.in_({material_id for material_id, _ in keys}),
+                    HistoryMaterial.LoadDate.in_({load_date for _, load_date in keys})
+                )
+            )).all())
+
+            rows = [
+                {"UserID": user.UserID, "MaterialID": material_id, "LoadDate": load_date}
+                for material_id, load_date in keys - existing
+            ]
+            for start in range(0, len(rows), _INSERT_CHUNK_SIZE):
+                await db.execute(insert(HistoryMaterial).values(rows[start:start + _INSERT_CHUNK_SIZE]))
+            await db.commit()
+            added += len(rows)
+            skipped += len(events) - len(rows)
+    except ImportFailed as e:
+        e.added = added
+        raise
+
+    logger.info("Імпорт історії [User: %s]: додано %d, пропущено %d", user.UserID, added, skipped)
+    return added, skipped
+
+
+async def _resolve_folder_ids(db: AsyncSession, user: User, names: set[str], folder_ids: dict[str, int]):
+    """Знаходить папки користувача за назвою та створює відсутні (folder_ids доповнюється)."""
+    missing = names - folder_ids.keys()
+    if not missing:
+        return
+    result = await db.execute(
+        select(BookmarkFolder.Name, BookmarkFolder.FolderID)
+        .where(BookmarkFolder.UserID == user.UserID, BookmarkFolder.Name.in_(missing))
+        .order_by(BookmarkFolder.FolderID.desc())  # Однакові назви - береться найстаріша папка
+    )
+    folder_ids.update(result.all())
+
+    new_folders = [BookmarkFolder(UserID=user.UserID, Name=name) for name in missing if name not in folder_ids]
+    if new_folders:
+        db.add_all(new_folders)
+        await db.flush()
+        folder_ids.update({folder.Name: folder.FolderID for folder in new_folders})
+
+
+async def import_bookmarks(db: AsyncSession, user: User, file: BinaryIO, fmt: str) -> tuple[int, int]:
+    """
+    Імпортує папки та закладки пачками: папки шукаються за назвою (відсутні створюються),
+    матеріали - upsert, закладки вставляються багаторядковим INSERT, якщо цього матеріалу
+    ще немає в папці. Кожна пачка - окрема транзакція. Повертає (додано закладок, пропущено);
+    якщо файл не вдалося дочитати - ImportFailed з кількістю вже доданих закладок.
+    """
+    added = skipped = 0
+    folder_ids: dict[str, int] = {}
+    try:
+        async for batch in _read_batches(file, fmt):
+            items = []
+            folder_names = set()
+            for row in batch:
+                folder = _clean_str(row.get("folder"))[:_MAX_NAME_LENGTH]
+                if not folder:
+                    skipped += 1
+                    continue
+                folder_names.add(folder)
+                material = _material_fields(row)
+                if material is None:
+                    if _clean_str(row.get("url")):
+                        skipped += 1
+                    continue  # Рядок порожньої папки
+                url, type_str = material
+                name = _clean_str(row.get("name"))[:_MAX_NAME_LENGTH] or url[:_MAX_NAME_LENGTH]
+                items.append((folder, url, type_str, name))
+
+            await _resolve_folder_ids(db, user, folder_names, folder_ids)
+            material_ids = await get_or_create_material_ids(
+                db, [(url, type_str) for _, url, type_str, _ in items], commit=False
+            )
+
+            bookmarks: dict[tuple[int, int], str] = {}
+            for folder, url, _, name in items:
+                bookmarks.setdefault((folder_ids[folder], material_ids[canonicalize_url(url)]), name)
+            existing = set()
+            if bookmarks:
+                # Пари (папка, матеріал) перевіряються в Python: SQL Server не підтримує IN для кортежів
+                existing = set((await db.execute(
+                    select(Bookmark.FolderID, Bookmark.MaterialID).where(
+                        Bookmark.FolderID.in_({folder_id for folder_id, _ in bookmarks}),
+                        Bookmark.MaterialID.in_({material_id for _, material_id in bookmarks})
+                    )
+                )).all())
+
+            rows = [
+                {"FolderID": folder_id, "MaterialID": material_id, "Name": name}
+                for (folder_id, material_id), name in bookmarks.items() if (folder_id, material_id) not in existing
+            ]
+            for start in range(0, len(rows), _INSERT_CHUNK_SIZE):
+                await db.execute(insert(Bookmark).values(rows[start:start + _INSERT_CHUNK_SIZE]))
+            await db.commit()
+            added += len(rows)
+            skipped += len(items) - len(rows)
+    except ImportFailed as e:
+        e.added = added
+        raise
+
+    logger.info("Імпорт закладок [User: %s]: додано %d, пропущено %d", user.UserID, added, skipped)
+    return added, skipped
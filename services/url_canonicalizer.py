@@ -0,0 +1,131 @@
+import re
+import hashlib
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from config import URL_CLASSIFIER_CACHE_SIZE
+
+# Параметри, які не змінюють вміст сторінки (трекінг, реферали)
+_TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'igshid',
+    'mc_cid', 'mc_eid', '_ga', '_gl', 'ref_src', 'ref_url',
+}
+_TRACKING_PREFIXES = ('utm_',)
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Хости YouTube, які ведуть на те саме відео
+_YOUTUBE_HOSTS = {'youtube.com', 'www.youtube.com', 'm.youtube.com'}
+_YOUTUBE_PATH_ID = re.compile(r"^/(shorts|embed|live|v)/([\w-]+)")
+_YOUTUBE_SHORT_HOSTS = {'youtu.be', 'www.youtu.be'}
+
+_SPOTIFY_INTL_PREFIX = re.compile(r"^/intl-[\w-]+(/.*)$")
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in _TRACKING_PARAMS or name.startswith(_TRACKING_PREFIXES)
+
+
+def _canonical_youtube(host: str, path: str, params: list[tuple[str, str]]) -> tuple[str, str, list] | None:
+    """
+    Зводить усі варіанти посилань на відео YouTube до
+    https://www.youtube.com/watch?v=ID (для music.youtube.com - зберігає хост).
+    Параметри часу (&t=), плейлисту, "feature", "si" тощо відкидаються.
+    """
+    video_id = None
+    if host in _YOUTUBE_SHORT_HOSTS:
+        video_id = path.strip('/').split('/')[0] or None
+    elif host in _YOUTUBE_HOSTS or host == 'music.youtube.com':
+        if path == '/watch':
+            video_id = dict(params).get('v')
+        else:
+            match = _YOUTUBE_PATH_ID.match(path)
+            if match and host != 'music.youtube.com':
+                video_id = match.group(2)
+
+    if not video_id:
+        return None
+    canonical_host = 'music.youtube.com' if host == 'music.youtube.com' else 'www.youtube.com'
+    return canonical_host, '/watch', [('v', video_id)]
+
+
+@lru_cache(maxsize=URL_CLASSIFIER_CACHE_SIZE)
+def canonicalize_url(url: str) -> str:
+    """
+    Повертає канонічну форму URL, щоб варіанти одного й того ж ресурсу
+    (слеш у кінці, utm_*-параметри, &t= у YouTube тощо) відповідали одному запису Material.
+    Схема (http/https) зберігається: ця форма записується в БД і показується користувачу,
+    а сайт лише з http за https-посиланням не відкриється. http- та https-варіанти
+    зводяться до одного матеріалу при пошуку (url_variants).
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower().rstrip('.')
+    if scheme not in _DEFAULT_PORTS or not host:
+        return url
+
+    if port is not None and port != _DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+
+    path = re.sub(r"/{2,}", "/", parts.path) or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    params = [
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking_param(name)
+    ]
+
+    youtube = _canonical_youtube(host, path, params)
+    if youtube:
+        host, path, params = youtube
+        scheme = 'https'
+    elif host == 'open.spotify.com':
+        match = _SPOTIFY_INTL_PREFIX.match(path)
+        if match:
+            path = match.group(1)
+        # "si" - ідентифікатор поширення, не впливає на вміст
+        params = [(name, value) for name, value in params if name != 'si']
+
+    query = urlencode(sorted(params))
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+def cache_key_url(url: str) -> str:
+    """
+    Ключ кешу файлів: канонічна форма зі схемою, зведеною до https,
+    щоб http- та https-варіанти сторінки ділили один файл. Лише для ключів - не для показу.
+    """
+    canonical = canonicalize_url(url)
+    if canonical.startswith('http://'):
+        return 'https://' + canonical[len('http://'):]
+    return canonical
+
+
+def url_variants(url: str) -> list[str]:
+    """
+    Форми URL, під якими в Materials може бути збережений той самий ресурс:
+    канонічна форма та її http/https-двійник (схема зберігається такою, як її побачили вперше).
+    """
+    canonical = canonicalize_url(url)
+    if canonical.startswith('https://'):
+        return [canonical, 'http://' + canonical[len('https://'):]]
+    if canonical.startswith('http://'):
+        return [canonical, 'https://' + canonical[len('http://'):]]
+    return [canonical]
+
+
+def pdf_cache_name(url: str) -> str:
+    """
+    Ім'я файлу в PDF-кеші для URL (за ключем кешу).
+    """
+    url_hash = hashlib.md5(cache_key_url(url).encode()).hexdigest()
+    return f"{url_hash}.pdf"
@@ -0,0 +1,168 @@
+import logging
+import re
+import asyncio
+from collections import OrderedDict
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+from config import SNIFF_CONTENT_TYPE, SNIFF_TIMEOUT_SECONDS, URL_CLASSIFIER_CACHE_SIZE
+from services.http_client import get_probe_session
+from services.metrics import count_cache
+from services.probe_guard import (
+    check_probe_allowed, record_probe_success, record_probe_failure, ProbeSuppressed
+)
+
+logger = logging.getLogger(__name__)
+
+# --- Таблиці правил (компілюються один раз при імпорті) ---
+
+# (регулярний вираз хоста, регулярний вираз шляху, тип)
+# Порядок важливий: music.youtube.com має перевірятись раніше за youtube.com.
+_HOST_RULES = [
+    # Усі посилання music.youtube.com (треки, плейлисти, альбоми /browse/, канали) - медіа
+    (re.compile(r"^music\.youtube\.com$"), re.compile(r"^/"), 'audio_yt_music'),
+    (re.compile(r"^(www\.|m\.)?youtube\.com$"), re.compile(r"^/(watch\b|shorts/|embed/|live/)"), 'video'),
+    (re.compile(r"^(www\.)?youtu\.be$"), re.compile(r"^/[\w-]{6,}"), 'video'),
+    # Треки, альбоми, плейлисти та подкасти; сторінки артистів/профілів - звичайні сторінки
+    (re.compile(r"^open\.spotify\.com$"),
+     re.compile(r"^/(intl-[\w-]+/)?(track|album|playlist|episode|show)/"), 'audio_spotify'),
+]
+
+# Розширення в ШЛЯХУ (без query string та фрагмента)
+_PATH_EXTENSION_RULE = re.compile(r"\.(pdf|docx?|pptx?)$", re.IGNORECASE)
+_EXTENSION_TYPES = {'pdf': 'pdf', 'doc': 'doc', 'docx': 'doc', 'ppt': 'ppt', 'pptx': 'ppt'}
+
+# Позначки, які Google додає до заголовків документів: "[PDF] Назва"
+_TITLE_RULE = re.compile(r"^\[(PDF|DOCX?|PPTX?)\]", re.IGNORECASE)
+
+# Розширення, які точно означають звичайну web-сторінку
+_PAGE_EXTENSION_RULE = re.compile(r"\.(s?html?|php|aspx?|jsp)$", re.IGNORECASE)
+
+# Content-Type -> тип (для уточнення неоднозначних посилань)
+_CONTENT_TYPE_RULES = [
+    (re.compile(r"^application/pdf"), 'pdf'),
+    (re.compile(r"^application/(msword|vnd\.openxmlformats-officedocument\.wordprocessingml)"), 'doc'),
+    (re.compile(r"^application/(vnd\.ms-powerpoint|vnd\.openxmlformats-officedocument\.presentationml)"), 'ppt'),
+]
+
+# Кеш результатів HEAD-запитів: url -> тип (LRU)
+_sniff_cache: OrderedDict[str, str] = OrderedDict()
+
+
+@lru_cache(maxsize=URL_CLASSIFIER_CACHE_SIZE)
+def _classify_link(link: str) -> str | None:
+    """Тип за самим URL (кешується для кожного URL); None - URL тип не визначає."""
+    parts = urlsplit(link)
+    host = (parts.hostname or '').lower()
+    path = parts.path or '/'
+
+    for host_rule, path_rule, result_type in _HOST_RULES:
+        if host_rule.match(host) and path_rule.match(path):
+            return result_type
+
+    extension = _PATH_EXTENSION_RULE.search(path)
+    if extension:
+        return _EXTENSION_TYPES[extension.group(1).lower()]
+    return None
+
+
+def classify_url(link: str, title: str = '') -> str:
+    """
+    Визначає тип контенту за URL (та заголовком результату пошуку).
+    Розбір URL кешується для кожного URL незалежно від заголовка.
+    """
+    result_type = _classify_link(link)
+    if result_type:
+        return result_type
+
+    marker = _TITLE_RULE.match(title)
+    if marker:
+        return _EXTENSION_TYPES[marker.group(1).lower()]
+
+    return 'text'
+
+
+def is_ambiguous(link: str, result_type: str) -> bool:
+    """
+    Чи варто уточнювати тип посилання через Content-Type.
+    Неоднозначні - 'text' посилання без явного "сторінкового" розширення
+    (наприклад, /download?id=5 може віддавати PDF).
+    """
+    if result_type != 'text':
+        return False
+    path = urlsplit(link).path
+    return not path.endswith('/') and not _PAGE_EXTENSION_RULE.search(path)
+
+
+def _type_from_content_type(content_type: str) -> str:
+    content_type = content_type.lower().strip()
+    for rule, result_type in _CONTENT_TYPE_RULES:
+        if rule.match(content_type):
+            return result_type
+    return 'text'
+
+
+def _sniff_content_type(link: str) -> str:
+    """Синхронний HEAD-запит через спільний пул з'єднань."""
+    response = get_probe_session().head(link, allow_redirects=True, timeout=SNIFF_TIMEOUT_SECONDS)
+    return response.headers.get('Content-Type', '')
+
+
+async def sniff_url_type(link: str) -> str:
+    """
+    Уточнює тип посилання за заголовком Content-Type (HEAD-запит).
+    Помилки трактуються як 'text' і потрапляють у негативний кеш (probe_guard).
+    """
+    if link in _sniff_cache:
+        _sniff_cache.move_to_end(link)
+        count_cache("sniff", hit=True)
+        return _sniff_cache[link]
+    count_cache("sniff", hit=False)
+
+    try:
+        check_probe_allowed(link)
+    except ProbeSuppressed:
+        return 'text'
+
+    try:
+        content_type = await asyncio.to_thread(_sniff_content_type, link)
+    except Exception as e:
+        import requests
+
+        logger.warning("Не вдалося визначити Content-Type для %s: %s", link, e)
+        record_probe_failure(link, host_failure=isinstance(e, (requests.RequestException, OSError)))
+        return 'text'
+    record_probe_success(link)
+
+    result_type = _type_from_content_type(content_type)
+    _sniff_cache[link] = result_type
+    if len(_sniff_cache) > URL_CLASSIFIER_CACHE_SIZE:
+        _sniff_cache.popitem(last=False)
+    return result_type
+
+
+async def classify_results(raw_results: list[dict], sniff: bool = SNIFF_CONTENT_TYPE) -> list[dict]:
+    """
+    Класифікує цілу сторінку результатів пошуку (organic_results SerpAPI).
+    Якщо sniff=True, неоднозначні посилання уточнюються паралельно через HEAD.
+    """
+    processed_results = []
+    for result in raw_results:
+        link = result.get('link', '')
+        title = result.get('title', '')
+        if not link or not title:
+            continue
+
+        processed_results.append({
+            'title': title, 'link': link,
+            'snippet': result.get('snippet', ''), 'type': classify_url(link, title)
+        })
+
+    if sniff:
+        ambiguous = [r for r in processed_results if is_ambiguous(r['link'], r['type'])]
+        if ambiguous:
+            sniffed_types = await asyncio.gather(*(sniff_url_type(r['link']) for r in ambiguous))
+            for result, sniffed_type in zip(ambiguous, sniffed_types):
+                result['type'] = sniffed_type
+
+    return processed_results
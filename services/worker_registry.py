@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+from contextlib import asynccontextmanager, closing
+
+from config import (
+    WORKER_COORDINATION, WORKER_REGISTRY_PATH, WORKER_HEARTBEAT_SECONDS, WORKER_LEASE_POLL_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# Спільний для воркерів uvicorn одного хоста реєстр (SQLite-файл):
+#   Workers - живі воркери (heartbeat), щоб ділити ліміти швидкості між ними;
+#   Leases  - оренди з терміном дії: "хто зараз рендерить/завантажує ключ" та слоти
+#             спільних обмежень паралельності (kind -> не більше limit оренд).
+#   SharedState - стан, який читають інші воркери (напр. плани завантаження, що опитує браузер):
+#             без терміну дії (ExpiresAt NULL) живе, поки живий воркер-власник.
+# Оренди померлого воркера (немає heartbeat) або прострочені - ігноруються та видаляються.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Workers (
+    WorkerID TEXT PRIMARY KEY,
+    Pid INTEGER NOT NULL,
+    HeartbeatAt REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Leases (
+    LeaseKey TEXT PRIMARY KEY,
+    Kind TEXT NOT NULL,
+    WorkerID TEXT NOT NULL,
+    ExpiresAt REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS IX_Leases_Kind ON Leases (Kind);
+CREATE TABLE IF NOT EXISTS SharedState (
+    StateKey TEXT PRIMARY KEY,
+    WorkerID TEXT NOT NULL,
+    Data TEXT NOT NULL,
+    ExpiresAt REAL
+);
+"""
+
+# --- Глобальний стан воркера ---
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+_heartbeat_task: asyncio.Task | None = None
+_live_workers = 1
+
+
+def _connect() -> sqlite3.Connection:
+    # isolation_level=None: транзакції керуються явно (BEGIN IMMEDIATE - одразу блокує запис)
+    conn = sqlite3.connect(WORKER_REGISTRY_PATH, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _create_schema_blocking():
+    with closing(_connect()) as conn:
+        conn.executescript(_SCHEMA)
+
+
+def _dead_after() -> float:
+    return time.time() - WORKER_HEARTBEAT_SECONDS * 3
+
+
+def _cleanup(conn: sqlite3.Connection):
+    """Видаляє мертві воркери, їхні/прострочені оренди та стан (в межах поточної транзакції)."""
+    conn.execute("DELETE FROM Workers WHERE HeartbeatAt < ?", (_dead_after(),))
+    conn.execute(
+        "DELETE FROM Leases WHERE ExpiresAt < ? OR WorkerID NOT IN (SELECT WorkerID FROM Workers)",
+        (time.time(),)
+    )
+    conn.execute(
+        "DELETE FROM SharedState WHERE ExpiresAt < ? "
+        "OR (ExpiresAt IS NULL AND WorkerID NOT IN (SELECT WorkerID FROM Workers))",
+        (time.time(),)
+    )
+
+
+def _heartbeat_blocking() -> int:
+    """Оновлює heartbeat цього воркера; повертає кількість живих воркерів."""
+    with closing(_connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT INTO Workers (WorkerID, Pid, HeartbeatAt) VALUES (?, ?, ?) "
+            "ON CONFLICT (WorkerID) DO UPDATE SET HeartbeatAt = excluded.HeartbeatAt",
+            (WORKER_ID, os.getpid(), time.time())
+        )
+        _cleanup(conn)
+        count = conn.execute("SELECT COUNT(*) FROM Workers").fetchone()[0]
+        conn.execute("COMMIT")
+    return count
+
+
+def _try_lease_blocking(key: str, kind: str, ttl: float, limit: int | None) -> bool:
+    """
+    Атомарно бере оренду ключа. limit - максимальна кількість оренд цього kind
+    (спільний семафор); None - лише унікальність ключа (хто перший - той і виконує).
+    """
+    with closing(_connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        _cleanup(conn)
+        if limit is not None:
+            held = conn.execute("SELECT COUNT(*) FROM Leases WHERE Kind = ?", (kind,)).fetchone()[0]
+            if held >= limit:
+                conn.execute("COMMIT")
+                return False
+        inserted = conn.execute(
+            "INSERT OR IGNORE INTO Leases (LeaseKey, Kind, WorkerID, ExpiresAt) VALUES (?, ?, ?, ?)",
+            (key, kind, WORKER_ID, time.time() + ttl)
+        ).rowcount
+        conn.execute("COMMIT")
+    return bool(inserted)
+
+
+def _release_blocking(key: str):
+    with closing(_connect()) as conn:
+        conn.execute("DELETE FROM Leases WHERE LeaseKey = ? AND WorkerID = ?", (key, WORKER_ID))
+
+
+def _lease_held_blocking(key: str) -> bool:
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT 1 FROM Leases JOIN Workers ON Workers.WorkerID = Leases.WorkerID "
+            "WHERE LeaseKey = ? AND ExpiresAt >= ? AND HeartbeatAt >= ?",
+            (key, time.time(), _dead_after())
+        ).fetchone()
+    return row is not None
+
+
+def _publish_state_blocking(key: str, data: str, expires_at: float | None):
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT INTO SharedState (StateKey, WorkerID, Data, ExpiresAt) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (StateKey) DO UPDATE SET WorkerID = excluded.WorkerID, "
+            "Data = excluded.Data, ExpiresAt = excluded.ExpiresAt",
+            (key, WORKER_ID, data, expires_at)
+        )
+
+
+def _read_state_blocking(key: str) -> str | None:
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT Data FROM SharedState WHERE StateKey = ? AND (ExpiresAt IS NULL OR ExpiresAt >= ?)",
+            (key, time.time())
+        ).fetchone()
+    return row[0] if row else None
+
+
+def is_active() -> bool:
+    """Чи працює координація (реєстр запущено при старті застосунку)."""
+    return _heartbeat_task is not None
+
+
+async def _heartbeat_loop():
+    global _live_workers
+    while True:
+        try:
+            _live_workers = max(await asyncio.to_thread(_heartbeat_blocking), 1)
+        except sqlite3.Error as e:
+            logger.warning("Помилка реєстру воркерів: %s", e)
+        await asyncio.sleep(WORKER_HEARTBEAT_SECONDS)
+
+
+async def start_worker_registry():
+    """Реєструє воркер і запускає heartbeat. Викликається при старті FastAPI."""
+    global _heartbeat_task, _live_workers
+    if not WORKER_COORDINATION or _heartbeat_task is not None:
+        return
+    await asyncio.to_thread(_create_schema_blocking)
+    _live_workers = max(await asyncio.to_thread(_heartbeat_blocking), 1)
+    _heartbeat_task = asyncio.create_task(_heartbeat_loop())
+    logger.info("Воркер %s зареєстровано (живих воркерів: %d).", WORKER_ID, _live_workers)
+
+
+async def stop_worker_registry():
+    """Зупиняє heartbeat та звільняє оренди воркера. Викликається при зупинці FastAPI."""
+    global _heartbeat_task
+    if _heartbeat_task is None:
+        return
+    _heartbeat_task.cancel()
+    _heartbeat_task = None
+
+    def unregister():
+        with closing(_connect()) as conn:
+            conn.execute("DELETE FROM Leases WHERE WorkerID = ?", (WORKER_ID,))
+            conn.execute("DELETE FROM Workers WHERE WorkerID = ?", (WORKER_ID,))
+
+    await asyncio.to_thread(unregister)
+
+
+def get_live_worker_ids() -> set[str] | None:
+    """ID живих воркерів (блокуючий виклик); None - координація вимкнена."""
+    if not WORKER_COORDINATION:
+        return None
+    with closing(_connect()) as conn:
+        rows = conn.execute("SELECT WorkerID FROM Workers WHERE HeartbeatAt >= ?", (_dead_after(),)).fetchall()
+    return {row[0] for row in rows}
+
+
+def worker_share(total: int) -> int:
+    """
+    Частка спільного ліміту (напр. байт/с) для цього воркера: ліміт ділиться
+    порівну між живими воркерами. Без координації - весь ліміт.
+    """
+    if not total or not is_active():
+        return total
+    return max(total // _live_workers, 1)
+
+
+@asynccontextmanager
+async def shared_slot(kind: str, limit: int, ttl: float):
+    """
+    Слот спільного (між воркерами) обмеження паралельності: не більше limit
+    одночасних операцій kind на хості. Без координації - лише оренда не береться.
+    """
+    if not is_active():
+        yield
+        return
+
+    key = f"{kind}:{WORKER_ID}:{uuid.uuid4().hex}"
+    while not await asyncio.to_thread(_try_lease_blocking, key, kind, ttl, limit):
+        await asyncio.sleep(WORKER_LEASE_POLL_SECONDS)
+    try:
+        yield
+    finally:
+        await asyncio.to_thread(_release_blocking, key)
+
+
+async def claim_or_wait(key: str, ttl: float) -> bool:
+    """
+    Оренда унікальної роботи (рендеринг URL, завантаження медіа) між воркерами.
+    True - роботу виконує цей воркер (після неї - release_claim);
+    False - інший воркер щойно її виконав (або покинув): результат варто шукати в сховищі.
+    """
+    if not is_active():
+        return True
+    if await asyncio.to_thread(_try_lease_blocking, key, "claim", ttl, None):
+        return True
+    while await asyncio.to_thread(_lease_held_blocking, key):
+        await asyncio.sleep(WORKER_LEASE_POLL_SECONDS)
+    return False
+
+
+async def release_claim(key: str):
+    if is_active():
+        await asyncio.to_thread(_release_blocking, key)
+
+
+async def publish_state(key: str, data: dict, ttl: float | None = None):
+    """
+    Публікує стан (JSON) для інших воркерів. ttl=None - стан живе, поки живий цей воркер,
+    інакше - ttl секунд. Без координації нічого не робить (воркер один).
+    """
+    if not is_active():
+        return
+    expires_at = time.time() + ttl if ttl is not None else None
+    try:
+        await asyncio.to_thread(_publish_state_blocking, key, json.dumps(data, ensure_ascii=False), expires_at)
+    except sqlite3.Error as e:
+        logger.warning("Не вдалося опублікувати стан %s: %s", key, e)
+
+
+async def read_state(key: str) -> dict | None:
+    """Стан, опублікований будь-яким воркером (publish_state); None - немає або координація вимкнена."""
+    if not is_active():
+        return None
+    try:
+        data = await asyncio.to_thread(_read_state_blocking, key)
+    except sqlite3.Error as e:
+        logger.warning("Не вдалося прочитати стан %s: %s", key, e)
+        return None
+    return json.loads(data) if data is not None else None
+
+
+def get_worker_registry_stats() -> dict:
+    """Стан координації воркерів."""
+    return {
+        "enabled": is_active(),
+        "worker_id": WORKER_ID,
+        "live_workers": _live_workers,
+    }
@@ -1,4 +1,19 @@
-// Функція для сторінки закладок (bookmarks.html)
+// Функції для сторінки закладок (bookmarks.html)
+
+// Дії для кожного типу матеріалу: [адреса форми, текст кнопки, клас тегу, текст тегу]
+const MATERIAL_ACTIONS = {
+    'text': ['/convert', 'Конвертувати в PDF', 'text', 'Web-сторінка'],
+    'video': ['/history/track-click', 'Перейти на YouTube', 'video', 'Відео'],
+    'pdf': ['/history/track-click', 'Завантажити PDF', 'pdf', 'PDF Документ'],
+    'doc': ['/history/track-click', 'Завантажити DOC', 'doc', 'DOC Документ'],
+    'ppt': ['/history/track-click', 'Завантажити PPT', 'ppt', 'Презентація'],
+    'audio_yt_music': ['/history/track-click', 'Слухати в YouTube Music', 'audio', 'Аудіо'],
+    'audio_spotify': ['/history/track-click', 'Слухати в Spotify', 'audio', 'Аудіо']
+};
+
+// Наступна сторінка для кожної папки (after_id); null - все завантажено
+const folderCursors = {};
+
 function toggleFolder(folderId) {
     var list = document.getElementById('list-' + folderId);
     var arrow = document.getElementById('arrow-' + folderId);
@@ -12,45 +27,301 @@ function toggleFolder(folderId) {
         list.classList.add('open');
         arrow.classList.add('open');
         header.classList.add('active');
+
+        // Закладки підвантажуються лише при першому розгортанні папки
+        if (list.dataset.loaded === 'false') {
+            list.dataset.loaded = 'true';
+            loadFolderItems(folderId);
+        }
     }
 }
 
-// Функція для сторінки оптимізації (prepare.html)
-function downloadAllOptimized() {
-    // Знаходимо всі форми в блоці результатів
-    const allForms = document.querySelectorAll('.optimization-results .result-item .actions form');
+function loadFolderItems(folderId) {
+    var list = document.getElementById('list-' + folderId);
+    var moreButton = document.getElementById('more-' + folderId);
+    var url = '/bookmarks/folder/' + folderId + '/items';
+    if (folderCursors[folderId]) {
+        url += '?after_id=' + encodeURIComponent(folderCursors[folderId]);
+    }
+
+    moreButton.disabled = true;
+    fetch(url, {credentials: 'same-origin'})
+        .then(response => {
+            if (!response.ok) throw new Error('HTTP ' + response.status);
+            return response.json();
+        })
+        .then(data => {
+            data.items.forEach(item => list.appendChild(renderBookmark(folderId, item)));
+            folderCursors[folderId] = data.next_after_id;
+            moreButton.style.display = data.next_after_id ? 'block' : 'none';
+        })
+        .catch(error => {
+            list.dataset.loaded = 'false';
+            alert('Не вдалося завантажити закладки: ' + error.message);
+        })
+        .finally(() => { moreButton.disabled = false; });
+}
+
+function createPostForm(action, fields, target) {
+    var form = document.createElement('form');
+    form.action = action;
+    form.method = 'post';
+    if (target) form.target = target;
+    Object.keys(fields).forEach(name => {
+        var input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = name;
+        input.value = fields[name];
+        form.appendChild(input);
+    });
+    return form;
+}
 
-    // Фільтруємо форми: залишаємо тільки ті, що НЕ є відео або аудіо
-    const formsToSubmit = Array.from(allForms).filter(form => {
-        const typeInput = form.querySelector('input[name="type"]');
-        if (!typeInput) return false;
+function createButton(text, className) {
+    var button = document.createElement('button');
+    button.type = 'submit';
+    button.textContent = text;
+    if (className) button.className = className;
+    return button;
+}
+
+function renderBookmark(folderId, item) {
+    var li = document.createElement('li');
+    li.className = 'bookmark-item';
+
+    // --- Інформація про закладку ---
+    var info = document.createElement('div');
+    info.className = 'bookmark-info';
+
+    // Прапорець для масових дій (форма bulk-bookmarks-form на сторінці)
+    var checkbox = document.createElement('input');
+    checkbox.type = 'checkbox';
+    checkbox.name = 'bookmark_ids';
+    checkbox.value = item.bookmark_id;
+    checkbox.setAttribute('form', 'bulk-bookmarks-form');
+    info.appendChild(checkbox);
+
+    var link = document.createElement('a');
+    link.href = item.url;
+    link.target = '_blank';
+    link.rel = 'noopener noreferrer';
+    link.textContent = item.name;
+    info.appendChild(link);
+
+    var size = document.createElement('span');
+    if (item.size_mb !== null) {
+        size.className = 'size-info';
+        size.textContent = ' ' + item.size_mb + ' MB';
+    } else {
+        size.className = 'size-info unknown';
+        size.textContent = ' Розмір невідомий';
+    }
+    info.appendChild(size);
+
+    var urlText = document.createElement('p');
+    urlText.textContent = item.url;
+    info.appendChild(urlText);
+
+    var actions = document.createElement('div');
+    actions.className = 'actions';
+    var action = MATERIAL_ACTIONS[item.type];
+    if (action) {
+        var isConvert = item.type === 'text';
+        var fields = isConvert ? {url: item.url} : {url: item.url, type: item.type};
+        var form = createPostForm(action[0], fields, isConvert ? null : '_blank');
+        form.className = 'convert-form';
+        form.appendChild(createButton(action[1], isConvert ? null : 'link-button'));
+        actions.appendChild(form);
+
+        var tag = document.createElement('span');
+        tag.className = 'tag ' + action[2];
+        tag.textContent = action[3];
+        actions.appendChild(tag);
+    }
+    info.appendChild(actions);
+    li.appendChild(info);
 
-        const type = typeInput.value;
-        // Список типів, які треба ігнорувати
-        const ignoredTypes = ['video', 'audio_yt_music', 'audio_spotify'];
+    // --- Перемістити / Видалити ---
+    var controls = document.createElement('div');
+    controls.className = 'bookmark-actions';
 
-        return !ignoredTypes.includes(type);
+    var moveForm = createPostForm('/bookmarks/move', {bookmark_id: item.bookmark_id});
+    var select = document.createElement('select');
+    select.name = 'new_folder_id';
+    getFolderOptions().forEach(folder => {
+        if (String(folder.id) === String(folderId)) return;
+        var option = document.createElement('option');
+        option.value = folder.id;
+        option.textContent = folder.name;
+        select.appendChild(option);
     });
+    moveForm.appendChild(select);
+    moveForm.appendChild(createButton('Перемістити', 'move-btn'));
+    controls.appendChild(moveForm);
 
-    if (formsToSubmit.length === 0) {
-        alert('Немає файлів для завантаження (документів або веб-сторінок).');
-        return;
+    var deleteForm = createPostForm('/bookmarks/delete', {bookmark_id: item.bookmark_id});
+    deleteForm.onsubmit = () => confirm('Видалити закладку «' + item.name + '»?');
+    deleteForm.appendChild(createButton('Видалити', 'delete-btn'));
+    controls.appendChild(deleteForm);
+
+    li.appendChild(controls);
+    return li;
+}
+
+var folderOptionsCache = null;
+
+function getFolderOptions() {
+    if (folderOptionsCache === null) {
+        var data = document.getElementById('folders-data');
+        folderOptionsCache = data ? JSON.parse(data.textContent) : [];
     }
+    return folderOptionsCache;
+}
 
-    if (!confirm(`Буде завантажено ${formsToSubmit.length} файлів. Продовжити?`)) {
+// Обирає / знімає всі прапорці з певним іменем (масові дії)
+function toggleAllCheckboxes(source, name) {
+    document.querySelectorAll('input[type="checkbox"][name="' + name + '"]')
+        .forEach(checkbox => { checkbox.checked = source.checked; });
+}
+
+// Функція для сторінки оптимізації (prepare.html)
+// Підписи станів елементів плану завантаження
+const PLAN_STATES = {
+    'queued': 'У черзі',
+    'running': 'Завантажується...',
+    'done': 'Готово',
+    'dropped': 'Не вміщається в ліміт',
+    'skipped': 'Пропущено',
+    'failed': 'Помилка'
+};
+
+function downloadAllOptimized() {
+    // Сервер виконує оптимальний набір як єдиний план: найцінніші елементи першими,
+    // зі спільним лімітом швидкості та без перевищення об'єму пам'яті.
+    if (!confirm('Запустити завантаження оптимального набору?')) {
         return;
     }
 
-    // Запускаємо сабміт форм із затримкою
-    formsToSubmit.forEach((form, index) => {
+    const statusBox = document.getElementById('download-plan-status');
+    const delivered = new Set();
+
+    const poll = plan => {
+        renderDownloadPlan(plan, statusBox);
+
+        // Готові файли віддаємо браузеру в порядку завершення
+        plan.items
+            .filter(item => item.download_url && !delivered.has(item.index))
+            .forEach(item => {
+                delivered.add(item.index);
+                const link = document.createElement('a');
+                link.href = item.download_url;
+                link.download = '';
+                document.body.appendChild(link);
+                link.click();
+                link.remove();
+            });
+
+        if (plan.finished) return;
         setTimeout(() => {
-            // Примусово встановлюємо target="_blank", щоб завантаження
-            // відкривалося в новій вкладці/фоні і не блокувало поточну сторінку
-            // для виконання наступних ітерацій циклу.
-            form.target = '_blank';
+            fetch('/download-plan/' + plan.id, {credentials: 'same-origin'})
+                .then(response => {
+                    if (!response.ok) throw new Error('HTTP ' + response.status);
+                    return response.json();
+                })
+                .then(poll)
+                .catch(error => alert('Не вдалося отримати стан завантаження: ' + error.message));
+        }, 1000);
+    };
+
+    // Кандидати та ліміт саме того результату оптимізації, що показаний на сторінці
+    const planData = document.getElementById('download-plan-data').textContent;
+    fetch('/download-plan', {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: {'Content-Type': 'application/json'},
+        body: planData
+    })
+        .then(response => {
+            if (!response.ok) throw new Error('HTTP ' + response.status);
+            return response.json();
+        })
+        .then(poll)
+        .catch(error => alert('Не вдалося запустити завантаження: ' + error.message));
+}
 
-            form.submit();
+function downloadMedia(button) {
+    // Сервер завантажує файл у фоні; опитуємо стан і віддаємо файл браузеру, коли він готовий
+    const label = button.textContent;
+    button.disabled = true;
+    button.textContent = 'Завантаження на сервер...';
+    const finish = () => {
+        button.disabled = false;
+        button.textContent = label;
+    };
 
-        }, 800 * index); // Інтервал 800мс, щоб не "задушити" браузер
-    });
-}
\ No newline at end of file
+    const poll = media => {
+        if (media.state === 'done') {
+            finish();
+            const link = document.createElement('a');
+            link.href = media.file_url;
+            link.download = '';
+            document.body.appendChild(link);
+            link.click();
+            link.remove();
+            return;
+        }
+        if (media.state === 'failed') throw new Error(media.error || 'помилка завантаження');
+        setTimeout(() => {
+            fetch(media.status_url, {credentials: 'same-origin'})
+                .then(response => {
+                    if (!response.ok) throw new Error('HTTP ' + response.status);
+                    return response.json();
+                })
+                .then(poll)
+                .catch(error => {
+                    finish();
+                    alert('Не вдалося завантажити файл: ' + error.message);
+                });
+        }, 2000);
+    };
+
+    fetch('/media/download', {
+        method: 'POST',
+        credentials: 'same-origin',
+        body: new URLSearchParams({url: button.dataset.url, type: button.dataset.type})
+    })
+        .then(response => {
+            if (!response.ok) throw new Error('HTTP ' + response.status);
+            return response.json();
+        })
+        .then(poll)
+        .catch(error => {
+            finish();
+            alert('Не вдалося завантажити файл: ' + error.message);
+        });
+}
+
+function renderDownloadPlan(plan, statusBox) {
+    statusBox.innerHTML = '';
+    statusBox.style.display = 'block';
+
+    const summary = document.createElement('p');
+    summary.textContent = `Завантажено ${plan.delivered_mb} MB з ${plan.budget_mb} MB` +
+        (plan.replans ? ` (план перебудовано: ${plan.replans})` : '') +
+        (plan.finished ? ' - завершено.' : '...');
+    statusBox.appendChild(summary);
+
+    const list = document.createElement('ul');
+    plan.items
+        .filter(item => item.state !== 'dropped')
+        .sort((a, b) => (a.order ?? Infinity) - (b.order ?? Infinity))
+        .forEach(item => {
+            const row = document.createElement('li');
+            row.className = 'plan-item ' + item.state;
+            const size = item.actual_mb !== null ? item.actual_mb : item.size_mb;
+            row.textContent = `${item.title} (${size} MB) - ${PLAN_STATES[item.state] || item.state}`;
+            if (item.error) row.title = item.error;
+            list.appendChild(row);
+        });
+    statusBox.appendChild(list);
+}
@@ -0,0 +1,30 @@
+"""
+Створює індекси, оголошені в models.py, яких ще немає в БД.
+
+Base.metadata.create_all створює індекси лише разом з новими таблицями,
+тому для вже існуючих таблиць нові індекси треба додати окремо.
+
+Запуск (з кореня проекту):
+    python -m tools.create_missing_indexes
+"""
+import asyncio
+
+from database import Base, engine
+import models  # noqa: F401  (реєструє моделі в Base.metadata)
+
+
+def _create_indexes(connection):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+            print(f"Індекс {index.name} ({table.name}) перевірено/створено.")
+
+
+async def main():
+    async with engine.begin() as conn:
+        await conn.run_sync(_create_indexes)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,35 @@
+"""
+Збирач сміття сховища файлів за вмістом (blob_store/).
+
+  1. Перераховує лічильники посилань (Blobs.RefCount) за таблицею MaterialBlobs.
+  2. Видаляє записи Blobs без посилань разом з файлами.
+  3. Видаляє файли, яких немає в БД, та незавершені тимчасові файли
+     (старші за BLOB_GC_GRACE_SECONDS).
+
+Запуск (з кореня проекту):
+    python -m tools.gc_blobs            # пробний прогін
+    python -m tools.gc_blobs --apply    # внести зміни
+"""
+import sys
+import asyncio
+import logging
+
+from database import async_session_factory, engine
+from services.blob_store import collect_garbage
+
+
+async def main(apply: bool):
+    async with async_session_factory() as db:
+        stats = await collect_garbage(db, apply=apply)
+    await engine.dispose()
+
+    mode = "Застосовано" if apply else "Пробний прогін (без змін)"
+    print(f"{mode}: виправлено лічильників {stats['recounted']}, "
+          f"файлів без посилань {stats['blobs_deleted']}, файлів без запису в БД {stats['files_deleted']}, "
+          f"звільнено {round(stats['bytes_freed'] / (1024 * 1024), 2)} MB.")
+
+
+if __name__ == "__main__":
+    # Список файлів, що видаляються, пише services/blob_store.py через logging
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(main(apply="--apply" in sys.argv))
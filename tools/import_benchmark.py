@@ -0,0 +1,78 @@
+"""
+Вимірює час імпорту застосунку (холодний старт кожного воркера uvicorn).
+
+Кожен прогін - окремий процес `python -X importtime -c "import main"`;
+виводиться медіана загального часу та модулі з найбільшим власним часом.
+Важкі залежності (yt_dlp, playwright, serpapi, requests) не повинні
+імпортуватися при старті - вони позначаються окремо.
+
+Запуск (з кореня проекту; потрібні DATABASE_URL та інші змінні .env):
+    python -m tools.import_benchmark                 # 5 прогонів
+    python -m tools.import_benchmark --runs 10 --top 30
+    python -m tools.import_benchmark --max-ms 800    # код 1, якщо медіана більша
+"""
+import sys
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+HEAVY_MODULES = ("yt_dlp", "playwright", "serpapi", "requests")
+
+
+def _run_once(module: str) -> dict[str, tuple[int, int]]:
+    """Один прогін: модуль -> (власний час, сукупний час), мкс."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise SystemExit(f"Імпорт {module} завершився з помилкою:\n{completed.stderr[-2000:]}")
+
+    timings = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m tools.import_benchmark")
+    parser.add_argument("--module", default="main", help="модуль, що імпортується (за замовчуванням main)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20, help="скільки найповільніших модулів показати")
+    parser.add_argument("--max-ms", type=float, help="поріг медіани загального часу, мс")
+    args = parser.parse_args()
+
+    totals = []
+    self_times: dict[str, list[int]] = defaultdict(list)
+    for _ in range(args.runs):
+        timings = _run_once(args.module)
+        totals.append(timings[args.module][1] / 1000)
+        for name, (self_us, _cumulative_us) in timings.items():
+            self_times[name].append(self_us)
+
+    median_ms = statistics.median(totals)
+    print(f"import {args.module}: медіана {median_ms:.1f} мс "
+          f"(мін {min(totals):.1f}, макс {max(totals):.1f}, прогонів {args.runs})")
+
+    print(f"\nНайбільший власний час імпорту (медіана, мс):")
+    slowest = sorted(self_times.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for name, values in slowest[:args.top]:
+        print(f"  {statistics.median(values) / 1000:8.1f}  {name}")
+
+    loaded_heavy = [name for name in HEAVY_MODULES if name in self_times]
+    if loaded_heavy:
+        print(f"\nВажкі модулі, імпортовані при старті: {', '.join(loaded_heavy)}")
+    else:
+        print(f"\nВажкі модулі ({', '.join(HEAVY_MODULES)}) при старті не імпортуються.")
+
+    if args.max_ms is not None and median_ms > args.max_ms:
+        print(f"ПЕРЕВИЩЕНО ПОРІГ: {median_ms:.1f} мс > {args.max_ms} мс")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
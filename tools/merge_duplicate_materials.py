@@ -0,0 +1,112 @@
+"""
+Міграція: об'єднує дублікати в таблиці Materials за канонічним URL.
+
+Для кожної групи матеріалів з однаковим cache_key_url(URL) (канонічний URL, http та https разом):
+  1. Обирається основний запис (той, що вже має канонічний URL, або з найменшим ID).
+  2. Bookmarks та HistoryMaterials перенаправляються на основний запис.
+  3. Відомий розмір (Size) та файл у сховищі (MaterialBlobs) переносяться,
+     якщо в основному записі їх немає.
+  4. Дублікати видаляються, а URL основного запису замінюється на канонічний.
+  5. Файли PDF-кешу перейменовуються під новий ключ кешу.
+
+Запуск (з кореня проекту):
+    python -m tools.merge_duplicate_materials            # пробний прогін
+    python -m tools.merge_duplicate_materials --apply    # внести зміни
+"""
+import sys
+import asyncio
+import hashlib
+from collections import defaultdict
+
+from sqlalchemy import update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config import PDF_CACHE_DIR
+from database import async_session_factory, engine
+from models import Material, Bookmark, HistoryMaterial
+from services.blob_store import merge_material_blobs
+from services.url_canonicalizer import canonicalize_url, cache_key_url, pdf_cache_name
+
+
+def _migrate_pdf_cache(urls: list[str], canonical_url: str):
+    """Перейменовує старі файли кешу (md5 сирого URL) на канонічний ключ."""
+    target = PDF_CACHE_DIR / pdf_cache_name(canonical_url)
+    for url in urls:
+        legacy = PDF_CACHE_DIR / f"{hashlib.md5(url.encode()).hexdigest()}.pdf"
+        if legacy == target or not legacy.exists():
+            continue
+        if target.exists():
+            legacy.unlink()
+        else:
+            legacy.rename(target)
+
+
+async def merge_duplicate_materials(db: AsyncSession, apply: bool = False) -> dict:
+    """
+    Знаходить та (якщо apply=True) об'єднує дублікати матеріалів.
+    Повертає статистику: кількість груп, видалених та оновлених записів.
+    """
+    groups: dict[str, list[Material]] = defaultdict(list)
+    result = await db.stream(select(Material).order_by(Material.MaterialID))
+    async for material in result.scalars():
+        groups[cache_key_url(material.URL)].append(material)
+
+    stats = {"groups": 0, "merged": 0, "renamed": 0}
+
+    for materials in groups.values():
+        if len(materials) == 1 and materials[0].URL == canonicalize_url(materials[0].URL):
+            continue
+
+        keeper = next((m for m in materials if m.URL == canonicalize_url(m.URL)), materials[0])
+        # Схема основного запису зберігається (див. canonicalize_url)
+        canonical_url = canonicalize_url(keeper.URL)
+        duplicates = [m for m in materials if m is not keeper]
+        duplicate_ids = [m.MaterialID for m in duplicates]
+        original_urls = [m.URL for m in materials]
+
+        if duplicates:
+            stats["groups"] += 1
+            stats["merged"] += len(duplicates)
+        if keeper.URL != canonical_url:
+            stats["renamed"] += 1
+
+        print(f"{canonical_url}: основний {keeper.MaterialID}, дублікати {duplicate_ids}")
+        if not apply:
+            continue
+
+        if duplicate_ids:
+            await db.execute(
+                update(Bookmark)
+                .where(Bookmark.MaterialID.in_(duplicate_ids))
+                .values(MaterialID=keeper.MaterialID)
+            )
+            await db.execute(
+                update(HistoryMaterial)
+                .where(HistoryMaterial.MaterialID.in_(duplicate_ids))
+                .values(MaterialID=keeper.MaterialID)
+            )
+            if keeper.Size is None:
+                keeper.Size = next((m.Size for m in duplicates if m.Size is not None), None)
+            await merge_material_blobs(db, keeper.MaterialID, duplicate_ids)
+            await db.execute(delete(Material).where(Material.MaterialID.in_(duplicate_ids)))
+
+        keeper.URL = canonical_url
+        await db.commit()
+        _migrate_pdf_cache(original_urls, canonical_url)
+
+    return stats
+
+
+async def main(apply: bool):
+    async with async_session_factory() as db:
+        stats = await merge_duplicate_materials(db, apply=apply)
+    await engine.dispose()
+
+    mode = "Застосовано" if apply else "Пробний прогін (без змін)"
+    print(f"{mode}: груп з дублікатами {stats['groups']}, "
+          f"об'єднано записів {stats['merged']}, оновлено URL {stats['renamed']}.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(apply="--apply" in sys.argv))
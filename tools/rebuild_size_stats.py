@@ -0,0 +1,66 @@
+"""
+Перераховує статистику розмірів (SizeStats) за вже виміряними матеріалами.
+
+Статистика оновлюється інкрементно під час роботи додатку; цей скрипт
+заповнює її для матеріалів, розмір яких був відомий раніше, або виправляє
+розбіжності. Статистика байтрейту медіа (RateSampleCount/SumRate)
+не змінюється - тривалість у таблиці Materials не зберігається.
+
+Запуск (з кореня проекту):
+    python -m tools.rebuild_size_stats
+"""
+import math
+import asyncio
+from collections import defaultdict
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import async_session_factory, engine
+from models import Material, SizeStat
+from services.size_estimator import size_domain, ALL_DOMAINS
+
+
+async def rebuild_size_stats(db: AsyncSession) -> int:
+    """Повертає кількість врахованих матеріалів."""
+    totals: dict[tuple[str, str], list] = defaultdict(lambda: [0, 0.0])
+    materials = 0
+
+    result = await db.stream(
+        select(Material.URL, Material.Type, Material.Size).where(Material.Size > 0)
+    )
+    async for url, type_str, size in result:
+        materials += 1
+        for domain in {size_domain(url), ALL_DOMAINS}:
+            entry = totals[(type_str, domain)]
+            entry[0] += 1
+            entry[1] += math.log(size)
+
+    existing = {
+        (row.Type, row.Domain): row
+        for row in (await db.execute(select(SizeStat))).scalars().all()
+    }
+    for key, row in existing.items():
+        if key not in totals:
+            row.SampleCount, row.SumLogSize = 0, 0.0
+
+    for (type_str, domain), (count, sum_log) in totals.items():
+        row = existing.get((type_str, domain))
+        if row is None:
+            row = SizeStat(Type=type_str, Domain=domain, RateSampleCount=0, SumRate=0.0)
+            db.add(row)
+        row.SampleCount, row.SumLogSize = count, sum_log
+
+    await db.commit()
+    return materials
+
+
+async def main():
+    async with async_session_factory() as db:
+        materials = await rebuild_size_stats(db)
+    await engine.dispose()
+    print(f"Статистику розмірів перераховано за {materials} матеріалами.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())